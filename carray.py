@@ -0,0 +1,97 @@
+'''
+Storage of C arrays.
+
+A CArray keeps its elements in an array.array ('q' for int, 'd' for float)
+and which of them were ever assigned in a bitmap, instead of a list of
+Python objects with None for "not assigned yet". Reading an unassigned
+element still gives None, and repr() is the one of the equivalent list, so
+`print` and `trace` show the same thing as before. Ints are unbounded like
+everywhere else in the interpreter: the first one that does not fit in 64
+bits turns the buffer into a plain list.
+
+Writes happen in place. snapshot() returns a copy that shares the buffers;
+only the first write to either of them copies them. copy.deepcopy() takes a
+snapshot too.
+'''
+from array import array
+
+TYPECODES = {"int": "q", "float": "d"}
+
+
+class CArray:
+    __slots__ = ("type", "data", "assigned", "shared")
+
+    def __init__(self, var_type, size):
+        typecode = TYPECODES["float" if "float" in var_type else "int"]
+        self.type = var_type
+        self.data = array(typecode, bytes(size * array(typecode).itemsize))
+        self.assigned = bytearray((size + 7) >> 3)
+        self.shared = False
+
+    def __len__(self):
+        return len(self.data)
+
+    def position(self, index):
+        size = len(self.data)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("list index out of range")
+        return index
+
+    def __getitem__(self, index):
+        index = self.position(index)
+        if self.assigned[index >> 3] >> (index & 7) & 1:
+            return self.data[index]
+        return None
+
+    def __setitem__(self, index, value):
+        index = self.position(index)
+        if self.shared:
+            self.data = self.data[:]
+            self.assigned = bytearray(self.assigned)
+            self.shared = False
+        try:
+            self.data[index] = value
+        except OverflowError:
+            self.data = list(self.data)
+            self.data[index] = value
+        self.assigned[index >> 3] |= 1 << (index & 7)
+
+    def __iter__(self):
+        for index in range(len(self.data)):
+            yield self[index]
+
+    def tolist(self):
+        return list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, CArray):
+            return self.tolist() == other.tolist()
+        return self.tolist() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def snapshot(self):
+        '''
+        Copy of the current contents. The buffers are shared until one of
+        the two is written to.
+        '''
+        copy = CArray.__new__(CArray)
+        copy.type = self.type
+        copy.data = self.data
+        copy.assigned = self.assigned
+        copy.shared = True
+        self.shared = True
+        return copy
+
+    def __deepcopy__(self, memo):
+        return self.snapshot()
+
+    def nbytes(self):
+        # a list holds a pointer per element, the ints it points to aside
+        itemsize = self.data.itemsize if isinstance(self.data, array) else 8
+        return itemsize * len(self.data) + len(self.assigned)
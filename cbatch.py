@@ -0,0 +1,276 @@
+'''
+Batch run of a corpus of C sources against their golden files.
+
+Every source is run to completion with the tree engine and no REPL, in a
+pool of worker processes, one per core by default. It is the engine that
+knows the line of each printf call and the number of executed lines, and
+the one the optimized code comes from; the transpiled `--run` code has
+neither. Next to `name.c` the golden files are
+
+    name_output     printf transcript, a "Line N: text" line per printf
+                    call with newlines in text written as \\n
+    name_output.c   the optimized code `cinterpreter.py` writes to output.c
+
+and a source passes when everything it has a golden file for matches. A
+source that cannot be run, for whatever reason, is an error of its own and
+the others still run. In a
+transcript, numbers are compared with a tolerance (`0.0` is `0.000000`),
+trailing blanks are ignored and so are the line numbers unless --lines is
+given: transcripts are kept across edits that move lines around. Sources
+without golden files are only run.
+
+    python cbatch.py [--jobs N] [--max-steps N] [--memoize N] [--json FILE] [path ...]
+
+Paths are sources or directories searched for them, inputs/ by default.
+The summary, with wall, parse and run time and the number of executed
+lines of each file, is written as JSON to FILE ('-' for stdout). With
+--memoize, calls of pure functions are answered from a cache of N results
+(see cmemo) in the sources without an optimized-code golden file, and the
+summary has its hits and misses.
+'''
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import re
+import sys
+import time
+
+from ccache import get_cached_parser_tree
+from cinterpreter import Interpreter
+from cmemo import CallCache
+from coptimization import CException
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inputs")
+
+TRANSCRIPT_SUFFIX = "_output"
+CODE_SUFFIX = "_output.c"
+
+TRANSCRIPT_LINE = re.compile(r"Line (\d+): ?(.*)")
+NUMBER = re.compile(r"(-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+
+REL_TOL = 1e-6
+ABS_TOL = 1e-9
+
+
+class TranscriptInterpreter(Interpreter):
+    '''
+    An interpreter that keeps what printf prints as (line, text) instead of
+    writing it out.
+    '''
+    __slots__ = ("transcript",)
+
+    def __init__(self, analysis=True, memo=None):
+        super().__init__(analysis=analysis, memo=memo)
+        self.transcript = []
+
+    def printf(self, lineno, text):
+        self.transcript.append((lineno, text))
+
+
+def find_sources(paths):
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                sources.extend(os.path.join(root, name) for name in sorted(files)
+                               if name.endswith(".c") and not name.endswith(CODE_SUFFIX))
+        else:
+            sources.append(path)
+    return sources
+
+
+def golden_files(source):
+    base = source[:-len(".c")] if source.endswith(".c") else source
+    return {kind: base + suffix for kind, suffix in [("transcript", TRANSCRIPT_SUFFIX), ("code", CODE_SUFFIX)]
+            if os.path.isfile(base + suffix)}
+
+
+def escape(text):
+    return text.encode("unicode_escape").decode("ascii").rstrip()
+
+
+def read_transcript(filename):
+    f = open(filename, "r")
+    lines = f.read().splitlines()
+    f.close()
+
+    transcript = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        match = TRANSCRIPT_LINE.fullmatch(line.rstrip())
+        if match is None:
+            raise CException(f"{filename}:{number} is no transcript line: {line!r}")
+        transcript.append((int(match.group(1)), match.group(2)))
+    return transcript
+
+
+def same_text(expected, actual):
+    '''
+    Whether two escaped printf texts match, numbers up to the tolerance.
+    '''
+    expected_parts = NUMBER.split(expected)
+    actual_parts = NUMBER.split(actual)
+    if len(expected_parts) != len(actual_parts):
+        return False
+    for index, (left, right) in enumerate(zip(expected_parts, actual_parts)):
+        if index % 2 == 0:
+            if left != right:
+                return False
+        elif not math.isclose(float(left), float(right), rel_tol=REL_TOL, abs_tol=ABS_TOL):
+            return False
+    return True
+
+
+def compare_transcript(expected, actual, check_lines):
+    '''
+    The first difference between two transcripts, None if they match.
+    '''
+    for number, (want, got) in enumerate(zip(expected, actual), 1):
+        if not same_text(want[1], got[1]) or (check_lines and want[0] != got[0]):
+            return f"printf {number}: expected 'Line {want[0]}: {want[1]}', got 'Line {got[0]}: {got[1]}'"
+    if len(expected) != len(actual):
+        return f"expected {len(expected)} printf calls, got {len(actual)}"
+    return None
+
+
+def compare_code(expected, actual):
+    expected_lines = [line.rstrip() for line in expected.rstrip().split("\n")]
+    actual_lines = [line.rstrip() for line in actual.rstrip().split("\n")]
+    for number, (want, got) in enumerate(zip(expected_lines, actual_lines), 1):
+        if want != got:
+            return f"optimized line {number}: expected {want!r}, got {got!r}"
+    if len(expected_lines) != len(actual_lines):
+        return f"optimized code has {len(actual_lines)} lines, expected {len(expected_lines)}"
+    return None
+
+
+def run_source(source, max_steps=None, check_lines=False, memo_size=None):
+    '''
+    Run one source and check it against its golden files. Returns its line
+    of the summary.
+    '''
+    start = time.perf_counter()
+    golden = golden_files(source)
+    result = {"file": source, "status": "pass", "golden": sorted(golden.values()),
+              "parse_time": 0.0, "run_time": 0.0, "steps": 0, "printf_calls": 0, "message": None}
+    interpreter = None
+    try:
+        f = open(source, "r")
+        lines = f.readlines()
+        f.close()
+        # lines[1] indicates Line 1
+        lines.insert(0, "")
+
+        # only the optimized code reads what the run collects for it
+        memo = CallCache(memo_size) if memo_size else None
+        interpreter = TranscriptInterpreter("code" in golden, memo)
+        interpreter.plain_code, interpreter.plain_code_one_line = lines, "".join(lines)
+        # nobody traces, histories would only cost time
+        interpreter.retention.set("off")
+
+        parse_start = time.perf_counter()
+        tree = get_cached_parser_tree(interpreter.plain_code_one_line)
+        result["parse_time"] = time.perf_counter() - parse_start
+
+        run_start = time.perf_counter()
+        interpreter.run(tree, sys.maxsize if max_steps is None else max_steps)
+        result["run_time"] = time.perf_counter() - run_start
+        result["steps"] = interpreter.clock.step
+        if not interpreter.main_stack.isEmpty():
+            result["status"] = "fail"
+            result["message"] = f"did not finish in {max_steps} lines"
+            return result
+
+        failures = []
+        if "transcript" in golden:
+            actual = [(lineno, escape(text)) for lineno, text in interpreter.transcript]
+            failures.append(compare_transcript(read_transcript(golden["transcript"]), actual, check_lines))
+        if "code" in golden:
+            f = open(golden["code"], "r")
+            expected = f.read()
+            f.close()
+            failures.append(compare_code(expected, "".join(interpreter.optimize())))
+        failures = [failure for failure in failures if failure is not None]
+        if failures:
+            result["status"] = "fail"
+            result["message"] = "; ".join(failures)
+        elif not golden:
+            result["status"] = "ran"
+    except Exception as e:
+        result["status"] = "error"
+        result["message"] = f"{type(e).__name__}: {e}"
+    finally:
+        if interpreter is not None:
+            result["steps"] = interpreter.clock.step
+            result["printf_calls"] = len(interpreter.transcript)
+            if interpreter.memo is not None:
+                result["memo"] = interpreter.memo.stats()
+        result["wall_time"] = time.perf_counter() - start
+    return result
+
+
+def run_batch(sources, jobs=None, max_steps=None, check_lines=False, memo_size=None):
+    '''
+    Summaries of all sources, in their order, run by jobs processes.
+    '''
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        futures = [executor.submit(run_source, source, max_steps, check_lines, memo_size) for source in sources]
+        results = []
+        for source, future in zip(sources, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # the worker itself died, a lost worker takes the pool with it
+                results.append({"file": source, "status": "error", "golden": [], "parse_time": 0.0, "run_time": 0.0,
+                                "steps": 0, "printf_calls": 0, "message": f"{type(e).__name__}: {e}", "wall_time": 0.0})
+        return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run C sources in parallel and check them against their golden files.")
+    parser.add_argument("paths", nargs="*", default=[INPUT_DIR], metavar="path",
+                        help="source file or directory searched for *.c, inputs/ by default")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), metavar="N",
+                        help="worker processes, one per core by default")
+    parser.add_argument("--max-steps", type=int, default=None, metavar="N",
+                        help="fail a program that has not finished after N lines")
+    parser.add_argument("--memoize", type=int, default=None, metavar="N",
+                        help="answer calls of pure functions from a cache of N results")
+    parser.add_argument("--lines", action="store_true",
+                        help="also compare the line numbers of printf transcripts")
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the summary as JSON to FILE, '-' for stdout")
+    options = parser.parse_args()
+
+    sources = find_sources(options.paths)
+    start = time.perf_counter()
+    results = run_batch(sources, options.jobs, options.max_steps, options.lines, options.memoize)
+    elapsed = time.perf_counter() - start
+
+    counts = {status: 0 for status in ["pass", "fail", "error", "ran"]}
+    for result in results:
+        counts[result["status"]] += 1
+    summary = {"wall_time": elapsed, "jobs": options.jobs, "counts": counts, "files": results}
+
+    report = sys.stderr if options.json == "-" else sys.stdout
+    for result in results:
+        line = f"{os.path.relpath(result['file'])}: {result['status']} " \
+               f"({result['wall_time']:.3f}s, {result['steps']} lines" + \
+               (f", {result['memo']['hits']} cached calls)" if "memo" in result else ")")
+        if result["message"]:
+            line += f" {result['message']}"
+        print(line, file=report)
+    print(", ".join(f"{count} {status}" for status, count in counts.items()) + f" in {elapsed:.2f}s", file=report)
+
+    if options.json == "-":
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+    elif options.json:
+        f = open(options.json, "w")
+        json.dump(summary, f, indent=2)
+        f.close()
+    sys.exit(1 if counts["fail"] or counts["error"] else 0)
@@ -0,0 +1,730 @@
+import concurrent.futures
+import contextlib
+import glob
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import ply.yacc as yacc
+
+import cinterpreter
+import clinker
+import ctranspiler
+from carray import CArray
+from ccache import ParseCache
+from cmemo import CallCache
+from cnodes import Assign, legacy_tree
+from cvm import VM
+from cyacc import CParser, get_parser_tree
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inputs")
+
+
+def load_sources(pattern="*.c"):
+    sources = []
+    for filename in sorted(glob.glob(os.path.join(INPUT_DIR, pattern))):
+        f = open(filename, "r")
+        sources.append("".join(f.readlines()))
+        f.close()
+    return sources
+
+
+def generate_program(statements=2000):
+    '''
+    Straight-line main() with a few declarations and `statements` assignments
+    mixing arithmetic, array accesses and casts.
+    '''
+    lines = ["int main(void) {\n", "    int a, b, c, i;\n", "    float f;\n", "    int d[16];\n",
+             "    a = 1;\n", "    b = 2;\n", "    c = 3;\n", "    f = 0.5;\n"]
+    lines += [f"    d[{k}] = {k};\n" for k in range(16)]
+    for n in range(statements):
+        k = n % 16
+        if n % 4 == 0:
+            lines.append(f"    d[{k}] = a * {n % 7 + 1} + b - c;\n")
+        elif n % 4 == 1:
+            lines.append(f"    a = b + c * {n % 5 + 1} - d[{k}] / 3;\n")
+        elif n % 4 == 2:
+            lines.append(f"    f = (float)(a + b) / {n % 9 + 2} + f;\n")
+        else:
+            lines.append(f"    b = (int)f + c - a;\n")
+    lines.append("}\n")
+    return "".join(lines)
+
+
+def generate_long_expressions(terms=400, statements=20):
+    '''
+    main() whose assignments are single chained sums of `terms` operands.
+    '''
+    lines = ["int main(void) {\n", "    int a, b;\n", "    a = 1;\n", "    b = 2;\n"]
+    for n in range(statements):
+        operands = []
+        for k in range(terms):
+            operands.append(("a", "b * 2", str(k))[k % 3])
+        lines.append(f"    a = {' + '.join(operands)};\n")
+    lines.append("}\n")
+    return "".join(lines)
+
+
+def generate_nested_loops(outer=100, inner=100):
+    return f"""int main(void) {{
+    int i, j, total;
+    float scale;
+    total = 0;
+    scale = 0.5;
+    for (i = 0; i < {outer}; i++) {{
+        for (j = 0; j < {inner}; j++) {{
+            total = total + i * j - (i + j) * 2 + j * 3;
+            scale = (float)(i - j) / 1000 + scale * 1.0001;
+        }}
+    }}
+    printf("%d %f\\n", total, scale);
+}}
+"""
+
+
+def generate_loop(iterations=100000):
+    return f"""int main(void) {{
+    int i, total;
+    total = 0;
+    for (i = 0; i < {iterations}; i++) {{
+        total = total + i;
+        if (total > 1000000) {{
+            total = total - 1000000;
+        }}
+    }}
+    printf("%d\\n", total);
+}}
+"""
+
+
+def generate_scalar_loop(iterations=50000):
+    return f"""int main(void) {{
+    int i, a, b, c, d;
+    a = 1;
+    b = 2;
+    c = 0;
+    d = 0;
+    for (i = 0; i < {iterations}; i++) {{
+        a = i * 3 + 7;
+        b = a - i * 2;
+        c = c + b - a + i * 2 + 1;
+        d = a - b * 2 + c;
+    }}
+    printf("%d %d %d %d\\n", a, b, c, d);
+}}
+"""
+
+
+def generate_sparse_loop(iterations=20000, blank=3):
+    '''
+    generate_loop with every brace on a line of its own and blank lines
+    between the statements.
+    '''
+    gap = "\n" * blank
+    return f"""int main(void)
+{{
+    int i, total;
+{gap}    total = 0;
+{gap}    for (i = 0; i < {iterations}; i++)
+    {{
+{gap}        total = total + i;
+{gap}        if (total > 1000000)
+        {{
+{gap}            total = total - 1000000;
+{gap}        }}
+{gap}    }}
+{gap}    printf("%d\\n", total);
+}}
+"""
+
+
+def generate_array_fill(size=2000):
+    return f"""int main(void) {{
+    int i;
+    int a[{size}];
+    float b[{size}];
+    for (i = 0; i < {size}; i++) {{
+        a[i] = i * 2;
+        b[i] = a[i] / 4;
+    }}
+    printf("%d %f\\n", a[{size} - 1], b[{size} - 1]);
+}}
+"""
+
+
+def generate_call_loop(iterations=2000):
+    return f"""int square(int x) {{
+    return x * x;
+}}
+
+int main(void) {{
+    int i, total;
+    total = 0;
+    for (i = 0; i < {iterations}; i++) {{
+        total = total + square(i) - square(i - 1);
+    }}
+    printf("%d\\n", total);
+}}
+"""
+
+
+def generate_fib(n=16):
+    return f"""int fib(int n) {{
+    if (n < 2) {{
+        return n;
+    }}
+    return fib(n - 1) + fib(n - 2);
+}}
+
+int main(void) {{
+    int r;
+    r = fib({n});
+    printf("%d\\n", r);
+}}
+"""
+
+
+def generate_deep_recursion(depth=10000):
+    '''
+    A call chain `depth` frames deep, every frame adding to the result on
+    the way back.
+    '''
+    return f"""int down(int n) {{
+    if (n < 1) {{
+        return 0;
+    }}
+    return down(n - 1) + 1;
+}}
+
+int main(void) {{
+    int r;
+    r = down({depth});
+    printf("%d\\n", r);
+}}
+"""
+
+
+def run_program(code, tree=None, interpreter=None):
+    '''
+    Run a program to completion with the tree engine, with printf output
+    swallowed. Returns the number of execute_line calls.
+    '''
+    if tree is None:
+        tree = get_parser_tree(code)
+    if interpreter is None:
+        interpreter = cinterpreter.Interpreter(io.StringIO())
+    return interpreter.run(tree)
+
+
+def run_vm(code, tree=None):
+    if tree is None:
+        tree = get_parser_tree(code)
+    with contextlib.redirect_stdout(io.StringIO()):
+        VM(tree).run()
+
+
+def run_transpiled(code, tree=None):
+    if tree is None:
+        tree = get_parser_tree(code)
+    with contextlib.redirect_stdout(io.StringIO()):
+        ctranspiler.run_program(tree)
+
+
+def measure_memory(build, peak=False):
+    tracemalloc.start()
+    result = build()
+    size, peak_size = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak_size if peak else size
+
+
+def report(name, count, elapsed, unit="sources"):
+    print(f"{name:<32} {count:>8} {unit} in {elapsed:8.3f}s  ({count / elapsed:10.1f} {unit}/sec)")
+
+
+def bench_parse(rounds=20):
+    '''
+    Parse every source in inputs/ with a freshly built parser each time (cold,
+    what get_parser_tree used to do), once more without the shipped tables,
+    and with one shared CParser (warm).
+    '''
+    sources = load_sources()
+
+    count = len(sources)
+    start = time.perf_counter()
+    for code in sources:
+        CParser(tabmodule="cparsetab_missing", write_tables=False, errorlog=yacc.NullLogger()).parse(code)
+    report("parse (cold, building tables)", count, time.perf_counter() - start)
+
+    count = max(1, rounds // 4) * len(sources)
+    start = time.perf_counter()
+    for _ in range(max(1, rounds // 4)):
+        for code in sources:
+            CParser().parse(code)
+    report("parse (cold, new CParser)", count, time.perf_counter() - start)
+
+    parser = CParser()
+    count = rounds * len(sources)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for code in sources:
+            parser.parse(code)
+    report("parse (warm, shared CParser)", count, time.perf_counter() - start)
+
+
+def bench_cache(statements=5000, rounds=5):
+    '''
+    Time parsing a large generated source against loading its tree from a
+    cold and a warm on-disk ParseCache.
+    '''
+    code = generate_program(statements)
+    get_parser_tree("int main(void) {\n    return;\n}\n")  # keep table loading out of the numbers
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        get_parser_tree(code)
+    report(f"parse ({statements} stmts)", rounds, time.perf_counter() - start)
+
+    cache_dir = tempfile.mkdtemp(prefix="cparsecache")
+    try:
+        cache = ParseCache(cache_dir)
+        start = time.perf_counter()
+        cache.parse(code)
+        report("cache miss (parse + store)", 1, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            cache.parse(code)
+        report("cache hit (file read)", rounds, time.perf_counter() - start)
+        print(f"cache entry size: {cache.size() / 1024:.1f} KiB, hits {cache.hits}, misses {cache.misses}")
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+def bench_ast(statements=5000, rounds=3):
+    '''
+    Memory held by the tree of a large generated program as __slots__ nodes
+    and in the old list/dict form, and the time to interpret it.
+    '''
+    code = generate_program(statements)
+    get_parser_tree(code)
+    tree, node_bytes = measure_memory(lambda: get_parser_tree(code))
+    _, legacy_bytes = measure_memory(lambda: legacy_tree(tree))
+    print(f"tree memory, list/dict nodes: {legacy_bytes / 1024:10.1f} KiB")
+    print(f"tree memory, __slots__ nodes: {node_bytes / 1024:10.1f} KiB  ({node_bytes / legacy_bytes:.0%})")
+
+    start = time.perf_counter()
+    steps = 0
+    for _ in range(rounds):
+        steps += run_program(code, tree)
+    report(f"interpret ({statements} stmts)", steps, time.perf_counter() - start, unit="lines")
+
+
+def bench_long_expr(terms=400, statements=20, rounds=5):
+    '''
+    Parse sources made of very long arithmetic expressions. Expression text
+    and used variables are only built when the optimizer asks for them, so
+    that cost is timed separately.
+    '''
+    code = generate_long_expressions(terms, statements)
+    get_parser_tree("int main(void) {\n    return;\n}\n")
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        tree = get_parser_tree(code)
+    report(f"parse ({terms}-term expressions)", rounds, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for stmt in tree[0].stmts:
+        if isinstance(stmt, Assign):
+            stmt.expr.text
+            stmt.expr.arg_list
+    elapsed = time.perf_counter() - start
+    print(f"optimizer metadata on demand: {elapsed:.3f}s")
+
+
+def bench_eval(outer=60, inner=60, iterations=1000):
+    '''
+    Step a nested loop of plain arithmetic and a loop whose expressions
+    call functions through the tree engine.
+    '''
+    programs = [
+        ("nested loop", generate_nested_loops(outer, inner)),
+        ("call loop", generate_call_loop(iterations)),
+    ]
+    for name, code in programs:
+        tree = get_parser_tree(code)
+        start = time.perf_counter()
+        steps = run_program(code, tree)
+        report(name, steps, time.perf_counter() - start, unit="lines")
+
+
+def bench_engines(outer=200, inner=200, iterations=5000):
+    '''
+    Run loop-heavy programs to completion with the tree engine, the
+    bytecode engine and the Python translation, compilation included.
+    '''
+    programs = [
+        (f"nested loop {outer}x{inner}", generate_nested_loops(outer, inner)),
+        (f"call loop {iterations}", generate_call_loop(iterations)),
+    ]
+    engines = [("tree", run_program), ("vm", run_vm), ("python", run_transpiled)]
+    for name, code in programs:
+        tree = get_parser_tree(code)
+        timings = []
+        for engine, run in engines:
+            start = time.perf_counter()
+            run(code, tree)
+            timings.append((engine, time.perf_counter() - start))
+        tree_elapsed = timings[0][1]
+        columns = "  ".join(f"{engine} {elapsed:7.3f}s ({tree_elapsed / elapsed:5.1f}x)" for engine, elapsed in timings)
+        print(f"{name:<24} {columns}")
+
+
+def bench_loop(iterations=100000):
+    '''
+    Step through a long loop with the tree engine, which enters a for
+    iteration and an if scope every time around, and keeps the history of
+    the loop counter and the total.
+    '''
+    code = generate_loop(iterations)
+    tree = get_parser_tree(code)
+    start = time.perf_counter()
+    steps = run_program(code, tree)
+    report(f"loop of {iterations} iterations", steps, time.perf_counter() - start, unit="lines")
+    _, peak = measure_memory(lambda: run_program(code, tree), peak=True)
+    print(f"{'':<32} peak memory {peak / 1024:10.1f} KiB")
+
+
+def bench_scalar(iterations=50000):
+    '''
+    Step a tight loop of int arithmetic on a handful of variables, where
+    most of the work is reading and writing them, without histories and
+    with the history of every variable kept.
+    '''
+    code = generate_scalar_loop(iterations)
+    tree = get_parser_tree(code)
+    for mode in ["off", "all"]:
+        interpreter = cinterpreter.Interpreter(io.StringIO())
+        interpreter.retention.set(mode)
+        start = time.perf_counter()
+        steps = run_program(code, tree, interpreter)
+        report(f"scalar loop, history {mode}", steps, time.perf_counter() - start, unit="lines")
+
+
+def bench_recursion(fib_n=16, depths=(1000, 10000, 100000)):
+    '''
+    Run recursive programs, fib and call chains up to depths frames deep,
+    with the optimizer's analysis and without, and report the calls made
+    and the peak memory of a run.
+    '''
+    fib = [0, 1]
+    while len(fib) <= fib_n + 1:
+        fib.append(fib[-1] + fib[-2])
+    programs = [(f"fib({fib_n})", generate_fib(fib_n), 2 * fib[fib_n + 1])]
+    programs += [(f"depth {depth}", generate_deep_recursion(depth), depth + 2) for depth in depths]
+    for name, code, calls in programs:
+        tree = get_parser_tree(code)
+        for analysis in (True, False):
+            interpreter = cinterpreter.Interpreter(io.StringIO(), analysis=analysis)
+            interpreter.retention.set("off")
+            start = time.perf_counter()
+            run_program(code, tree, interpreter)
+            label = f"{name}, {'analysis' if analysis else 'no analysis'}"
+            report(label, calls, time.perf_counter() - start, unit="calls")
+            interpreter = cinterpreter.Interpreter(io.StringIO(), analysis=analysis)
+            interpreter.retention.set("off")
+            _, peak = measure_memory(lambda: run_program(code, tree, interpreter), peak=True)
+            print(f"{'':<32} peak memory {peak / 1024:10.1f} KiB")
+
+
+def bench_memo(fib_n=20, iterations=20000, size=1024):
+    '''
+    Run programs calling pure functions again with the same arguments, fib
+    and a loop calling square() twice per value, without a call cache and
+    with one of size results, in the tree engine and transpiled.
+    '''
+    programs = [(f"fib({fib_n})", generate_fib(fib_n)), (f"call loop of {iterations}", generate_call_loop(iterations))]
+    for name, code in programs:
+        tree = get_parser_tree(code)
+        expected = None
+        for memo in (None, CallCache(size)):
+            out = io.StringIO()
+            interpreter = cinterpreter.Interpreter(out, analysis=False, memo=memo)
+            interpreter.retention.set("off")
+            start = time.perf_counter()
+            steps = interpreter.run(tree)
+            report(f"{name}, {'cache' if memo else 'no cache'}", steps, time.perf_counter() - start, unit="lines")
+            if memo is None:
+                expected = out.getvalue()
+            else:
+                stats = memo.stats()
+                status = "same output" if out.getvalue() == expected else "OUTPUT DIFFERS"
+                print(f"{'':<32} {stats['hits']} hits, {stats['misses']} misses, {status}")
+        for memo in (None, CallCache(size)):
+            out = io.StringIO()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(out):
+                ctranspiler.run_program(tree, memo)
+            elapsed = time.perf_counter() - start
+            status = "same output" if out.getvalue() == expected else "OUTPUT DIFFERS"
+            print(f"{name + ', transpiled, ' + ('cache' if memo else 'no cache'):<32} {elapsed:8.3f}s  {status}")
+
+
+def bench_link(statements=20000, iterations=100000):
+    '''
+    Link and check a long program, and reject one whose only error is on
+    its last line, after a loop of `iterations`: it fails before running
+    any of it.
+    '''
+    tree = get_parser_tree(generate_program(statements))
+    start = time.perf_counter()
+    clinker.link(tree)
+    report(f"link {statements} statements", statements, time.perf_counter() - start, unit="statements")
+
+    code = generate_loop(iterations).replace('printf("%d\\n", total);', 'printf("%d\\n", totl);')
+    tree = get_parser_tree(code)
+    interpreter = cinterpreter.Interpreter(io.StringIO())
+    start = time.perf_counter()
+    try:
+        interpreter.run(tree)
+    except cinterpreter.CException as e:
+        message = str(e)
+    print(f"{'error after a long loop':<32} {time.perf_counter() - start:8.4f}s, {interpreter.clock.step} lines run: {message}")
+
+
+def bench_sparse(iterations=20000):
+    '''
+    Step through a loop spread over blank and brace-only lines, once with
+    the line table skipping the lines no statement starts on and once with
+    every line going through execute_line.
+    '''
+    code = generate_sparse_loop(iterations)
+    tree = get_parser_tree(code)
+    for name, skip in [("line table", True), ("every line", False)]:
+        interpreter = cinterpreter.Interpreter(io.StringIO())
+        interpreter.run(tree, 0)
+        if not skip:
+            interpreter.next_code = list(range(len(interpreter.next_code)))
+        start = time.perf_counter()
+        interpreter.next_lines(sys.maxsize)
+        report(f"sparse loop, {name}", interpreter.clock.step, time.perf_counter() - start, unit="lines")
+
+
+def bench_array(sizes=(500, 2000, 8000)):
+    '''
+    Fill an int and a float array element by element with the tree engine,
+    whose arrays keep a history for `trace`.
+    '''
+    for size in sizes:
+        code = generate_array_fill(size)
+        tree = get_parser_tree(code)
+        start = time.perf_counter()
+        steps = run_program(code, tree)
+        report(f"fill 2 arrays of {size}", steps, time.perf_counter() - start, unit="lines")
+        _, peak = measure_memory(lambda: run_program(code, tree), peak=True)
+        print(f"{'':<32} peak memory {peak / 1024:10.1f} KiB")
+
+
+def fill_history(size):
+    var = cinterpreter.VAR(cinterpreter.Interpreter(), "int", True, 1, CArray("int", size))
+    for index in range(size):
+        var.assign(index * 2, 6, index)
+    for index in range(size):
+        var.increment(7, index)
+    return var
+
+
+def bench_history(sizes=(2000, 100000)):
+    '''
+    Memory kept by the history of an array written twice per element, the
+    way an array filling loop leaves it for `trace`.
+    '''
+    for size in sizes:
+        start = time.perf_counter()
+        fill_history(size)
+        report(f"history of array[{size}]", 2 * size, time.perf_counter() - start, unit="writes")
+        var, retained = measure_memory(lambda: fill_history(size))
+        print(f"{'':<32} retained {retained / 1024:10.1f} KiB, {retained / (2 * size):6.1f} bytes/write")
+
+
+def bench_retention(iterations=30000):
+    '''
+    Run a long loop with the tree engine under each history retention
+    policy, see chistory.Retention.
+    '''
+    code = generate_loop(iterations)
+    tree = get_parser_tree(code)
+    policies = [("all", 0), ("last", 100), ("window", 1000), ("traced", 0), ("off", 0)]
+    for mode, limit in policies:
+        interpreter = cinterpreter.Interpreter(io.StringIO())
+        interpreter.retention.set(mode, limit)
+        start = time.perf_counter()
+        steps = run_program(code, tree, interpreter)
+        name = f"{mode} {limit}" if limit else mode
+        report(f"loop of {iterations}, {name}", steps, time.perf_counter() - start, unit="lines")
+        _, peak = measure_memory(lambda: run_program(code, tree, interpreter), peak=True)
+        print(f"{'':<32} peak memory {peak / 1024:10.1f} KiB")
+
+
+def bench_replay(iterations=30000):
+    '''
+    Step most of a long loop with every history kept, with none, and with
+    replay checkpoints only, then rebuild the history of `total` the way
+    `trace total` does under --history replay.
+    '''
+    code = generate_loop(iterations)
+    tree = get_parser_tree(code)
+    lines = 4 * iterations
+    for mode in ("all", "off", "replay"):
+        interpreter = cinterpreter.Interpreter(io.StringIO())
+        interpreter.retention.set(mode)
+        start = time.perf_counter()
+        interpreter.run(tree, lines)
+        report(f"step loop of {iterations}, {mode}", lines, time.perf_counter() - start, unit="lines")
+    var = interpreter.main_stack.top().get_var("total")
+    start = time.perf_counter()
+    interpreter.replay.rebuild(var)
+    report("rebuild history of total", len(var.history), time.perf_counter() - start, unit="values")
+
+
+def step_with_checkpoints(tree, lines, interpreter=None):
+    if interpreter is None:
+        interpreter = cinterpreter.Interpreter(io.StringIO())
+    interpreter.run(tree, 0)
+    interpreter.start_replay()
+    interpreter.next_lines(lines)
+    return interpreter
+
+
+def bench_prev(iterations=30000):
+    '''
+    Step most of a long loop with the checkpoints the REPL keeps for
+    `prev`, then go back various distances, against restarting the
+    program and stepping to the same line again.
+    '''
+    code = generate_loop(iterations)
+    tree = get_parser_tree(code)
+    lines = 4 * iterations
+    start = time.perf_counter()
+    run_program(code, tree)
+    report(f"step loop of {iterations}", lines, time.perf_counter() - start, unit="lines")
+    start = time.perf_counter()
+    interpreter = step_with_checkpoints(tree, lines)
+    report("step with checkpoints", lines, time.perf_counter() - start, unit="lines")
+    print(f"{'':<32} {len(interpreter.replay.steps)} checkpoints")
+
+    for back in (1, 100, 10000, lines // 2):
+        interpreter = step_with_checkpoints(tree, lines)
+        start = time.perf_counter()
+        interpreter.replay.rewind(lines - back)
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        cinterpreter.Interpreter(io.StringIO()).run(tree, lines - back)
+        restart = time.perf_counter() - start
+        print(f"prev {back:<27} {elapsed:8.4f}s, restarting takes {restart:8.4f}s")
+
+
+def bench_snapshot(iterations=30000):
+    '''
+    Save the state halfway through a long loop to a file and load it back,
+    with every history kept and with replay checkpoints only.
+    '''
+    code = generate_loop(iterations)
+    tree = get_parser_tree(code)
+    lines = 2 * iterations
+    filename = os.path.join(tempfile.gettempdir(), "cbenchmark.snapshot")
+    for mode in ("all", "replay"):
+        interpreter = cinterpreter.Interpreter(io.StringIO())
+        interpreter.retention.set(mode)
+        step_with_checkpoints(tree, lines, interpreter)
+        start = time.perf_counter()
+        size = interpreter.save_state(filename)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        interpreter.load_state(filename)
+        loaded = time.perf_counter() - start
+        print(f"{'save/load, ' + mode:<32} {size / 1024:8.1f} KiB, save {saved:.4f}s, load {loaded:.4f}s")
+    os.remove(filename)
+
+
+def session_programs(count, iterations):
+    generators = [
+        lambda: generate_loop(iterations),
+        lambda: generate_call_loop(iterations // 4),
+        lambda: generate_array_fill(iterations // 4),
+        lambda: generate_nested_loops(iterations // 100, 100),
+    ]
+    return [generators[index % len(generators)]() for index in range(count)]
+
+
+def run_session(tree):
+    out = io.StringIO()
+    cinterpreter.Interpreter(out).run(tree)
+    return out.getvalue()
+
+
+def run_session_source(code):
+    return run_session(get_parser_tree(code))
+
+
+def bench_sessions(count=8, iterations=20000, workers=4):
+    '''
+    Run several programs to completion, one interpreter each: one after
+    the other, in a thread pool sharing the parse trees, and in a process
+    pool where every worker parses its program. The printf output has to
+    be the same every way.
+    '''
+    codes = session_programs(count, iterations)
+    trees = [get_parser_tree(code) for code in codes]
+    start = time.perf_counter()
+    expected = [run_session(tree) for tree in trees]
+    print(f"{f'{count} sessions, serial':<32} {time.perf_counter() - start:8.3f}s")
+
+    for name, pool, run, programs in [
+        ("threads", concurrent.futures.ThreadPoolExecutor, run_session, trees),
+        ("processes", concurrent.futures.ProcessPoolExecutor, run_session_source, codes),
+    ]:
+        with pool(workers) as executor:
+            start = time.perf_counter()
+            outputs = list(executor.map(run, programs))
+            elapsed = time.perf_counter() - start
+        status = "same output" if outputs == expected else "OUTPUT DIFFERS"
+        print(f"{f'{count} sessions, {workers} {name}':<32} {elapsed:8.3f}s, {status}")
+
+
+BENCHMARKS = {
+    "parse": bench_parse,
+    "cache": bench_cache,
+    "ast": bench_ast,
+    "long_expr": bench_long_expr,
+    "eval": bench_eval,
+    "engines": bench_engines,
+    "loop": bench_loop,
+    "scalar": bench_scalar,
+    "recursion": bench_recursion,
+    "link": bench_link,
+    "memo": bench_memo,
+    "sparse": bench_sparse,
+    "array": bench_array,
+    "history": bench_history,
+    "retention": bench_retention,
+    "replay": bench_replay,
+    "prev": bench_prev,
+    "snapshot": bench_snapshot,
+    "sessions": bench_sessions,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] if len(sys.argv) > 1 else list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark {name}, choose from: {', '.join(BENCHMARKS)}")
+            continue
+        print(f"== {name}")
+        BENCHMARKS[name]()
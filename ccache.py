@@ -0,0 +1,168 @@
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+
+from cyacc import get_parser, get_parser_tree
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Everything that decides the shape of a parse tree. Editing any of these
+# files changes GRAMMAR_VERSION, so stale trees are never served.
+GRAMMAR_FILES = ["clexer.py", "cnodes.py", "cyacc.py"]
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "CINTERPRETER_CACHE_DIR",
+    os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "cs420_project", "ast"))
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+CACHE_SUFFIX = ".ast"
+
+
+def get_grammar_version():
+    digest = hashlib.sha256()
+    for filename in GRAMMAR_FILES:
+        f = open(os.path.join(BASE_DIR, filename), "rb")
+        digest.update(f.read())
+        f.close()
+    return digest.hexdigest()
+
+
+GRAMMAR_VERSION = get_grammar_version()
+
+
+class ParseCache:
+    """On-disk cache of parse trees keyed by source hash and grammar version.
+
+    Entries are written to a temporary file and renamed into place, so
+    several interpreters can share one directory. A hit refreshes the file
+    mtime; when the directory grows past max_bytes the least recently used
+    entries are removed.
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def key(self, code):
+        digest = hashlib.sha256(GRAMMAR_VERSION.encode())
+        digest.update(code.encode())
+        return digest.hexdigest()
+
+    def path(self, code):
+        return os.path.join(self.cache_dir, self.key(code) + CACHE_SUFFIX)
+
+    def get(self, code):
+        path = self.path(code)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        # The tree is hundreds of thousands of small containers and none of
+        # them are garbage, so keep the cyclic collector out of the load.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            tree = pickle.load(f)
+        except Exception:
+            # Truncated or written by an incompatible Python, drop it
+            tree = None
+        finally:
+            if gc_enabled:
+                gc.enable()
+            f.close()
+
+        if tree is None:
+            self.remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return tree
+
+    def put(self, code, tree):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(tree, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path(code))
+        except BaseException:
+            self.remove(tmp_path)
+            raise
+        self.evict()
+
+    def parse(self, code):
+        tree = self.get(code)
+        if tree is not None:
+            self.hits += 1
+            return tree
+
+        self.misses += 1
+        parser = get_parser()
+        tree = parser.parse(code)
+        # Keep sources with syntax errors uncached so the errors are reported every run
+        if tree is not None and parser.syntax_errors == 0:
+            try:
+                self.put(code, tree)
+            except OSError:
+                # A full or read-only cache only costs us the next parse
+                pass
+        return tree
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            self.remove(path)
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+DEFAULT_CACHE = None
+
+
+def get_cache():
+    global DEFAULT_CACHE
+    if DEFAULT_CACHE is None:
+        DEFAULT_CACHE = ParseCache()
+    return DEFAULT_CACHE
+
+
+def get_cached_parser_tree(code):
+    try:
+        cache = get_cache()
+    except OSError:
+        return get_parser_tree(code)
+    return cache.parse(code)
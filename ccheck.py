@@ -0,0 +1,101 @@
+'''
+Differential check of the execution engines.
+
+Every program in inputs/ and in PROGRAMS is run to completion by the tree
+engine, which is the reference, and by each other engine; their printf
+output has to match exactly.
+
+    python ccheck.py [file.c ...]
+'''
+import contextlib
+import glob
+import io
+import os
+import sys
+
+import cinterpreter
+from coptimization import CException
+from ctranspiler import run_program as run_transpiled
+from cvm import VM
+from cyacc import get_parser_tree
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inputs")
+
+# programs that are no input of the course, by name
+PROGRAMS = {
+    # deeper than Python's recursion limit
+    "deep recursion": """int sum(int n) {
+    if (n < 1) {
+        return 0;
+    }
+    return sum(n - 1) + n;
+}
+
+int main(void) {
+    int r;
+    r = sum(3000);
+    printf("%d\\n", r);
+}
+""",
+}
+
+
+def run_tree(tree):
+    cinterpreter.run(tree)
+
+
+def run_vm(tree):
+    VM(tree).run()
+
+
+ENGINES = {
+    "vm": run_vm,
+    "python": run_transpiled,
+}
+
+
+def capture(run, tree):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            run(tree)
+        except CException as e:
+            print("Compile Error: ", e)
+    return out.getvalue()
+
+
+def check_file(filename):
+    f = open(filename, "r")
+    code = "".join(f.readlines())
+    f.close()
+    return check_code(code)
+
+
+def check_code(code):
+    tree = get_parser_tree(code)
+    expected = capture(run_tree, tree)
+    failures = []
+    for name, run in ENGINES.items():
+        if capture(run, tree) != expected:
+            failures.append(name)
+    return failures
+
+
+def input_files():
+    return [filename for filename in sorted(glob.glob(os.path.join(INPUT_DIR, "*.c")))
+            if not filename.endswith("_output.c")]
+
+
+if __name__ == "__main__":
+    checks = [(os.path.basename(filename), check_file, filename) for filename in sys.argv[1:] or input_files()]
+    if len(sys.argv) == 1:
+        checks += [(name, check_code, code) for name, code in PROGRAMS.items()]
+    failed = False
+    for name, check, source in checks:
+        failures = check(source)
+        if failures:
+            failed = True
+            print(f"{name}: output differs for {', '.join(failures)}")
+        else:
+            print(f"{name}: ok")
+    sys.exit(1 if failed else 0)
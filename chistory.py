@@ -0,0 +1,516 @@
+'''
+Value history of interpreted variables, for `trace`.
+
+Every change is one row of a delta log kept in array.array columns: the
+step it happened at, its line, the array index (-1 for scalars) and the
+old and new value. Row 0 is the declaration. Values go in a column of the
+variable's type. A flags byte per row marks the ones that are None, and
+the few left that do not fit (an int handed to a float parameter, huge
+ints) are kept aside in a dict by row.
+
+An array's history also keeps checkpoints, copies of the whole array after
+some row, so a history trimmed to its latest changes starts over from the
+nearest checkpoint instead of from the declaration.
+
+How much is kept is set by the Retention of the interpreter the variable
+belongs to, and rows are stamped by its Clock.
+'''
+from array import array
+from bisect import bisect_left, bisect_right
+
+# At least this many writes between two checkpoints of an array, more for
+# big arrays so that checkpoints never outweigh the log itself
+CHECKPOINT_INTERVAL = 256
+
+
+class Clock:
+    '''
+    Number of lines executed so far, the "step" rows are stamped with.
+    '''
+    __slots__ = ("step",)
+
+    def __init__(self):
+        self.step = 0
+
+
+class Retention:
+    '''
+    What variable histories keep:
+
+        all     every change
+        off     nothing
+        last    the last `limit` changes of each variable
+        window  the changes of the last `limit` steps
+        traced  every change, but only of the variables named in `traced`
+        replay  nothing; the interpreter keeps sparse checkpoints of its
+                state instead and rebuilds a history by replaying from
+                them when it is asked for
+
+    last and window drop old changes in chunks of `limit`, so the history of
+    a scalar holds at most 2 * limit changes under last, and those of the
+    last 2 * limit steps under window. An array's history can only start
+    at one of its checkpoints, and drops changes in chunks of at least its
+    checkpoint interval, max(CHECKPOINT_INTERVAL, array length): it holds up
+    to limit + max(limit, interval).
+    '''
+    MODES = ("all", "off", "last", "window", "traced", "replay")
+
+    __slots__ = ("mode", "limit", "traced", "watched")
+
+    def __init__(self):
+        self.mode = "all"
+        self.limit = 0
+        self.traced = set()
+        # variable uid -> the variable, for the ones a replay rebuilds
+        self.watched = {}
+
+    def set(self, mode, limit=0):
+        if mode not in self.MODES:
+            raise ValueError(f"unknown history mode {mode}, expected one of {', '.join(self.MODES)}")
+        if mode in ("last", "window"):
+            if limit < 1:
+                raise ValueError(f"history mode {mode} needs a limit of at least 1")
+        else:
+            limit = 0
+        self.mode = mode
+        self.limit = limit
+
+    def keeps(self, name):
+        '''
+        Whether a variable of this name keeps a history at all.
+        '''
+        if self.mode == "off" or self.mode == "replay":
+            return False
+        return self.mode != "traced" or name in self.traced
+
+    def __str__(self):
+        if self.mode == "last":
+            return f"last {self.limit} changes per variable"
+        if self.mode == "window":
+            return f"changes of the last {self.limit} steps"
+        if self.mode == "traced":
+            return f"traced variables only ({', '.join(sorted(self.traced)) or 'none yet'})"
+        if self.mode == "replay":
+            return "rebuilt by replay when traced"
+        return self.mode
+
+
+class History:
+    '''
+    Changes of one variable. A row may stand for a run of changes made on
+    the same line at a constant step distance whose values form an
+    arithmetic progression, like a loop counter going 0, 1, 2, ... Runs
+    have their own columns: the row they start at, their length and the
+    strides of step, index and value. A change is addressed by its
+    position (row, offset in the run).
+
+    clock and retention are the ones of the interpreter the variable
+    belongs to.
+    '''
+    def __init__(self, var_type, lineno, value, is_array, clock, retention):
+        self.clock = clock
+        self.retention = retention
+        if "float" in var_type:
+            self.kind, typecode = float, 'd'
+        else:
+            self.kind, typecode = int, 'q'
+        self.is_array = is_array
+        self.steps = array('q')
+        self.lines = array('i')
+        self.indexes = array('q')
+        self.old = array(typecode)
+        self.new = array(typecode)
+        self.flags = bytearray()
+        # (row, which) -> value not stored in the typed column
+        self.odd = {}
+        self.run_rows = array('q')
+        self.run_counts = array('q')
+        self.run_step_strides = array('q')
+        self.run_index_strides = array('q')
+        self.run_value_strides = array(typecode)
+        self.length = 0
+        # changes dropped by the retention policy, and when to drop more
+        self.forgotten = 0
+        self.trim_length = 0
+        self.trim_step = 0
+
+        if is_array:
+            self.checkpoints = [((0, 0), value.snapshot())]
+            self.checkpoint_positions = [(0, 0)]
+            self.interval = max(CHECKPOINT_INTERVAL, len(value))
+            self.since_checkpoint = 0
+            self.append(lineno, -1, None, None)
+        else:
+            self.append(lineno, -1, None, value)
+
+    def __len__(self):
+        return self.length
+
+    def __deepcopy__(self, memo):
+        # copies of the interpreter state share the log, see truncate()
+        return self
+
+    # flags of a row, for which = 0 (old) and 1 (new)
+    NONE = (1, 2)
+    ODD = (4, 8)
+
+    def store(self, column, row, which, value):
+        '''
+        Append value to column and return its flags.
+        '''
+        if type(value) is self.kind:
+            try:
+                column.append(value)
+                return 0
+            except OverflowError:
+                pass
+        column.append(0)
+        if value is None:
+            return self.NONE[which]
+        self.odd[row, which] = value
+        return self.ODD[which]
+
+    def load(self, column, row, which):
+        flags = self.flags[row]
+        if flags:
+            if flags & self.NONE[which]:
+                return None
+            if flags & self.ODD[which]:
+                return self.odd[row, which]
+        return column[row]
+
+    def change(self, row, offset):
+        '''
+        (step, lineno, index, old, new) of the change at (row, offset).
+        '''
+        new = self.load(self.new, row, 1)
+        old = self.load(self.old, row, 0)
+        if offset == 0:
+            return self.steps[row], self.lines[row], self.indexes[row], old, new
+        run = self.run_of(row)
+        step_stride = self.run_step_strides[run]
+        index_stride = self.run_index_strides[run]
+        value_stride = self.run_value_strides[run]
+        if not self.is_array:
+            old = new + (offset - 1) * value_stride
+        return (self.steps[row] + offset * step_stride, self.lines[row],
+                self.indexes[row] + offset * index_stride, old, new + offset * value_stride)
+
+    def run_of(self, row):
+        '''
+        Index of the run starting at row in the run columns, or None.
+        '''
+        run = bisect_left(self.run_rows, row)
+        if run < len(self.run_rows) and self.run_rows[run] == row:
+            return run
+        return None
+
+    def extend_run(self, row, step, lineno, index, old, new):
+        '''
+        Count the change in as the next element of a run and return its
+        position, or None. A run is started once the last two rows and the
+        change line up, and only the last row can be a run still growing.
+        '''
+        if self.lines[row] != lineno or type(new) is not self.kind:
+            return None
+        run_rows = self.run_rows
+        if len(run_rows) != 0 and run_rows[-1] == row:
+            count = self.run_counts[-1]
+            if step != self.steps[row] + count * self.run_step_strides[-1]:
+                return None
+            if index != self.indexes[row] + count * self.run_index_strides[-1]:
+                return None
+            value_stride = self.run_value_strides[-1]
+            first = self.new[row]
+            if new != first + count * value_stride:
+                return None
+            if self.is_array:
+                # the element overwritten has to be the same for the whole run
+                if old != self.load(self.old, row, 0):
+                    return None
+            elif old != first + (count - 1) * value_stride:
+                return None
+            self.run_counts[-1] = count + 1
+            return row, count
+
+        first = row - 1
+        if first <= 0 or self.lines[first] != lineno or self.flags[row] or self.flags[first] & 10:
+            return None
+        if len(run_rows) != 0 and run_rows[-1] == first:
+            return None
+        step_stride = self.steps[row] - self.steps[first]
+        if step_stride <= 0 or step - self.steps[row] != step_stride:
+            return None
+        index_stride = self.indexes[row] - self.indexes[first]
+        if index - self.indexes[row] != index_stride:
+            return None
+        value_stride = self.new[row] - self.new[first]
+        if new - self.new[row] != value_stride:
+            return None
+        # float strides are only exact when the value does not move
+        if self.kind is float and value_stride != 0:
+            return None
+        if self.is_array:
+            if not old == self.old[row] == self.load(self.old, first, 0):
+                return None
+        elif self.old[row] != self.new[first] or old != self.new[row]:
+            return None
+
+        for column in (self.steps, self.lines, self.indexes, self.old, self.new, self.flags):
+            column.pop()
+        if self.is_array and self.checkpoint_positions[-1] == (row, 0):
+            # the row a checkpoint was taken at is now part of the run
+            self.checkpoint_positions[-1] = (first, 1)
+            self.checkpoints[-1] = ((first, 1), self.checkpoints[-1][1])
+        run_rows.append(first)
+        self.run_counts.append(3)
+        self.run_step_strides.append(step_stride)
+        self.run_index_strides.append(index_stride)
+        self.run_value_strides.append(value_stride)
+        return first, 2
+
+    def append(self, lineno, index, old, new):
+        '''
+        Log a change and return its position.
+        '''
+        step = self.clock.step
+        row = len(self.steps) - 1
+        self.length += 1
+        if row > 0:
+            position = self.extend_run(row, step, lineno, index, old, new)
+            if position is not None:
+                return position
+
+        row += 1
+        self.steps.append(step)
+        self.lines.append(lineno)
+        self.indexes.append(index)
+        flags = self.store(self.old, row, 0, old)
+        flags |= self.store(self.new, row, 1, new)
+        self.flags.append(flags)
+        return row, 0
+
+    def record(self, lineno, index, old, new, contents=None):
+        '''
+        Log a change; contents is the array after it, to checkpoint from.
+        '''
+        position = self.append(lineno, index, old, new)
+        if self.is_array:
+            self.since_checkpoint += 1
+            if self.since_checkpoint >= self.interval:
+                self.checkpoints.append((position, contents.snapshot()))
+                self.checkpoint_positions.append(position)
+                self.since_checkpoint = 0
+        if self.retention.limit and (self.length >= self.trim_length or self.clock.step >= self.trim_step):
+            self.trim()
+
+    def trim(self):
+        '''
+        Drop what the retention policy no longer keeps, and set when to
+        look again.
+        '''
+        mode, limit = self.retention.mode, self.retention.limit
+        chunk = max(limit, self.interval) if self.is_array else limit
+        if mode == "last":
+            self.trim_length = limit + chunk
+            self.trim_step = 1 << 62
+            if self.length <= limit:
+                return
+            position = self.position_of(self.length - limit)
+        elif mode == "window":
+            self.trim_length = 1 << 62
+            self.trim_step = self.clock.step + chunk
+            # the change in effect when the window starts is kept too
+            position = self.position_at(self.clock.step - limit)
+            if position is None:
+                return
+        else:
+            self.trim_length = self.trim_step = 1 << 62
+            return
+
+        if self.is_array:
+            # an array can only start over from one of its checkpoints
+            which = bisect_right(self.checkpoint_positions, position) - 1
+            position = self.checkpoint_positions[which]
+        self.forget(position)
+
+    def truncate(self, step):
+        '''
+        Drop the changes made after the given step, for going back to it.
+        Returns False, and keeps everything, when the history starts later.
+        '''
+        position = self.position_at(step)
+        if position is None:
+            return False
+        row, offset = position
+
+        runs = bisect_right(self.run_rows, row)
+        if runs != 0 and self.run_rows[runs - 1] == row:
+            if offset == 0:
+                runs -= 1
+            else:
+                self.run_counts[runs - 1] = offset + 1
+        for column in (self.run_rows, self.run_counts, self.run_step_strides, self.run_index_strides,
+                       self.run_value_strides):
+            del column[runs:]
+        for column in (self.steps, self.lines, self.indexes, self.old, self.new, self.flags):
+            del column[row + 1:]
+        if self.odd:
+            self.odd = {key: value for key, value in self.odd.items() if key[0] <= row}
+        self.length = len(self.steps) + sum(self.run_counts) - len(self.run_counts)
+
+        if self.is_array:
+            which = bisect_right(self.checkpoint_positions, position)
+            del self.checkpoints[which:]
+            del self.checkpoint_positions[which:]
+            self.since_checkpoint = sum(1 for _ in self.positions(self.checkpoint_positions[-1])) - 1
+        self.trim_length = self.trim_step = 0
+        return True
+
+    def position_of(self, number):
+        '''
+        Position of the change with the given number, counting from 0.
+        '''
+        run = 0
+        for row in range(len(self.steps)):
+            count = 1
+            if run < len(self.run_rows) and self.run_rows[run] == row:
+                count = self.run_counts[run]
+                run += 1
+            if number < count:
+                return row, number
+            number -= count
+        raise IndexError("no such change")
+
+    def forget(self, position):
+        '''
+        Drop every change before position, which becomes row 0.
+        '''
+        row, offset = position
+        if row == 0 and offset == 0:
+            return
+        run = self.run_of(row)
+        count = 1 if run is None else self.run_counts[run]
+        dropped = row + offset
+        for earlier in range(len(self.run_rows)):
+            if self.run_rows[earlier] >= row:
+                break
+            dropped += self.run_counts[earlier] - 1
+
+        # the change at position, and the rest of its run if any, lead
+        head = [self.change(row, offset)]
+        if offset + 1 < count:
+            head.append(self.change(row, offset + 1))
+        shift = row + 1 - len(head)
+
+        def moved(position):
+            if position[0] == row:
+                return (0, 0) if position[1] == offset else (1, position[1] - offset - 1)
+            return position[0] - shift, position[1]
+
+        columns = (self.steps, self.lines, self.indexes, self.old, self.new)
+        self.steps, self.lines, self.indexes, self.old, self.new = [
+            array(column.typecode) for column in columns]
+        flags = self.flags
+        self.flags = bytearray()
+        odd = self.odd
+        self.odd = {}
+        for step, lineno, index, old, new in head:
+            self.steps.append(step)
+            self.lines.append(lineno)
+            self.indexes.append(index)
+            self.flags.append(self.store(self.old, len(self.flags), 0, old) |
+                              self.store(self.new, len(self.flags), 1, new))
+        for column, kept in zip((self.steps, self.lines, self.indexes, self.old, self.new), columns):
+            column.extend(kept[row + 1:])
+        self.flags.extend(flags[row + 1:])
+        for (odd_row, which), value in odd.items():
+            if odd_row > row:
+                self.odd[odd_row - shift, which] = value
+
+        runs = (self.run_rows, self.run_counts, self.run_step_strides, self.run_index_strides,
+                self.run_value_strides)
+        self.run_rows, self.run_counts, self.run_step_strides, self.run_index_strides, \
+            self.run_value_strides = [array(column.typecode) for column in runs]
+        for which in range(len(runs[0])):
+            start, run_count = runs[0][which], runs[1][which]
+            if start == row:
+                # what is left of the run goes on from row 1
+                start, run_count = 1, run_count - offset - 1
+                if run_count < 2:
+                    continue
+            elif start > row:
+                start -= shift
+            else:
+                continue
+            self.run_rows.append(start)
+            self.run_counts.append(run_count)
+            self.run_step_strides.append(runs[2][which])
+            self.run_index_strides.append(runs[3][which])
+            self.run_value_strides.append(runs[4][which])
+
+        if self.is_array:
+            self.checkpoints = [(moved(kept), contents) for kept, contents in self.checkpoints
+                                if kept >= position]
+            self.checkpoint_positions = [kept for kept, _ in self.checkpoints]
+        self.length -= dropped
+        self.forgotten += dropped
+
+    def positions(self, start=(0, 0)):
+        row, offset = start
+        run = bisect_left(self.run_rows, row)
+        while row < len(self.steps):
+            count = 1
+            if run < len(self.run_rows) and self.run_rows[run] == row:
+                count = self.run_counts[run]
+                run += 1
+            while offset < count:
+                yield row, offset
+                offset += 1
+            row += 1
+            offset = 0
+
+    def position_at(self, step):
+        '''
+        Position of the last change made up to the given step, None if
+        there is none.
+        '''
+        row = bisect_right(self.steps, step) - 1
+        if row < 0:
+            return None
+        run = self.run_of(row)
+        if run is None:
+            return row, 0
+        step_stride = self.run_step_strides[run]
+        return row, min(self.run_counts[run] - 1, (step - self.steps[row]) // step_stride)
+
+    def versions(self):
+        '''
+        (lineno, value) for every value the variable had, in order. Runs
+        are only expanded here.
+        '''
+        if not self.is_array:
+            for position in self.positions():
+                _, lineno, _, _, new = self.change(*position)
+                yield lineno, new
+            return
+
+        contents = self.checkpoints[0][1].tolist()
+        yield self.lines[0], list(contents)
+        for position in self.positions((1, 0)):
+            _, lineno, index, _, new = self.change(*position)
+            contents[index] = new
+            yield lineno, list(contents)
+
+    def nbytes(self):
+        size = 0
+        for column in (self.steps, self.lines, self.indexes, self.old, self.new, self.run_rows,
+                       self.run_counts, self.run_step_strides, self.run_index_strides, self.run_value_strides):
+            size += column.itemsize * len(column)
+        size += len(self.flags)
+        # a dict entry with its tuple key, roughly
+        size += 100 * len(self.odd)
+        if self.is_array:
+            # checkpoints sharing buffers with the array are counted anyway
+            size += sum(contents.nbytes() for _, contents in self.checkpoints)
+        return size
@@ -1,14 +1,33 @@
-from cyacc import get_parser_tree
+from carray import CArray
+from ccache import get_cached_parser_tree
+from chistory import Clock, History, Retention
+from clinker import link
+from cmemo import MISSING, CallCache
+from cnodes import *
 from coptimization import *
+from cresolver import FrameLayout
+from ctranspiler import run_program as run_transpiled
+from cvm import VM
+import argparse
 import ast
+import bisect
+import contextlib
 import copy
+import csnapshot
 import enum
+import operator
+import os
 import sys
 
 DEBUG = False
 
+# at most this many frames are kept for reuse; deeper recursion allocates
+MAX_FREE_FRAMES = 256
+
 
 class Stack:
+    __slots__ = ("stack",)
+
     def __init__(self):
         self.stack = []
 
@@ -16,34 +35,44 @@ class Stack:
         self.stack.append(elem)
 
     def top(self):
-        if len(self.stack) == 0:
-            return None
-
-        return self.stack[-1]
+        stack = self.stack
+        return stack[-1] if stack else None
 
     def pop(self):
-        if len(self.stack) != 0:
+        if self.stack:
             self.stack.pop()
 
     def isEmpty(self):
-        return len(self.stack) == 0
-
-
-MAIN_STACK = Stack()
-PLAIN_CODE = ""
-PLAIN_CODE_ONE_LINE = ""
-CURRENT_LINE = 0
-FUNCTION_DICT = {}
-
-
+        return not self.stack
 
 
 class VAR:
-    def __init__(self, var_type, is_array, lineno, value=None):
+    '''
+    Every value the variable takes is logged in history, see chistory;
+    history is None when the retention policy keeps none for it. Arrays
+    are written in place. uid, the step the variable was made at and its
+    name, is the same every time the program runs.
+    '''
+    __slots__ = ("type", "is_array", "value", "uid", "history")
+
+    def __init__(self, interpreter, var_type, is_array, lineno, value=None, name=None):
         self.type = var_type
         self.is_array = is_array
         self.value = value
-        self.history = [[lineno, value]]
+        self.uid = (interpreter.clock.step, name)
+        self.history = None
+        retention = interpreter.retention
+        if retention.keeps(name):
+            self.start_history(interpreter, lineno)
+        elif self.uid in retention.watched:
+            self.start_history(interpreter, lineno)
+            retention.watched[self.uid] = self
+
+    def start_history(self, interpreter, lineno):
+        '''
+        Keep a history from now on, starting with the current value.
+        '''
+        self.history = History(self.type, lineno, self.value, self.is_array, interpreter.clock, interpreter.retention)
 
     def assign(self, value, lineno, index=None):
         if "int" in self.type:
@@ -52,23 +81,31 @@ class VAR:
             value = float(value)
 
         if self.is_array:
-            new_value = copy.deepcopy(self.value)
-            new_value[index] = value
+            index = self.value.position(index)
+            old = self.value[index]
+            self.value[index] = value
+            if self.history is not None:
+                self.history.record(lineno, index, old, value, self.value)
         else:
-            new_value = value
-
-        self.history.append([lineno, new_value])
-        self.value = new_value
+            if self.history is not None:
+                self.history.record(lineno, -1, self.value, value)
+            self.value = value
     
     def increment(self, lineno, index=None):
         if self.is_array:
-            new_value = copy.deepcopy(self.value)
-            new_value[index] = new_value[index] + 1
+            index = self.value.position(index)
+            old = self.value[index]
+            self.value[index] = old + 1
+            if self.history is not None:
+                self.history.record(lineno, index, old, old + 1, self.value)
         else:
-            new_value = self.value + 1
-        
-        self.history.append([lineno, new_value])
-        self.value = new_value
+            old = self.value
+            self.value = old + 1
+            if self.history is not None:
+                self.history.record(lineno, -1, old, self.value)
+
+    def iter_history(self):
+        return self.history.versions()
 
 
 class ScopeType(enum.Enum):
@@ -78,14 +115,23 @@ class ScopeType(enum.Enum):
 
 
 class Scope:
-    def __init__(self, stmts, type):
-        self.stmts = copy.deepcopy(stmts)
+    '''
+    One activation of a statement list, a frame: idx is its program counter
+    and pending the evaluation waiting for a call to return. The parse tree
+    is never modified while running, so stmts is shared with it and nothing
+    has to be copied on entry. declared is the frame slots the statements
+    declare, emptied again when the block is left.
+    '''
+    __slots__ = ("stmts", "type", "idx", "pending", "declared", "lineno")
+
+    def __init__(self, stmts, type, declared=()):
+        self.stmts = stmts
         self.type = type
         self.idx = 0
-        self.dest = [] # Where the return value had to be located
-        self.declared_vars = []
+        self.pending = None # Evaluation waiting for a call to return
+        self.declared = declared
 
-        self.lineno = [self.stmts[0][1]["lineno"], self.stmts[-1][1]["lineno"]]
+        self.lineno = [self.stmts[0].lineno, self.stmts[-1].lineno]
     
     def update_idx(self):
         self.idx += 1
@@ -95,15 +141,17 @@ class Scope:
 
 
 class ForScope(Scope):
+    __slots__ = ("done", "func")
+
     def __init__(self, for_info, func):
         # stmts: [assign, increment, condition, ..stmts..]
-        super(ForScope, self).__init__([for_info["assign"], for_info["increment"], for_info["condition"]] + for_info["stmts"], ScopeType.FOR)
-        self.original_stmts = copy.deepcopy(self.stmts)
+        super(ForScope, self).__init__([for_info.assign, for_info.increment, for_info.condition] + for_info.stmts, ScopeType.FOR,
+                                       for_info._declared)
         self.done = False
         self.func = func
 
     def init(self):
-        self.stmts = copy.deepcopy(self.original_stmts)
+        self.pending = None
 
     def update_idx(self):
         if self.idx == 0:
@@ -121,13 +169,14 @@ class ForScope(Scope):
         return self.done
 
     def release_vars(self):
-        for var in self.declared_vars:
-            self.func.release_var(var)
+        self.func.release_vars(self.declared)
 
 
 class IfScope(Scope):
+    __slots__ = ("done", "func")
+
     def __init__(self, if_info, func):
-        super(IfScope, self).__init__([if_info["condition"]] + if_info["stmts"], ScopeType.IF)
+        super(IfScope, self).__init__([if_info.condition] + if_info.stmts, ScopeType.IF, if_info._declared)
         self.done = False
         self.func = func
     
@@ -138,672 +187,1410 @@ class IfScope(Scope):
         return self.done or self.idx == len(self.stmts)
 
     def release_vars(self):
-        for var in self.declared_vars:
-            self.func.release_var(var)
+        self.func.release_vars(self.declared)
 
 
 class Function(Optimization):
-    def __init__(self):
-        super(Function, self).__init__()
-        self.vars = {}
-        self.stack = Stack()
-
-    def __init__(self, func, args=[]):
-        super(Function, self).__init__()
-        self.vars = {}
+    '''
+    A frame of interpreter, running a call of a function from enter() on,
+    and reporting to the interpreter's optimizer context. slots holds its
+    variables at the places cresolver gave them, None for one not declared
+    at this point. cpis and csis are None when the optimizer records
+    nothing: the frame keeps no bookkeeping then.
+
+    Frames are taken from the interpreter's free list by Interpreter.call
+    and given back when their call returns. memo_key is where the return
+    value goes in the interpreter's CallCache, None when it is not kept.
+    '''
+    __slots__ = ("slots", "layout", "stack", "interpreter", "memo_key")
+
+    def __init__(self, interpreter):
+        self.context = interpreter.optimizer
+        self.interpreter = interpreter
         self.stack = Stack()
-
-        content = func[1]
-
-        name = content["name"]
-        # Argument
-        params = content["params"]
-        lineno = content["lineno"]
-
-        expected_args_length = 0
-        if len(params) != 0 and params != ["void"] and params != [None]:
-            expected_args_length = len(params)
-            if "void" in params:
-                raise CException(f"Function {name}'void' must be the first and only parameter if specified")
-        else:
-            params = []
-
-        if expected_args_length != len(args):
-            raise CException(f"Function {name}, expected {expected_args_length} arguments, but {len(args)} given")
-
-        for param, arg in zip(params, args):
+        self.cpis = self.csis = None
+        self.layout = NO_VARIABLES
+        self.slots = []
+        self.memo_key = None
+
+    def enter(self, func, args):
+        # clinker checked the arguments against the parameters already
+        layout = func._frame
+        self.layout = layout
+        slots = self.slots = [None] * len(layout.names)
+        interpreter = self.interpreter
+        lineno = func.lineno
+        names = layout.names
+        for slot, (param_type, arg) in enumerate(zip(layout.param_types, args)):
             if isinstance(arg, VAR):
-                self.vars[param[1]["name"]] = [arg]
+                slots[slot] = arg
             else:
-                self.vars[param[1]["name"]] = [VAR(param[1]["type"], False, lineno[0], arg)]
+                slots[slot] = VAR(interpreter, param_type, False, lineno, arg, names[slot])
 
-        if len(params) != 0:
-            for param in params:
-                if param[0] is 'id':
-                    self.declare_cpi(param[1]["name"], -1)
+        # For optimization
+        if interpreter.optimizer.mode == NO_ANALYSIS:
+            self.cpis = self.csis = None
+        else:
+            self.cpis = {}
+            self.csis = {}
+            for slot in range(len(layout.param_types)):
+                self.declare_cpi(names[slot], -1)
 
         # Func Scope
-        self.stack.push(Scope(content["stmts"], ScopeType.FUNC))
+        self.stack.stack.append(Scope(func.stmts, ScopeType.FUNC, func._declared))
 
-    def declare_var(self, var_type, var_name, lineno, value=None, is_array=False):
-        var = VAR(var_type, isinstance(value, list), lineno, value)
-        if var_name not in self.vars:
-            self.vars[var_name] = []
-        self.vars[var_name].append(var)
+    def declare_var(self, var_type, slot, lineno, value=None, is_array=False):
+        var_name = self.layout.names[slot]
+        self.slots[slot] = VAR(self.interpreter, var_type, isinstance(value, CArray), lineno, value, var_name)
 
         # For optimization
-        if not is_array:
-            self.declare_cpi(var_name, lineno)
-        self.add_csi(var_name)
+        if self.cpis is not None:
+            if not is_array:
+                self.declare_cpi(var_name, lineno)
+            self.add_csi(var_name)
 
     def get_var(self, var_name):
-        if var_name not in self.vars:
-            return None
+        '''
+        The variable var_name stands for now, by name for the REPL: the last
+        declared one that is still in scope.
+        '''
+        slots = self.slots
+        for slot in reversed(self.layout.by_name.get(var_name, ())):
+            if slots[slot] is not None:
+                return slots[slot]
+        return None
+
+    def release_vars(self, declared):
+        slots = self.slots
+        names = self.layout.names
+        analysis = self.cpis is not None
+        for slot in declared:
+            if slots[slot] is not None:
+                slots[slot] = None
+
+                # For optimization
+                if analysis:
+                    self.release_cpi(names[slot])
+                    self.del_csi(names[slot])
+
+NO_VARIABLES = FrameLayout([])
 
-        return self.vars[var_name][-1]
-
-    def release_var(self, var_name):
-        self.vars[var_name].pop()
-        if len(self.vars[var_name]) == 0:
-            self.vars.pop(var_name, None)
-
-        # For optimization
-        self.release_cpi(var_name)
-        self.del_csi(var_name)
 
 class Return(Function):
+    __slots__ = ("value",)
+
     def __init__(self, value):
-        self.vars = {}
+        self.layout = NO_VARIABLES
+        self.slots = []
         self.stack = Stack()
         self.value = value
 
-# return finished, value.
-# If there's another functcall in expr, it return False, None
-# Otherwise return True, value
-def next_expr(func, expr, lineno):
-    global CURRENT_LINE
+class Evaluation:
+    '''
+    The expressions of a statement evaluated part way, parked in the scope
+    while a call they make runs: the next step and the operand stack. The
+    return value is pushed on the stack and evaluation resumes from there,
+    so nothing is evaluated twice. The steps are the ones get_program gives
+    for the statement, which is still the current one when it resumes.
+    '''
+    __slots__ = ("pc", "stack")
 
-    if expr is None:
-        return True, None
+    def __init__(self):
+        self.pc = 0
+        self.stack = []
 
-    behavior, content = expr
-    if behavior == 'number':
-        return True, content["value"]
-    elif behavior == 'id':
-        var = func.get_var(content["name"])
-        if var is None:
-            raise CException(f"Variable {content['name']} not found")
-        if var.is_array:
-            value = var
-        else:
-            value = var.value
-        if not var.is_array:
-            add_cp_id(func, content["name"], lineno)
-
-        return True, value
-    elif behavior == 'functcall':
-        callee = content["callee"]
-        args_info = content["args"]
-        lineno = content["lineno"]
-        if callee not in FUNCTION_DICT:
-            raise CException(f"{callee} function doesn't exist")
-
-        func.access_csi(content["str"], content["arg_list"], lineno, FUNCTION_DICT[callee][1]["type"])
-        success = True
-        args = []
-        for arg in args_info:
-            finished, value = next_expr(func, arg, lineno)
-            if not finished:
-                success = False
-                break
-            args.append(value)
-        if not success:
-            return False, None
 
-        scope = func.stack.top()
-        expr[:] = []
-        scope.dest = expr
-        new_func = Function(FUNCTION_DICT[callee], args)
-        MAIN_STACK.push(new_func)
-
-        CURRENT_LINE = FUNCTION_DICT[callee][1]["lineno"][0]
-        return False, None
-    elif behavior == 'casting':
-        func.access_csi(content["str"], content["arg_list"], lineno, content["type"])
-        finished, value = next_expr(func, content["expr"], lineno)
-        if not finished:
-            return False, None
-        if content["type"] == "int":
-            return True, int(value)
-        elif content["type"] == "float":
-            return True, float(value)
-        raise CException(f"Invalid casting {expr[1]}")
-    elif behavior == 'array':
-        finished, index = next_expr(func, content["index"], lineno)
-        if not finished:
-            return None, False
-        
-        var = func.get_var(content["name"])
-        if var is None:
-            raise CException(f"Variable {content['name']} not found")
+# Steps of an evaluation are (kind, fn, arity, lineno). lineno is None for
+# the line of the statement; arguments are evaluated on the line of the call.
+VALUE = 0   # push fn(func, lineno) of a call free subexpression
+APPLY = 1   # pop arity operands, push fn(func, lineno, *operands)
+NOTE = 2    # fn(func, lineno), only for its checks and bookkeeping
+CALL = 3    # pop arity arguments and push the callee, fn is the Call node
 
-        func.access_csi(content["str"], content["arg_list"], lineno, var.type)
 
-        return True, var.value[int(index)]
-    else:
+def divide(value1, value2):
+    if value2 == 0:
+        raise CException("Division by zero")
+    return value1 / value2
+
 
-        finished, value1 = next_expr(func, content["lhs"], lineno)
-        if not finished:
-            return False, None
+BINARY_OPS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': divide,
+}
 
-        finished, value2 = next_expr(func, content["rhs"], lineno)
-        if not finished:
-            return False, None
 
-        value = None
-        op = content["op"]
+def get_compiled(expr, mode):
+    try:
+        compiled = expr._compiled
+    except AttributeError:
+        compiled = expr._compiled = [None, None, None]
+
+    fn = compiled[mode]
+    if fn is None:
+        fn = compiled[mode] = compile_expr(expr, mode)
+    return fn
+
+
+def compile_expr(expr, mode):
+    '''
+    Turn an expression node into a closure fn(func, lineno) -> value.
+    Closures are cached on the parse tree, which all interpreters share:
+    they get at the state of the running one through func only.
+
+    The two passes over a program feed different optimizations: the
+    interactive run records copy propagation (COPY_PROPAGATION) and the
+    run in process_without_input records common subexpressions
+    (COMMON_SUBEXPRESSIONS). Each variant only does the bookkeeping its
+    pass reads, and the NO_ANALYSIS one none.
+    '''
+    cse = mode == COMMON_SUBEXPRESSIONS
+    expr_type = type(expr)
+    if expr_type is Number:
+        value = expr.value
+
+        def number(func, lineno):
+            return value
+        number.constant = value
+        return number
+
+    elif expr_type is Id:
+        name = expr.name
+
+        slot = expr._slot
+
+        if mode != COPY_PROPAGATION:
+            def read_id(func, lineno):
+                var = func.slots[slot]
+                if var.is_array:
+                    return var
+                value = var.value
+                if value is None:
+                    raise not_assigned(name, lineno)
+                return value
+        else:
+            def read_id(func, lineno):
+                var = func.slots[slot]
+                if var.is_array:
+                    return var
+                add_cp_id(func, name, lineno)
+                value = var.value
+                if value is None:
+                    raise not_assigned(name, lineno)
+                return value
+        return read_id
+
+    elif expr_type is ArrayRef:
+        name = expr.name
+        slot = expr._slot
+        index_fn = get_compiled(expr.index, mode)
+
+        if cse:
+            text = expr.text
+            arg_list = expr.arg_list
+
+            def read_array(func, lineno):
+                index = int(index_fn(func, lineno))
+                var = func.slots[slot]
+                func.access_csi(text, arg_list, lineno, var.type)
+                value = var.value[index]
+                if value is None:
+                    raise not_assigned(f"{name}[{index}]", lineno)
+                return value
+        else:
+            def read_array(func, lineno):
+                index = int(index_fn(func, lineno))
+                value = func.slots[slot].value[index]
+                if value is None:
+                    raise not_assigned(f"{name}[{index}]", lineno)
+                return value
+        return read_array
+
+    elif expr_type is BinOp:
+        op = expr.op
+        if op not in BINARY_OPS:
+            raise CException(f"Invalid operator {op}")
+        lhs = get_compiled(expr.lhs, mode)
+        rhs = get_compiled(expr.rhs, mode)
+        op_fn = BINARY_OPS[op]
+
+        if cse:
+            text = expr.text
+            arg_list = expr.arg_list
+
+            def binary(func, lineno):
+                value = op_fn(lhs(func, lineno), rhs(func, lineno))
+                func.access_csi(text, arg_list, lineno, type(value).__name__)
+                return value
+            return binary
+
+        if hasattr(lhs, "constant") and hasattr(rhs, "constant") and not (op == '/' and rhs.constant == 0):
+            value = op_fn(lhs.constant, rhs.constant)
+
+            def folded(func, lineno):
+                return value
+            folded.constant = value
+            return folded
+
         if op == '+':
-            value = value1 + value2
+            return lambda func, lineno: lhs(func, lineno) + rhs(func, lineno)
         elif op == '-':
-            value = value1 - value2
-        elif op == '/':
-            if value2 == 0:
-                raise CException("Division by zero")
-            value = value1 / value2
+            return lambda func, lineno: lhs(func, lineno) - rhs(func, lineno)
         elif op == '*':
-            value = value1 * value2
+            return lambda func, lineno: lhs(func, lineno) * rhs(func, lineno)
+        return lambda func, lineno: divide(lhs(func, lineno), rhs(func, lineno))
+
+    elif expr_type is Cast:
+        if expr.type == "int":
+            convert = int
+        elif expr.type == "float":
+            convert = float
         else:
-            raise CException(f"Invalid operator {expr[0]}")
-        func.access_csi(content["str"], content["arg_list"], lineno, type(value).__name__)
-        return True, value
-
-
-def execute_line():
-    global CURRENT_LINE
-    # Execute CURRENT_LINE
-    
-    line_printed = False
+            raise CException(f"Invalid casting {expr}")
+        inner = get_compiled(expr.expr, mode)
+
+        if cse:
+            text = expr.text
+            arg_list = expr.arg_list
+            cast_type = expr.type
+
+            def cast(func, lineno):
+                func.access_csi(text, arg_list, lineno, cast_type)
+                return convert(inner(func, lineno))
+            return cast
+
+        if hasattr(inner, "constant"):
+            value = convert(inner.constant)
+
+            def folded(func, lineno):
+                return value
+            folded.constant = value
+            return folded
+        return lambda func, lineno: convert(inner(func, lineno))
+
+    raise CException(f"Invalid expression {expr}")
+
+
+def contains_call(expr):
+    if type(expr) is Call:
+        return True
+    for child in expr.children():
+        if contains_call(child):
+            return True
+    return False
+
+
+def statement_operands(stmt):
+    '''
+    The expressions stmt evaluates, in order.
+    '''
+    stmt_type = type(stmt)
+    if stmt_type is Declare:
+        return [var_info.index for var_info in stmt.vars if isinstance(var_info, ArrayRef)]
+    elif stmt_type is Assign:
+        if isinstance(stmt.var, ArrayRef):
+            return [stmt.var.index, stmt.expr]
+        return [stmt.expr]
+    elif stmt_type is Increment:
+        if isinstance(stmt.var, ArrayRef):
+            return [stmt.var.index]
+        return []
+    elif stmt_type is Call:
+        if stmt.callee == "printf":
+            return stmt.args[1:]
+        return stmt.args
+    elif stmt_type is ReturnStmt:
+        if stmt.value is None:
+            return []
+        return [stmt.value]
+    elif stmt_type is Condition:
+        return [stmt.expr]
+    return []
+
+
+def get_program(stmt, mode):
+    '''
+    What evaluating the operands of stmt compiles to: (fn, None) when none
+    of them calls a function, fn(func, lineno) returning their values, and
+    (None, steps) otherwise.
+    '''
+    try:
+        compiled = stmt._compiled
+    except AttributeError:
+        compiled = stmt._compiled = [None, None, None]
+
+    program = compiled[mode]
+    if program is None:
+        exprs = statement_operands(stmt)
+        is_call = type(stmt) is Call and stmt.callee != "printf"
+        if is_call or any(contains_call(expr) for expr in exprs):
+            steps = []
+            if is_call:
+                # A call statement is no subexpression to eliminate
+                compile_call_steps(stmt, COPY_PROPAGATION if mode == COMMON_SUBEXPRESSIONS else mode, steps, None)
+            else:
+                for expr in exprs:
+                    compile_steps(expr, mode, steps, None)
+            program = (None, steps)
+        else:
+            program = (compile_operands([get_compiled(expr, mode) for expr in exprs]), None)
+        compiled[mode] = program
+    return program
+
+
+def compile_operands(fns):
+    if len(fns) == 0:
+        return lambda func, lineno: []
+    elif len(fns) == 1:
+        fn = fns[0]
+        return lambda func, lineno: [fn(func, lineno)]
+    elif len(fns) == 2:
+        fn1, fn2 = fns
+        return lambda func, lineno: [fn1(func, lineno), fn2(func, lineno)]
+    return lambda func, lineno: [fn(func, lineno) for fn in fns]
+
+
+def compile_steps(expr, mode, steps, lineno):
+    '''
+    Append the steps evaluating expr, an expression that calls a function
+    somewhere, to steps. Subexpressions without calls stay single closures.
+    '''
+    cse = mode == COMMON_SUBEXPRESSIONS
+    if not contains_call(expr):
+        steps.append((VALUE, get_compiled(expr, mode), 0, lineno))
+        return
+
+    expr_type = type(expr)
+    if expr_type is ArrayRef:
+        name = expr.name
+        slot = expr._slot
+        text = expr.text if cse else None
+        arg_list = expr.arg_list if cse else None
+
+        def read_array(func, lineno, index):
+            var = func.slots[slot]
+            if cse:
+                func.access_csi(text, arg_list, lineno, var.type)
+            index = int(index)
+            value = var.value[index]
+            if value is None:
+                raise not_assigned(f"{name}[{index}]", lineno)
+            return value
+        compile_steps(expr.index, mode, steps, lineno)
+        steps.append((APPLY, read_array, 1, lineno))
+
+    elif expr_type is BinOp:
+        if expr.op not in BINARY_OPS:
+            raise CException(f"Invalid operator {expr.op}")
+        op_fn = BINARY_OPS[expr.op]
+        text = expr.text if cse else None
+        arg_list = expr.arg_list if cse else None
+
+        def binary(func, lineno, value1, value2):
+            value = op_fn(value1, value2)
+            if cse:
+                func.access_csi(text, arg_list, lineno, type(value).__name__)
+            return value
+        compile_steps(expr.lhs, mode, steps, lineno)
+        compile_steps(expr.rhs, mode, steps, lineno)
+        steps.append((APPLY, binary, 2, lineno))
+
+    elif expr_type is Cast:
+        if expr.type == "int":
+            convert = int
+        elif expr.type == "float":
+            convert = float
+        else:
+            raise CException(f"Invalid casting {expr}")
+        if cse:
+            text = expr.text
+            arg_list = expr.arg_list
+            cast_type = expr.type
+            steps.append((NOTE, lambda func, lineno: func.access_csi(text, arg_list, lineno, cast_type), 0, lineno))
+        compile_steps(expr.expr, mode, steps, lineno)
+        steps.append((APPLY, lambda func, lineno, value: convert(value), 1, lineno))
+
+    elif expr_type is Call:
+        compile_call_steps(expr, mode, steps, lineno)
 
+    else:
+        raise CException(f"Invalid expression {expr}")
+
+
+def compile_call_steps(expr, mode, steps, lineno):
+    call_lineno = expr.lineno
+    if mode == COMMON_SUBEXPRESSIONS:
+        text = expr.text
+        arg_list = expr.arg_list
+        function_type = expr._target.type
+        steps.append((NOTE, lambda func, lineno: func.access_csi(text, arg_list, call_lineno, function_type), 0, lineno))
+    for arg in expr.args:
+        compile_steps(arg, mode, steps, call_lineno)
+    steps.append((CALL, expr, len(expr.args), lineno))
+
+
+def parse_command(line):
+    '''
+    The REPL command a line of input stands for, as its words, or None when
+    it is none. Raises CException for a known command used wrongly.
+    '''
+    cmd = line.strip().split(" ")
+    if cmd == ["next"] or cmd == ["prev"]:
+        cmd = [cmd[0], "1"]
+
+    if cmd[0] == "history" and len(cmd) <= 3:
+        return cmd
+    if cmd == ["continue"] or cmd == ["run"]:
+        return cmd
+    if len(cmd) != 2:
+        return None
+    if cmd[0] not in ["next", "prev", "print", "trace", "save", "load", "break"]:
+        return None
+    if cmd[0] in ["next", "prev"] and not cmd[1].isdigit():
+        raise CException(f"Incorrect command usage: try '{cmd[0]} [lines]")
+    return cmd
+
+
+def read_command():
     while True:
-        func = MAIN_STACK.top()
-        if func is None:
-            return
+        try:
+            cmd = parse_command(input("Input Command(next [number] / print [variable] / trace [variable]): "))
+        except CException as e:
+            print(e)
+            continue
+        if cmd is not None:
+            return cmd
 
-        has_return_value = False
-        return_value = None
-        if isinstance(func, Return):
-            return_value = func.value
-            MAIN_STACK.pop()
-            func = MAIN_STACK.top()
-            has_return_value = True
+
+def print_variable(get_var, name, out=None):
+    if "[" in name:
+        target = name[:name.find("[")]
+        index = int(name[name.find("[")+1:name.find("]")])
+        var = get_var(target)
+        if var is None:
+            print(f"Invisible variable", file=out)
+        else:
+            if not var.is_array:
+                print(f"{target} is not an array.", file=out)
+            else:
+                if not (0 <= index < len(var.value)):
+                    print(f"{index} is out of range for array {target}", file=out)
+                else:
+                    value = "N/A" if var.value[index] is None else var.value[index]
+                    print(f"Value of {name}: {value}", file=out)
+    else:
+        var = get_var(name)
+        if var is None:
+            print(f"Invisible variable", file=out)
+        else:
+            value = "N/A" if var.value is None else var.value
+            print(f"Value of {name}: {value}", file=out)
+
+
+def line_table(tree, size):
+    '''
+    For every line, the first line from there on that a statement of the
+    program starts on: the lines before it are empty on every path through
+    the program, and stepping over one only moves to the next. The table
+    has at least size entries and one past the last line of the program.
+    '''
+    lines = set()
+    blocks = list(tree)
+    while blocks:
+        block = blocks.pop()
+        for stmt in block.stmts:
+            lines.add(stmt.lineno)
+            if type(stmt) is For:
+                lines.update((stmt.assign.lineno, stmt.condition.lineno, stmt.increment.lineno))
+                blocks.append(stmt)
+            elif type(stmt) is If:
+                lines.add(stmt.condition.lineno)
+                blocks.append(stmt)
+
+    size = max(size, max(lines, default=0) + 2)
+    next_code = [0] * size
+    following = size - 1
+    for line in range(size - 1, -1, -1):
+        if line in lines:
+            following = line
+        next_code[line] = following
+    return next_code
+
+
+class Replay:
+    '''
+    Checkpoints of the whole state of an interpreter, for going back in
+    time in the REPL. The program reads no input, so running it again from
+    a checkpoint does exactly what it did the first time:
+
+    - `prev N` restores the last checkpoint up to N lines back and runs
+      forward from there to that line.
+    - under --history replay, a history nobody kept is rebuilt by running
+      from the last checkpoint before the variable was made, watching it.
+
+    A checkpoint is taken every `interval` steps, and older ones are thinned
+    out so that the gap between two is at most half their age: there are
+    about log(steps) of them, and going back N lines runs about N lines
+    plus `interval`.
+
+    Copies share the parse tree, variable histories (which truncate() brings
+    back to the checkpoint on restore) and arrays until one of the two is
+    written, see CArray.snapshot. The frame classes have __slots__: copying
+    an object through its __dict__ leaves CPython with a slower attribute
+    layout for it, and stepping was about 15% slower after the first
+    checkpoint.
+    '''
+    def __init__(self, interpreter, interval=1000):
+        self.interpreter = interpreter
+        self.interval = interval
+        self.steps = []
+        self.states = []
+        self.next_step = 0
+
+    def duplicate(self, state):
+        # frames point back to the interpreter, which is not part of a copy
+        interpreter = self.interpreter
+        return copy.deepcopy(state, {id(interpreter): interpreter, id(interpreter.optimizer): interpreter.optimizer})
+
+    def save(self):
+        interpreter = self.interpreter
+        optimizer = interpreter.optimizer
+        now = interpreter.clock.step
+        self.steps.append(now)
+        self.states.append(self.duplicate((interpreter.main_stack, interpreter.current_line, optimizer.cp_dict, optimizer.cs_dict)))
+        self.next_step = now + self.interval
+
+        which = len(self.steps) - 2
+        while which > 0:
+            if self.steps[which + 1] - self.steps[which - 1] <= (now - self.steps[which + 1]) // 2:
+                del self.steps[which]
+                del self.states[which]
+            which -= 1
+
+    def restore(self, which):
+        '''
+        Make checkpoint `which` the current state. The checkpoint stays
+        usable, what runs from there works on a copy.
+        '''
+        interpreter = self.interpreter
+        optimizer = interpreter.optimizer
+        interpreter.main_stack, interpreter.current_line, optimizer.cp_dict, optimizer.cs_dict = self.duplicate(self.states[which])
+        interpreter.clock.step = self.steps[which]
+
+    def rewind(self, step):
+        '''
+        Bring the program back to right after the given step, or to the
+        first checkpoint if that is later. Checkpoints past the one restored
+        are dropped, the histories they share are cut back.
+        '''
+        interpreter = self.interpreter
+        step = max(step, self.steps[0])
+        which = bisect.bisect_right(self.steps, step) - 1
+        del self.steps[which + 1:]
+        del self.states[which + 1:]
+        self.restore(which)
+        self.next_step = interpreter.clock.step + self.interval
+        for _, var in interpreter.live_vars():
+            if var.history is not None and not var.history.truncate(interpreter.clock.step):
+                var.history = None
+        with interpreter.silenced():
+            interpreter.next_lines(step - interpreter.clock.step)
+
+    def rebuild(self, var):
+        '''
+        Give var the history it would have if it had kept one. Without a
+        checkpoint from before var was made, the history starts at the
+        first checkpoint.
+        '''
+        interpreter = self.interpreter
+        optimizer = interpreter.optimizer
+        clock = interpreter.clock
+        watched = interpreter.retention.watched
+        which = max(bisect.bisect_left(self.steps, var.uid[0]) - 1, 0)
+        live = (interpreter.main_stack, interpreter.current_line, clock.step, optimizer.cp_dict, optimizer.cs_dict)
+        target = clock.step
+
+        self.restore(which)
+        # what the optimizer collects was collected the first time already
+        optimizer.cp_dict, optimizer.cs_dict = {}, {}
+        watched[var.uid] = None
+        try:
+            for _, restored in interpreter.live_vars():
+                # histories are shared with the live variables
+                restored.history = None
+                if restored.uid == var.uid:
+                    restored.start_history(interpreter, interpreter.current_line)
+                    watched[var.uid] = restored
+            with interpreter.silenced():
+                while clock.step < target:
+                    interpreter.execute_line()
+            var.history = watched[var.uid].history
+        finally:
+            interpreter.main_stack, interpreter.current_line, clock.step, optimizer.cp_dict, optimizer.cs_dict = live
+            del watched[var.uid]
+
+
+class Interpreter:
+    '''
+    Everything one run of a program changes: its frames, the current line,
+    the function table, the source, the replay checkpoints, the clock and
+    retention policy of variable histories and what the optimizer collects.
+    printf and the REPL write to out, sys.stdout when it is None. Without
+    analysis the run collects nothing for the optimizer, which makes calls
+    and assignments cheaper; optimize() still works, with only what its own
+    run collects. Such a run also answers calls of pure functions from
+    memo, a cmemo.CallCache, when it is given one and the REPL is not
+    stepping it.
+
+    The parse tree is only read, so interpreters running the same program
+    share it, in one thread or in many.
+    '''
+    __slots__ = ("main_stack", "plain_code", "plain_code_one_line", "current_line", "functions",
+                 "replay", "clock", "retention", "optimizer", "out", "next_code", "breakpoints",
+                 "free_frames", "memo")
+
+    def __init__(self, out=None, analysis=True, memo=None):
+        self.main_stack = Stack()
+        self.plain_code = ""
+        self.plain_code_one_line = ""
+        self.current_line = 0
+        self.functions = {}
+        self.replay = None
+        self.clock = Clock()
+        self.retention = Retention()
+        self.optimizer = OptimizerContext(analysis)
+        self.out = out
+        # next_code[line] is the first line from line on with a statement,
+        # see line_table
+        self.next_code = []
+        # breakpoints[line] is 1 for a line `continue` stops before
+        self.breakpoints = bytearray()
+        # frames of calls that returned, for the next calls to reuse
+        self.free_frames = []
+        self.memo = memo
+
+    def call(self, function, args, memo_key=None):
+        '''
+        Push a frame running function with args, whose return value is kept
+        in memo under memo_key unless that is None.
+        '''
+        free_frames = self.free_frames
+        frame = free_frames.pop() if free_frames else Function(self)
+        frame.enter(function, args)
+        frame.memo_key = memo_key
+        self.main_stack.stack.append(frame)
+
+    def free_frame(self, frame):
+        '''
+        Give back the frame of a call that returned. What it held goes now,
+        not when the frame is used again.
+        '''
+        if len(self.free_frames) < MAX_FREE_FRAMES:
+            frame.slots = []
+            frame.cpis = frame.csis = None
+            frame.memo_key = None
+            frame.stack.stack.clear()
+            self.free_frames.append(frame)
+
+    def printf(self, lineno, text):
+        '''
+        Output of a printf on the given line.
+        '''
+        print(text, file=self.out)
+
+    @contextlib.contextmanager
+    def silenced(self):
+        out = self.out
+        with open(os.devnull, "w") as devnull:
+            self.out = devnull
+            try:
+                yield
+            finally:
+                self.out = out
+
+    def evaluate(self, func, stmt, lineno):
+        '''
+        Evaluate the operands of stmt from left to right and return their
+        values. Returns None instead when a call had to be pushed on the
+        stack: stmt is executed again after the callee returns and the
+        evaluation picks up where it stopped.
+        '''
+        fn, steps = get_program(stmt, self.optimizer.mode)
+        if steps is None:
+            return fn(func, lineno)
 
         scope = func.stack.top()
-        stmt = scope.stmts[scope.idx]
-
-        behavior, content = stmt
-
-        stmt_lineno = content["lineno"]
-        if isinstance(stmt_lineno, list):
-            stmt_lineno = stmt_lineno[0]
-
-        if has_return_value:
-            if return_value is not None:
-                scope.dest.extend(["number", {"value": return_value}])
-            CURRENT_LINE = stmt_lineno
-
-            scope.dest = [] #reset
-
-        if DEBUG and not line_printed:
-            line_printed = True
-            print(f"Line {CURRENT_LINE}: {PLAIN_CODE[CURRENT_LINE]}")
-
-        # For Empty line
-        if CURRENT_LINE != stmt_lineno:
-            break
-
-        if behavior in ["{", "}"]:
-            pass
-
-        elif behavior == "declare":
-            '''
-            ['declare', {
-                    'type': 'int',
-                    'vars': [
-                    ['id', {
-                        'name': 'c',
-                        'arg_list': ['c'],
-                        'str': 'c',
-                        'lineno': 8
-                    }],
-                    ['array', {
-                        'name': 'c',
-                        'index': ['number', {
-                            'value': 4,
-                            'arg_list': [],
-                            'str': '4',
-                            'lineno': 4
-                        }],
-                        'arg_list': ['c'],
-                        'str': 'c[4]',
-                        'lineno': 4
-                    }]
-                    ],
-                    'lineno': 8
-            }]
-            '''
-            var_type = content["type"]
-            var_list = content["vars"]
-            lineno = content["lineno"]
-            for var_info in var_list:
-                var_name = var_info[1]["name"]
-                value = None
-                is_array = False
-                if var_info[0] == "array":
-                    finished, size = next_expr(func, var_info[1]["index"], lineno)
-                    if not finished:
-                        raise CException("Array cannot be resolved")
-                    is_array = True
-                    value = [None] * size
-
-                if not var_name in scope.declared_vars:
-                    scope.declared_vars.append(var_name)
-                func.declare_var(var_type, var_name, lineno, value, is_array)
-
-        elif behavior == "assign":
-            '''
-            ['assign', {
-                    'var': ['array', {
-                        'name': 'c',
-                        'index': ['number', {
-                            'value': 0,
-                            'arg_list': [],
-                            'str': '0',
-                            'lineno': 7
-                        }],
-                        'arg_list': ['c'],
-                        'str': 'c[0]',
-                        'lineno': 7
-                        }],
-                    'expr': ['number', {
-                        'value': 3,
-                        'arg_list': [],
-                        'str': '3',
-                        'lineno': 7
-                        }],
-                    'lineno': 7
-                }]
-            '''
-            var_info = content["var"]
-            expr = content["expr"]
-            lineno = content["lineno"]
-
-            index = None
-            var_name = var_info[1]["name"]
-            is_array = False
-            if var_info[0] == "array":
-                is_array = True
-                finished, index = next_expr(func, var_info[1]["index"], lineno)
-                if not finished:
-                    raise CException("Array cannot be resolved")
-            
-            var = func.get_var(var_name)
-            if var is None:
-                raise CException(f"Variable {var_name} not found")
-
-            finished, value = next_expr(func, expr, lineno)
-            if finished:
-                var.assign(value, lineno, index)
-                update_optimization_information_with_assign(func, expr, lineno, var_name, is_array)
+        evaluation = scope.pending
+        if evaluation is None:
+            evaluation = Evaluation()
+        else:
+            scope.pending = None
+        stack = evaluation.stack
+        pc = evaluation.pc
+        while pc < len(steps):
+            kind, fn, arity, step_lineno = steps[pc]
+            pc += 1
+            if step_lineno is None:
+                step_lineno = lineno
+
+            if kind == VALUE:
+                stack.append(fn(func, step_lineno))
+            elif kind == APPLY:
+                operands = stack[-arity:]
+                del stack[-arity:]
+                stack.append(fn(func, step_lineno, *operands))
+            elif kind == NOTE:
+                fn(func, step_lineno)
             else:
-                return
+                args = stack[-arity:] if arity else []
+                if arity:
+                    del stack[-arity:]
+                function = fn._target
+                memo_key = None
+                memo = self.memo
+                if memo is not None and function in memo.pure and self.replay is None:
+                    memo_key = memo.key(function, args)
+                    value = memo.get(memo_key)
+                    if value is not MISSING:
+                        stack.append(value)
+                        continue
+                evaluation.pc = pc
+                scope.pending = evaluation
+                self.call(function, args, memo_key)
+                self.current_line = function.lineno
+                return None
+        return stack
+
+    def execute_line(self):
+        # Execute self.current_line
+        main_stack = self.main_stack
+        line_printed = False
+        self.clock.step += 1
 
-        elif behavior == "increment":
-            '''
-            ['increment', {
-                    'var': ['id', {
-                        'name': 'b',
-                        'arg_list': ['b'],
-                        'str': 'b',
-                        'lineno': 7
-                        }],
-                    'lineno': 0
-                }]
-            '''
-            var_info = content["var"]
-            lineno = content["lineno"]
-
-            var_name = var_info[1]["name"]
-            index = None
-            is_array = False
-            if var_info[0] == "array":
-                is_array = True
-                finished, index = next_expr(func, var_info[1], lineno)
-                if not finished:
-                    raise CException("Array cannot be resolved")
-
-            var = func.get_var(var_name)
-            if var is None:
-                raise CException(f"Variable {var_name} not found")
-
-            var.increment(lineno, index)
-            if not is_array:
-                update_optimization_information_with_increment(func, var_name, lineno)
-
-        elif behavior == "for":
-            '''
-            ['for', {
-                'assign': ['assign', {
-                'var': ['id', {
-                    'name': 'i',
-                    'arg_list': ['i'],
-                    'str': 'i',
-                    'lineno': 21
-                }],
-                'expr': ['number', {
-                    'value': 0,
-                    'arg_list': [],
-                    'str': '0',
-                    'lineno': 21
-                }],
-                'lineno': 21
-                }],
-                'condition': ['condition', {
-                'var': 'i',
-                'cmp': '<',
-                'expr': ['number', {
-                    'value': 5,
-                    'arg_list': [],
-                    'str': '5',
-                    'lineno': 21
-                }],
-                'lineno': 21
-                }],
-                'increment': ['increment', {
-                'var': ['id', {
-                    'name': 'i',
-                    'arg_list': ['i'],
-                    'str': 'i',
-                    'lineno': 21
-                }],
-                'lineno': 21
-                }],
-                'stmts': [...],
-                'lineno': [21, 30]
-            }]
-            '''
-            func.stack.push(ForScope(content, func))
-            continue
+        while True:
+            func = main_stack.top()
+            if func is None:
+                return
 
-        elif behavior == "if":
-            '''
-            ['if', {
-                'condition': ['condition', {
-                'var': 'k',
-                'cmp': '>',
-                'expr': ['number', {
-                    'value': 6,
-                    'arg_list': [],
-                    'str': '6',
-                    'lineno': 27
-                }],
-                'lineno': 27
-                }],
-                'stmts': [...],
-                'lineno': [27, 29]
-            }]
-            '''
-            func.stack.push(IfScope(content, func))
-            continue
+            has_return_value = False
+            return_value = None
+            if isinstance(func, Return):
+                return_value = func.value
+                main_stack.pop()
+                func = main_stack.top()
+                has_return_value = True
 
-        elif behavior == "functcall":
-            '''
-            ['functcall', {
-                    'callee': 'printf',
-                    'args': [
-                    ['string', {
-                        'arg_list': [],
-                        'str': '"%d\\n%d\\n"',
-                        'lineno': 12
-                    }],
-                    ['id', {
-                        'name': 'a',
-                        'arg_list': ['a'],
-                        'str': 'a',
-                        'lineno': 12
-                    }],
-                    ['id', {
-                        'name': 'b',
-                        'arg_list': ['b'],
-                        'str': 'b',
-                        'lineno': 12
-                    }]
-                    ],
-                    'arg_list': ['a', 'b'],
-                    'str': 'f("%d\\n%d\\n",a,b',
-                    'lineno': 12
-                }]
-            '''
-            callee = content["callee"]
-            args_info = content["args"]
-            lineno = content["lineno"]
-
-            if callee == "printf":
-                printf_format = ast.literal_eval(args_info[0][1]["str"])
-                success = True
-                args = []
-                for arg in args_info[1:]:
-                    finished, value = next_expr(func, arg, lineno)
-                    if not finished:
-                        success = False
-                        break
-                    args.append(value)
-
-                if not success:
-                    return
+            scope = func.stack.top()
+            stmt = scope.stmts[scope.idx]
+            stmt_type = type(stmt)
+            stmt_lineno = stmt.lineno
 
-                if not get_is_in_optimization():
-                    print(printf_format % tuple(args))
-            else:
-                if not callee in FUNCTION_DICT:
-                    raise CException(f"{callee} function doesn't exist")
-
-                success = True
-                args = []
-                for arg in args_info:
-                    finished, value = next_expr(func, arg, lineno)
-                    if not finished:
-                        success = False
-                        break
-                    args.append(value)
-                if not success:
-                    return
-                stmt[:] = ["called", {"lineno": lineno}]
-                new_func = Function(FUNCTION_DICT[callee], args)
-                MAIN_STACK.push(new_func)
+            if has_return_value:
+                if scope.pending is not None:
+                    scope.pending.stack.append(return_value)
+                self.current_line = stmt_lineno
 
-                CURRENT_LINE = FUNCTION_DICT[callee][1]["lineno"][0]
-                return
+            if DEBUG and not line_printed:
+                line_printed = True
+                print(f"Line {self.current_line}: {self.plain_code[self.current_line]}", file=self.out)
 
-        elif behavior == "return":
-            '''
-            ['return', {
-                    'value': ['id', {
-                        'name': 'a',
-                        'arg_list': ['a'],
-                        'str': 'a',
-                        'lineno': 2
-                    }],
-                    'lineno': 2
-                }]
-            '''
-            # use 'Return' class
-            # Remove currently running function stack
-            expr = content["value"]
-            lineno = content["lineno"]
-
-            finished, value = next_expr(func, expr, lineno)
-            if not finished:
-                return
-
-            MAIN_STACK.pop()
-            MAIN_STACK.push(Return(value))
-            return
+            # For Empty line
+            if self.current_line != stmt_lineno:
+                break
 
-        elif behavior == "condition":
-            '''
-            ['condition', {
-              'var': 'k',
-              'cmp': '>',
-              'expr': ['number', {
-                'value': 6,
-                'arg_list': [],
-                'str': '6',
-                'lineno': 27
-              }],
-              'lineno': 27
-            }]
-            '''
-            expr = content["expr"]
-            lineno = content["lineno"]
-            success, right_value = next_expr(func, expr, lineno)
-            if not success:
-                return
+            if stmt_type is LBrace or stmt_type is RBrace:
+                pass
+
+            elif stmt_type is Declare:
+                '''
+                Declare(type='int', vars=[
+                    Id(name='b', text='b', arg_list=['b'], lineno=8),
+                    ArrayRef(name='c', index=Number(value=4, ...), text='c[4]', arg_list=['c'], lineno=8)
+                ], lineno=8)
+                '''
+                var_type = stmt.type
+                lineno = stmt.lineno
+                sizes = self.evaluate(func, stmt, lineno)
+                if sizes is None:
+                    return
+                sizes = iter(sizes)
+                for var_info in stmt.vars:
+                    var_name = var_info.name
+                    value = None
+                    is_array = False
+                    if isinstance(var_info, ArrayRef):
+                        is_array = True
+                        value = CArray(var_type, next(sizes))
+
+                    func.declare_var(var_type, var_info._slot, lineno, value, is_array)
+
+            elif stmt_type is Assign:
+                '''
+                Assign(var=ArrayRef(name='c', index=Number(value=0, ...), text='c[0]', ...),
+                       expr=Number(value=3, text='3', arg_list=[], lineno=7), lineno=7)
+                '''
+                var_info = stmt.var
+                expr = stmt.expr
+                lineno = stmt.lineno
+
+                values = self.evaluate(func, stmt, lineno)
+                if values is None:
+                    return
 
-            var = func.get_var(content["var"])
-            if var is None:
-                raise CException(f"Variable {content['var']} not found")
-            left_value = var.value
-            if left_value is None:
-                raise CException(f"Varaible {content['var']} is not assigned yet")
-            condition = content["cmp"]
-
-            if condition == '>':
-                if left_value > right_value:
-                    # do nothing
-                    pass
-                else:
-                    scope.set_done()
-            elif condition == '<':
-                if left_value < right_value:
-                    # do nothing
-                    pass
+                index = None
+                var_name = var_info.name
+                is_array = False
+                if isinstance(var_info, ArrayRef):
+                    is_array = True
+                    index, value = values
                 else:
-                    scope.set_done()
-            else:
-                raise CException(f"condition({condition}) is invalid", stmt[4])
-
-        scope.update_idx()
+                    value = values[0]
+
+                func.slots[var_info._slot].assign(value, lineno, index)
+                if type(expr) is Call:
+                    # A call that returned stands for its value
+                    expr = Number(value, lineno)
+                if func.cpis is not None:
+                    update_optimization_information_with_assign(func, expr, lineno, var_name, is_array)
+
+            elif stmt_type is Increment:
+                '''
+                Increment(var=Id(name='b', text='b', arg_list=['b'], lineno=7), lineno=7)
+                '''
+                var_info = stmt.var
+                lineno = stmt.lineno
+
+                values = self.evaluate(func, stmt, lineno)
+                if values is None:
+                    return
 
-        while not MAIN_STACK.isEmpty():
-            func = MAIN_STACK.top()
-            if func.stack.isEmpty():
-                MAIN_STACK.pop()
+                var_name = var_info.name
+                var = func.slots[var_info._slot]
+                index = None
+                is_array = False
+                if isinstance(var_info, ArrayRef):
+                    is_array = True
+                    index = values[0]
+                    if var.value[index] is None:
+                        raise not_assigned(f"{var_name}[{index}]", lineno)
+                elif var.value is None:
+                    raise not_assigned(var_name, lineno)
+
+                var.increment(lineno, index)
+                if not is_array and func.cpis is not None:
+                    update_optimization_information_with_increment(func, var_name, lineno)
+
+            elif stmt_type is For:
+                '''
+                For(assign=Assign(var=Id(name='i', ...), expr=Number(value=0, ...), lineno=21),
+                    condition=Condition(var='i', cmp='<', expr=Number(value=5, ...), lineno=21),
+                    increment=Increment(var=Id(name='i', ...), lineno=21),
+                    stmts=[LBrace(lineno=21), ..., RBrace(lineno=30)], lineno=21, end_lineno=30)
+                '''
+                func.stack.push(ForScope(stmt, func))
                 continue
 
-            scope = func.stack.top()
-            if scope.is_done():
-                CURRENT_LINE = scope.lineno[1]
-                func.stack.pop()
-                next_scope = func.stack.top()
-                if next_scope is not None:
-                    next_scope.update_idx()
-                if isinstance(scope, IfScope):
-                    scope.release_vars()
+            elif stmt_type is If:
+                '''
+                If(condition=Condition(var='k', cmp='>', expr=Number(value=6, ...), lineno=27),
+                   stmts=[LBrace(lineno=27), ..., RBrace(lineno=29)], lineno=27, end_lineno=29)
+                '''
+                func.stack.push(IfScope(stmt, func))
                 continue
-            break
 
-    if isinstance(scope, ForScope) and scope.idx == 1:
-        CURRENT_LINE = scope.lineno[0]
-        scope.init()
-    else:
-        CURRENT_LINE += 1
+            elif stmt_type is Call:
+                '''
+                Call(callee='printf', args=[
+                    String(text='"%d\\n%d\\n"', arg_list=[], lineno=12),
+                    Id(name='a', text='a', arg_list=['a'], lineno=12),
+                    Id(name='b', text='b', arg_list=['b'], lineno=12)
+                ], text='printf("%d\\n%d\\n",a,b)', arg_list=['a', 'b'], lineno=12)
+                '''
+                callee = stmt.callee
+                args_info = stmt.args
+                lineno = stmt.lineno
+
+                # for other functions this pushes the callee and comes back
+                # here with its return value once it finished
+                values = self.evaluate(func, stmt, lineno)
+                if values is None:
+                    return
 
+                if callee == "printf":
+                    printf_format = ast.literal_eval(args_info[0].text)
+                    if not self.optimizer.in_optimization:
+                        self.printf(lineno, printf_format % tuple(values))
+
+            elif stmt_type is ReturnStmt:
+                '''
+                ReturnStmt(value=Id(name='a', text='a', arg_list=['a'], lineno=2), lineno=2)
+                '''
+                # use 'Return' class
+                # Remove currently running function stack
+                lineno = stmt.lineno
+
+                values = self.evaluate(func, stmt, lineno)
+                if values is None:
+                    return
+                value = values[0] if values else None
 
-def interpret_initialization(tree):
-    global CURRENT_LINE
+                if func.memo_key is not None:
+                    self.memo.put(func.memo_key, value)
+                main_stack.pop()
+                self.free_frame(func)
+                main_stack.push(Return(value))
+                return
 
-    # Function index
-    for func_info in tree:
-        FUNCTION_DICT[func_info[1]["name"]] = func_info
+            elif stmt_type is Condition:
+                '''
+                Condition(var='k', cmp='>', expr=Number(value=6, text='6', arg_list=[], lineno=27), lineno=27)
+                '''
+                lineno = stmt.lineno
+                values = self.evaluate(func, stmt, lineno)
+                if values is None:
+                    return
+                right_value = values[0]
 
-    if "main" not in FUNCTION_DICT:
-        raise CException("Main function doesn't exist")
+                left_value = func.slots[stmt._slot].value
+                if left_value is None:
+                    raise not_assigned(stmt.var, lineno)
+                condition = stmt.cmp
 
-    MAIN_STACK.push(Function(FUNCTION_DICT["main"]))
-    CURRENT_LINE = FUNCTION_DICT["main"][1]["lineno"][0]
+                if condition == '>':
+                    if left_value > right_value:
+                        # do nothing
+                        pass
+                    else:
+                        scope.set_done()
+                elif condition == '<':
+                    if left_value < right_value:
+                        # do nothing
+                        pass
+                    else:
+                        scope.set_done()
+                else:
+                    raise CException(f"condition({condition}) is invalid", lineno)
+
+            scope.update_idx()
+
+            while not main_stack.isEmpty():
+                func = main_stack.top()
+                if func.stack.isEmpty():
+                    main_stack.pop()
+                    self.free_frame(func)
+                    continue
+
+                scope = func.stack.top()
+                if scope.is_done():
+                    self.current_line = scope.lineno[1]
+                    func.stack.pop()
+                    next_scope = func.stack.top()
+                    if next_scope is not None:
+                        next_scope.update_idx()
+                    if isinstance(scope, IfScope):
+                        scope.release_vars()
+                    continue
+                break
 
+        if isinstance(scope, ForScope) and scope.idx == 1:
+            self.current_line = scope.lineno[0]
+            scope.init()
+        else:
+            self.current_line += 1
+
+    def interpret_initialization(self, tree):
+        # Function index, every call linked and the program checked
+        self.functions = link(tree)
+        if self.memo is not None:
+            # what the optimizer collects has to see every line run
+            self.memo.analyze(self.functions if self.optimizer.mode == NO_ANALYSIS else None)
+
+        self.clock.step = 0
+        self.call(self.functions["main"], [])
+        self.current_line = self.functions["main"].lineno
+        self.replay = None
+        self.apply_retention()
+        self.next_code = line_table(tree, len(self.plain_code) + 1)
+        # the line after the last one is where a program that runs off its
+        # end stops, so continue_lines needs no check of its own for that
+        self.breakpoints = bytearray(len(self.next_code))
+        self.breakpoints[-1] = 1
+
+    def live_vars(self):
+        '''
+        (name, VAR) of every variable of every frame, once each even when an
+        array is passed down to a callee.
+        '''
+        seen = set()
+        for func in self.main_stack.stack:
+            names = func.layout.names
+            for slot, var in enumerate(func.slots):
+                if var is not None and id(var) not in seen:
+                    seen.add(id(var))
+                    yield names[slot], var
+
+    def next_lines(self, count):
+        frames = self.main_stack.stack
+        execute_line = self.execute_line
+        next_code = self.next_code
+        clock = self.clock
+        while count > 0 and frames:
+            line = self.current_line
+            skip = next_code[line] - line
+            if skip and not DEBUG:
+                # empty lines, each a step that only moves on
+                skip = min(skip, count)
+                self.current_line = line + skip
+                clock.step += skip
+                count -= skip
+            else:
+                execute_line()
+                count -= 1
+            if self.replay is not None and clock.step >= self.replay.next_step:
+                self.replay.save()
+
+    def continue_lines(self, count=sys.maxsize):
+        '''
+        Run at most count lines, stopping before a line with a breakpoint.
+        At least one line runs, so continuing from a breakpoint leaves it.
+        Unlike a REPL command per line, this only looks at the bitmap.
+        '''
+        frames = self.main_stack.stack
+        execute_line = self.execute_line
+        next_code = self.next_code
+        breakpoints = self.breakpoints
+        clock = self.clock
+        replay = self.replay
+        while count > 0 and frames:
+            line = self.current_line
+            skip = next_code[line] - line
+            if skip and not DEBUG:
+                skip = min(skip, count)
+                # up to a breakpoint on one of the empty lines
+                hit = breakpoints.find(1, line + 1, line + skip)
+                if hit >= 0:
+                    skip = hit - line
+                self.current_line = line + skip
+                clock.step += skip
+                count -= skip
+            else:
+                execute_line()
+                count -= 1
+            if replay is not None and clock.step >= replay.next_step:
+                replay.save()
+            if breakpoints[self.current_line]:
+                break
 
-def interpret(tree):
-    global CURRENT_LINE
+        if self.at_breakpoint():
+            line = self.current_line
+            print(f"Stopped at line {line}: {self.plain_code[line].strip()}", file=self.out)
+
+    def at_breakpoint(self):
+        return not self.is_finished() and self.breakpoints[self.current_line] == 1
+
+    def toggle_breakpoint(self, where):
+        '''
+        Set a breakpoint, or clear the one there, at a line or at the entry
+        of a function.
+        '''
+        out = self.out
+        if where in self.functions:
+            line = self.functions[where].lineno
+        elif where.isdigit() and 0 < int(where) < len(self.plain_code):
+            line = int(where)
+        else:
+            print(f"No line or function {where}", file=out)
+            return
 
-    interpret_initialization(tree)
-    while not MAIN_STACK.isEmpty():
-        cmd = ""
-        while True:
-            cmd = input("Input Command(next [number] / print [variable] / trace [variable]): ").strip().split(" ")
-            if cmd == ["next"]:
-                cmd = ["next", "1"]
+        self.breakpoints[line] ^= 1
+        if self.breakpoints[line]:
+            print(f"Breakpoint at line {line}: {self.plain_code[line].strip()}", file=out)
+        else:
+            print(f"Removed the breakpoint at line {line}", file=out)
+
+    def start_replay(self):
+        self.replay = Replay(self)
+        self.replay.save()
+
+    def shared_objects(self):
+        '''
+        What a snapshot refers to instead of holding: the parts of the
+        interpreter that loading it keeps.
+        '''
+        return {"interpreter": self, "clock": self.clock, "retention": self.retention, "optimizer": self.optimizer}
+
+    def save_state(self, filename):
+        '''
+        Write where the program is, its frames and variables with their
+        histories, and what the optimizer collected so far to filename.
+        Returns the size of the file. Replay checkpoints go along, so `prev`
+        and rebuilt histories reach back past a load as well.
+        '''
+        retention = self.retention
+        state = {
+            "main_stack": self.main_stack,
+            "current_line": self.current_line,
+            "step": self.clock.step,
+            "cp_dict": self.optimizer.cp_dict,
+            "cs_dict": self.optimizer.cs_dict,
+            "retention": (retention.mode, retention.limit, retention.traced),
+            "replay": self.replay,
+        }
+        return csnapshot.save(filename, state, self.plain_code_one_line, list(self.functions.values()),
+                              self.shared_objects())
+
+    def load_state(self, filename):
+        '''
+        Continue from a state save_state wrote for the same program.
+        '''
+        state = csnapshot.load(filename, self.plain_code_one_line, list(self.functions.values()),
+                               self.shared_objects())
+        self.main_stack = state["main_stack"]
+        self.current_line = state["current_line"]
+        self.clock.step = state["step"]
+        self.optimizer.cp_dict = state["cp_dict"]
+        self.optimizer.cs_dict = state["cs_dict"]
+        mode, limit, traced = state["retention"]
+        self.retention.set(mode, limit)
+        self.retention.traced = traced
+        self.replay = state["replay"]
+        if self.replay is None:
+            self.start_replay()
+
+    def apply_retention(self):
+        '''
+        Bring the histories of the live variables in line with the retention
+        policy after it changed.
+        '''
+        if self.retention.mode == "replay" and self.replay is None:
+            self.start_replay()
+        for name, var in self.live_vars():
+            if not self.retention.keeps(name):
+                var.history = None
+            elif var.history is None:
+                var.start_history(self, self.current_line)
+            else:
+                var.history.trim()
+
+    def history_usage(self):
+        '''
+        Number of histories kept and the bytes they take.
+        '''
+        count = 0
+        size = 0
+        for _, var in self.live_vars():
+            if var.history is not None:
+                count += 1
+                size += var.history.nbytes()
+        return count, size
+
+    def history_command(self, args):
+        if len(args) != 0:
+            limit = 0
+            if len(args) == 2:
+                if not args[1].isdigit():
+                    print("Incorrect command usage: try 'history [all / off / traced / replay / last N / window N]'", file=self.out)
+                    return
+                limit = int(args[1])
+            try:
+                self.retention.set(args[0], limit)
+            except ValueError as e:
+                print(e, file=self.out)
+                return
+            self.apply_retention()
+        count, size = self.history_usage()
+        print(f"History: {self.retention}, {count} variables, {size / 1024:.1f} KiB", file=self.out)
+        if self.replay is not None:
+            print(f"{len(self.replay.steps)} checkpoints of the interpreter state", file=self.out)
+
+    def trace_variable(self, name):
+        out = self.out
+        func = self.main_stack.top()
+        var = func.get_var(name)
+        if var is None:
+            print(f"Invisible variable", file=out)
+        elif var.history is None and self.retention.mode == "replay":
+            self.replay.rebuild(var)
+            self.trace_variable(name)
+        elif var.history is None:
+            if self.retention.mode == "traced":
+                self.retention.traced.add(name)
+                var.start_history(self, self.current_line)
+                print(f"Tracing {name} from now on", file=out)
+            else:
+                print(f"No history of {name} is kept, see 'history'", file=out)
+        else:
+            print(f"History of {name}", file=out)
+            if var.history.forgotten:
+                print(f"({var.history.forgotten} earlier values dropped)", file=out)
+            for lineno, value in var.iter_history():
+                value = "N/A" if value is None else value
+                print(f"{name} = {value} at line {lineno}", file=out)
+
+    def execute_command(self, cmd):
+        '''
+        Carry out one REPL command, as read_command returns it. continue and
+        run may be given a number of lines to run at most, for callers that
+        run them in slices.
+        '''
+        if cmd[0] == "next":
+            self.next_lines(int(cmd[1]))
 
-            if len(cmd) != 2:
-                continue
-            if cmd[0] not in ["next", "print", "trace"]:
-                continue
-            if cmd[0] == "next" and not cmd[1].isdigit():
-                print("Incorrect command usage: try 'next [lines]")
-                continue
-            break
+        elif cmd[0] == "continue":
+            self.continue_lines(int(cmd[1]) if len(cmd) > 1 else sys.maxsize)
 
-        if cmd[0] == "next":
-            cnt = int(cmd[1])
-            while cnt > 0 and not MAIN_STACK.isEmpty():
-                execute_line()
-                cnt -= 1
+        elif cmd[0] == "run":
+            # from the start, breakpoints stay
+            self.replay.rewind(0)
+            self.continue_lines(int(cmd[1]) if len(cmd) > 1 else sys.maxsize)
+
+        elif cmd[0] == "break":
+            self.toggle_breakpoint(cmd[1])
+
+        elif cmd[0] == "prev":
+            self.replay.rewind(max(self.clock.step - int(cmd[1]), 0))
 
         elif cmd[0] == "print":
-            func = MAIN_STACK.top()
-            if "[" in cmd[1]:
-                target = cmd[1][:cmd[1].find("[")]
-                index = int(cmd[1][cmd[1].find("[")+1:cmd[1].find("]")])
-                var = func.get_var(target)
-                if var is None:
-                    print(f"Invisible variable")
-                else:
-                    if not var.is_array:
-                        print(f"{target} is not an array.")
-                    else:
-                        if not (0 <= index < len(var.value)):
-                            print(f"{index} is out of range for array {target}")
-                        else:
-                            value = "N/A" if var.value[index] is None else var.value[index]
-                            print(f"Value of {cmd[1]}: {value}")
-            else:
-                var = func.get_var(cmd[1])
-                if var is None:
-                    print(f"Invisible variable")
-                else:
-                    value = "N/A" if var.value is None else var.value
-                    print(f"Value of {cmd[1]}: {value}")
+            func = self.main_stack.top()
+            print_variable(func.get_var, cmd[1], self.out)
 
         elif cmd[0] == "trace":
-            func = MAIN_STACK.top()
-            var = func.get_var(cmd[1])
-            if var is None:
-                print(f"Invisible variable")
-            else:
-                print(f"History of {cmd[1]}")
-                for history in var.history:
-                    value = "N/A" if history[1] is None else history[1]
-                    print(f"{cmd[1]} = {value} at line {history[0]}")
+            self.trace_variable(cmd[1])
+
+        elif cmd[0] == "history":
+            self.history_command(cmd[1:])
+
+        elif cmd[0] == "save":
+            try:
+                size = self.save_state(cmd[1])
+                print(f"Saved the state after {self.clock.step} lines to {cmd[1]} ({size / 1024:.1f} KiB)", file=self.out)
+            except (CException, OSError) as e:
+                print(e, file=self.out)
+
+        elif cmd[0] == "load":
+            try:
+                self.load_state(cmd[1])
+                print(f"Loaded the state after {self.clock.step} lines from {cmd[1]}", file=self.out)
+            except (CException, OSError) as e:
+                print(e, file=self.out)
+
+    def is_finished(self):
+        return self.main_stack.isEmpty() or self.current_line >= len(self.plain_code)
+
+    def start(self, tree):
+        '''
+        Get ready to take REPL commands on the program of tree.
+        '''
+        self.interpret_initialization(tree)
+        if self.replay is None:
+            self.start_replay()
+
+    def interpret(self, tree):
+        self.start(tree)
+        while not self.is_finished():
+            self.execute_command(read_command())
+
+        print("End of Program", file=self.out)
+
+    def run(self, tree, lines=sys.maxsize):
+        '''
+        Run a program with the tree engine and no REPL, the way the
+        optimizer does but with copy propagation bookkeeping, unless the
+        interpreter has no analysis, and printf, to the end or for the given
+        number of lines. Returns the number of
+        execute_line calls.
+        '''
+        self.main_stack = Stack()
+        self.current_line = 0
+        self.functions = {}
+        self.interpret_initialization(tree)
+        self.next_lines(lines)
+        return self.clock.step
+
+    def process(self, engine="tree", optimize=True):
+        '''
+        Run the REPL on the program with engine. With the vm engine, the
+        program runs once more, silently, on the tree engine when optimize
+        is set: copy propagation is collected there, and optimize() needs it.
+        '''
+        tree = get_cached_parser_tree(self.plain_code_one_line)
+        if engine == "vm":
+            interpret_vm(tree)
+            if optimize:
+                with self.silenced():
+                    self.run(tree)
+        else:
+            self.interpret(tree)
+
+    def process_without_input(self):
+        # initialize
+        self.main_stack = Stack()
+        self.current_line = 0
+        self.functions = {}
+        self.optimizer.initialize()
+
+        # process whole lines
+        tree = get_cached_parser_tree(self.plain_code_one_line)
+        self.interpret_initialization(tree)
+
+        while not self.main_stack.isEmpty():
+            self.execute_line()
+
+    def optimize(self):
+        '''
+        Rewrite plain_code with the copy propagation collected by the run
+        so far and the common subexpressions a second, silent run of the
+        result finds. Returns the new lines.
+        '''
+        self.plain_code, self.plain_code_one_line = get_cp_optimized_code(self.plain_code, self.optimizer.cp_dict)
+        if DEBUG:
+            for line in self.plain_code:
+                print(line, file=self.out)
+        self.process_without_input()
+        self.plain_code, self.plain_code_one_line = get_cs_optimized_code(self.plain_code, self.optimizer.cs_dict)
+        return self.plain_code
+
+    def print_optimized_code(self, filename="output.c"):
+        self.optimize()
+
+        # write optimized code
+        f = open(filename, "w")
+        f.writelines(self.plain_code)
+        f.close()
+
+
+def interpret_vm(tree):
+    '''
+    The same REPL on top of the bytecode engine. `next` counts source lines
+    through the line table of cvm, where a line with no instructions, blank
+    or with a brace or a function header, is no step, so it can stop on
+    another line than the tree engine. Variables keep no history there, so
+    `trace` is only available with the tree engine, and neither are
+    breakpoints.
+    '''
+    vm = VM(tree)
+    while not vm.is_done():
+        cmd = read_command()
+
+        if cmd[0] == "next":
+            vm.step(int(cmd[1]))
+
+        elif cmd[0] == "print":
+            print_variable(vm.get_var, cmd[1])
 
-        if CURRENT_LINE >= len(PLAIN_CODE):
-            break
+        elif cmd[0] in ["prev", "trace", "history", "save", "load", "break", "continue", "run"]:
+            print(f"{cmd[0]} is not available with the vm engine, use --engine tree")
 
     print("End of Program")
 
 
-def process():
-    tree = get_parser_tree(PLAIN_CODE_ONE_LINE)
-    interpret(tree)
+def run(tree, lines=sys.maxsize):
+    '''
+    Interpreter().run(tree, lines), in a fresh interpreter.
+    '''
+    return Interpreter().run(tree, lines)
 
 
 def load_input_file(filename):
@@ -818,52 +1605,50 @@ def load_input_file(filename):
     return lines, "".join(lines)
 
 
-def process_without_input():
-    global MAIN_STACK
-    global CURRENT_LINE
-    global FUNCTION_DICT
-
-    # initialize
-    MAIN_STACK = Stack()
-    CURRENT_LINE = 0
-    FUNCTION_DICT = {}
-    initialize_optimization()
-
-    # process whole lines
-    tree = get_parser_tree(PLAIN_CODE_ONE_LINE)
-    interpret_initialization(tree)
-
-    while not MAIN_STACK.isEmpty():
-        execute_line()
-
-
-def print_optimized_code():
-    global PLAIN_CODE
-    global PLAIN_CODE_ONE_LINE
-
-    PLAIN_CODE, PLAIN_CODE_ONE_LINE = get_cp_optimized_code(PLAIN_CODE)
-    if DEBUG:
-        for line in PLAIN_CODE:
-            print(line)
-    process_without_input()
-    PLAIN_CODE, PLAIN_CODE_ONE_LINE = get_cs_optimized_code(PLAIN_CODE)
-
-    # write optimized code
-    f = open("output.c", "w")
-    f.writelines(PLAIN_CODE)
-    f.close()
-
-
 if __name__ == "__main__":
-    if len(sys.argv) == 2:
-        input_filename = sys.argv[1]
-    else:
-        input_filename = "array_pointer.c"
+    parser = argparse.ArgumentParser(description="Interpret a C source file from inputs/ and write its optimized version to output.c.")
+    parser.add_argument("input_filename", nargs="?", default="array_pointer.c")
+    parser.add_argument("--engine", choices=["tree", "vm"], default="tree",
+                        help="tree walks the parse tree line by line, vm compiles it to bytecode first; "
+                             "its `next` skips blank lines, braces and function headers without counting them")
+    parser.add_argument("--optimize", action="store_true",
+                        help="with --engine vm, also write output.c, which runs the program once more on the tree engine")
+    parser.add_argument("--run", action="store_true",
+                        help="translate the program to Python and only print its output: no REPL, no output.c")
+    parser.add_argument("--memoize", type=int, default=None, metavar="N",
+                        help="with --run, answer calls of pure functions from a cache of N results")
+    parser.add_argument("--history", choices=Retention.MODES, default="all",
+                        help="which variable histories `trace` can show, see chistory.Retention")
+    parser.add_argument("--history-limit", type=int, default=0, metavar="N",
+                        help="changes per variable for --history last, steps for --history window")
+    parser.add_argument("--trace", action="append", default=[], metavar="VARIABLE",
+                        help="variable to keep the history of with --history traced")
+    options = parser.parse_args()
+    interpreter = Interpreter()
+    try:
+        interpreter.retention.set(options.history, options.history_limit)
+    except ValueError as e:
+        parser.error(str(e))
+    interpreter.retention.traced.update(options.trace)
+    if options.memoize is not None and not options.run:
+        parser.error("--memoize only works with --run")
+    # the tree engine collects what output.c needs on its way anyway
+    optimize = options.engine == "tree" or options.optimize
+
+    if options.run:
+        try:
+            interpreter.plain_code, interpreter.plain_code_one_line = load_input_file(options.input_filename)
+            memo = CallCache(options.memoize) if options.memoize else None
+            run_transpiled(get_cached_parser_tree(interpreter.plain_code_one_line), memo)
+        except CException as e:
+            print("Compile Error: ", e)
+        sys.exit(0)
 
     try:
-        PLAIN_CODE, PLAIN_CODE_ONE_LINE = load_input_file(input_filename)
-        process()
+        interpreter.plain_code, interpreter.plain_code_one_line = load_input_file(options.input_filename)
+        interpreter.process(options.engine, optimize)
     except CException as e:
         print("Compile Error: ", e)
 
-    print_optimized_code()
+    if optimize:
+        interpreter.print_optimized_code()
@@ -0,0 +1,157 @@
+'''
+Link a parsed program and check it before it runs.
+
+Every call is linked to the function it calls, and the errors the engines
+would otherwise only meet on the line that has them are all looked for
+at once: unknown functions and variables, calls with the wrong number of
+arguments or an array where a number is expected and the other way round,
+parameter lists with 'void' among other parameters, casts, operators and
+comparisons the engines do not know, and a missing main. A program with
+any of them does not start, and the error lists every one, in line order:
+
+    [Line 6] Variable q not found
+    [Line 9] Function f, expected 1 arguments, but 2 given
+
+A linked program has nothing left to look up by name while it runs, and
+the engines leave those checks out.
+'''
+from cnodes import ArrayRef, Assign, BinOp, Call, Cast, Condition, Declare, For, Id, If, Increment, ReturnStmt
+from coptimization import CException
+from cresolver import resolve
+
+OPERATORS = ('+', '-', '*', '/')
+CAST_TYPES = ("int", "float")
+COMPARISONS = ('<', '>')
+
+
+class Linker:
+    def __init__(self, tree):
+        self.functions = {}
+        for func in tree:
+            self.functions[func.name] = func
+            resolve(func)
+        # (lineno, message), lineno None for the program as a whole
+        self.errors = []
+        self.reported = set()
+
+    def error(self, lineno, message):
+        if (lineno, message) not in self.reported:
+            self.reported.add((lineno, message))
+            self.errors.append((lineno, message))
+
+    def link(self):
+        '''
+        Link every call, returning the errors found as (lineno, message) in
+        line order, a missing main first.
+        '''
+        if "main" not in self.functions:
+            self.error(None, "Main function doesn't exist")
+        for func in self.functions.values():
+            if func._frame.error is not None:
+                self.error(func.lineno, func._frame.error)
+            self.block(func, func._frame)
+        self.errors.sort(key=lambda error: -1 if error[0] is None else error[0])
+        return self.errors
+
+    def block(self, block, layout):
+        blocks = [block]
+        while blocks:
+            for stmt in blocks.pop().stmts:
+                stmt_type = type(stmt)
+                if stmt_type is For:
+                    self.statement(stmt.assign, layout)
+                    self.statement(stmt.condition, layout)
+                    self.statement(stmt.increment, layout)
+                    blocks.append(stmt)
+                elif stmt_type is If:
+                    self.statement(stmt.condition, layout)
+                    blocks.append(stmt)
+                else:
+                    self.statement(stmt, layout)
+
+    def statement(self, stmt, layout):
+        stmt_type = type(stmt)
+        if stmt_type is Declare:
+            # the names are declared here, only the array sizes are used
+            for var_info in stmt.vars:
+                if type(var_info) is ArrayRef:
+                    self.expr(var_info.index, layout)
+
+        elif stmt_type is Assign:
+            self.expr(stmt.var, layout)
+            self.expr(stmt.expr, layout)
+
+        elif stmt_type is Increment:
+            self.expr(stmt.var, layout)
+
+        elif stmt_type is Condition:
+            if stmt._slot in layout.undeclared:
+                self.error(stmt.lineno, f"Variable {stmt.var} not found")
+            if stmt.cmp not in COMPARISONS:
+                self.error(stmt.lineno, f"condition({stmt.cmp}) is invalid")
+            self.expr(stmt.expr, layout)
+
+        elif stmt_type is Call:
+            if stmt.callee == "printf":
+                for arg in stmt.args[1:]:
+                    self.expr(arg, layout)
+            else:
+                self.expr(stmt, layout)
+
+        elif stmt_type is ReturnStmt:
+            if stmt.value is not None:
+                self.expr(stmt.value, layout)
+
+    def expr(self, expr, layout):
+        stack = [expr]
+        while stack:
+            node = stack.pop()
+            node_type = type(node)
+            if node_type is Id or node_type is ArrayRef:
+                if node._slot in layout.undeclared:
+                    self.error(node.lineno, f"Variable {node.name} not found")
+            elif node_type is BinOp:
+                if node.op not in OPERATORS:
+                    self.error(node.lineno, f"Invalid operator {node.op}")
+            elif node_type is Cast:
+                if node.type not in CAST_TYPES:
+                    self.error(node.lineno, f"Invalid casting {node}")
+            elif node_type is Call:
+                self.call(node, layout)
+            stack.extend(reversed(node.children()))
+
+    def call(self, call, layout):
+        target = self.functions.get(call.callee)
+        if target is None:
+            self.error(call.lineno, f"{call.callee} function doesn't exist")
+            return
+        call._target = target
+
+        callee = target._frame
+        if callee.error is not None:
+            # reported once, with the function
+            return
+        if callee.arity != len(call.args):
+            self.error(call.lineno, f"Function {call.callee}, expected {callee.arity} arguments, but {len(call.args)} given")
+            return
+        for number, (param_type, arg) in enumerate(zip(callee.param_types, call.args), 1):
+            if type(arg) is Id and arg._slot in layout.undeclared:
+                continue
+            is_array = type(arg) is Id and arg._slot in layout.arrays
+            if param_type.endswith("*") and not is_array:
+                self.error(call.lineno, f"Function {call.callee}, argument {number} must be an array")
+            elif not param_type.endswith("*") and is_array:
+                self.error(call.lineno, f"Function {call.callee}, argument {number} must not be an array")
+
+
+def link(tree):
+    '''
+    Link a program, returning its functions by name. Raises CException with
+    every error found in it.
+    '''
+    linker = Linker(tree)
+    errors = linker.link()
+    if errors:
+        raise CException("\n".join(message if lineno is None else f"[Line {lineno}] {message}"
+                                   for lineno, message in errors))
+    return linker.functions
@@ -0,0 +1,202 @@
+'''
+Load test of the debug server: many clients stepping through programs at
+once, with the latency of every command kind.
+
+Most sessions step the sources of inputs/ a few lines at a time and print
+and trace their variables. Some run a long loop with `next` over
+thousands of lines, which the server hands to its worker threads. When a
+session ends the client opens the program again.
+
+    python cloadtest.py [--sessions N] [--commands N] [--heavy FRACTION]
+                        [--port N | --unix PATH]
+
+Without an address, a server is started on a Unix socket in a temporary
+directory holding inputs/ and the long loop, and stopped at the end.
+'''
+import argparse
+import asyncio
+import glob
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from cbenchmark import generate_loop
+from cserver import INPUT_DIR
+
+LOOP_FILE = "long_loop.c"
+LOOP_ITERATIONS = 200000
+HEAVY_LINES = 20000
+
+DECLARED = re.compile(r"\b(?:int|float)\s+([a-zA-Z_]\w*(?:\s*\[[^\]]*\])?(?:\s*,\s*\*?[a-zA-Z_]\w*(?:\s*\[[^\]]*\])?)*)\s*;")
+
+
+def variable_names(code):
+    names = set()
+    for declared in DECLARED.findall(code):
+        for name in declared.split(","):
+            names.add(name.strip().lstrip("*").split("[")[0].strip())
+    return sorted(names)
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def command(self, line):
+        '''
+        Send a line, return the kind of the answer, OK, END or ERR, and its
+        text.
+        '''
+        self.writer.write((line + "\n").encode())
+        await self.writer.drain()
+        head = await self.reader.readline()
+        if not head:
+            raise ConnectionError("server closed the session")
+        kind, text = head.decode().rstrip("\n").split(" ", 1)
+        if kind in ("OK", "END"):
+            return kind, (await self.reader.readexactly(int(text))).decode()
+        return kind, text
+
+    def close(self):
+        self.writer.close()
+
+
+async def connect(address):
+    if address.startswith("unix:"):
+        reader, writer = await asyncio.open_unix_connection(address[len("unix:"):])
+    else:
+        host, port = address.rsplit(":", 1)
+        reader, writer = await asyncio.open_connection(host, int(port))
+    return Connection(reader, writer)
+
+
+async def session(address, program, names, heavy, commands, think, latencies, errors, rng):
+    connection = None
+    sent = 0
+    while sent < commands:
+        if connection is None:
+            connection = await connect(address)
+            line, kind = f"open {program}", "open"
+        else:
+            choice = rng.random()
+            if heavy and choice < 0.5:
+                line, kind = f"next {HEAVY_LINES}", f"next {HEAVY_LINES}"
+            elif choice < 0.6:
+                line, kind = f"next {rng.choice([1, 1, 2, 5])}", "next"
+            elif choice < 0.8:
+                line, kind = f"print {rng.choice(names)}", "print"
+            elif choice < 0.95:
+                line, kind = f"trace {rng.choice(names)}", "trace"
+            else:
+                line, kind = f"prev {rng.choice([1, 3])}", "prev"
+
+        start = time.perf_counter()
+        answer, text = await connection.command(line)
+        latencies.setdefault(kind, []).append(time.perf_counter() - start)
+        sent += 1
+        if answer == "ERR":
+            errors.append(f"{program}: {line}: {text}")
+        if answer == "END" or answer == "ERR" and kind == "open":
+            connection.close()
+            connection = None
+        if think:
+            await asyncio.sleep(rng.uniform(0, 2 * think))
+    if connection is not None:
+        connection.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+async def load_test(address, directory, sessions, commands, heavy_fraction, think, seed):
+    programs = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.c"))):
+        if path.endswith("_output.c") or os.path.basename(path) == LOOP_FILE:
+            continue
+        f = open(path, "r")
+        names = variable_names(f.read())
+        f.close()
+        if names:
+            programs.append((os.path.basename(path), names))
+
+    rng = random.Random(seed)
+    latencies = {}
+    errors = []
+    tasks = []
+    for number in range(sessions):
+        if number < sessions * heavy_fraction:
+            program, names, heavy = LOOP_FILE, ["i", "total"], True
+        else:
+            (program, names), heavy = rng.choice(programs), False
+        tasks.append(session(address, program, names, heavy, commands, think, latencies, errors,
+                             random.Random(rng.random())))
+    start = time.perf_counter()
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - start, latencies, errors
+
+
+def start_server(directory):
+    '''
+    Start cserver.py on a Unix socket in directory, serving the sources
+    there. Returns the process and its address.
+    '''
+    path = os.path.join(directory, "server.sock")
+    server = subprocess.Popen([sys.executable, "-W", "ignore", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cserver.py"),
+                               "--unix", path, "--dir", directory], stdout=subprocess.PIPE, text=True)
+    server.stdout.readline()
+    return server, f"unix:{path}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of cserver.py with many concurrent sessions.")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--commands", type=int, default=50, help="commands per session")
+    parser.add_argument("--heavy", type=float, default=0.05, metavar="FRACTION",
+                        help=f"part of the sessions running `next {HEAVY_LINES}` on a long loop")
+    parser.add_argument("--think", type=float, default=0.005, metavar="SECONDS",
+                        help="average pause of a client between two commands")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, help="test a server already listening on this localhost port")
+    parser.add_argument("--unix", metavar="PATH", help="test a server already listening on this Unix socket")
+    options = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    server = None
+    try:
+        for path in glob.glob(os.path.join(INPUT_DIR, "*.c")):
+            shutil.copy(path, directory)
+        f = open(os.path.join(directory, LOOP_FILE), "w")
+        f.write(generate_loop(LOOP_ITERATIONS))
+        f.close()
+
+        if options.unix is not None:
+            address = f"unix:{options.unix}"
+        elif options.port is not None:
+            address = f"127.0.0.1:{options.port}"
+        else:
+            server, address = start_server(directory)
+
+        elapsed, latencies, errors = asyncio.run(load_test(address, directory, options.sessions, options.commands,
+                                                           options.heavy, options.think, options.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(directory)
+
+    total = sum(len(values) for values in latencies.values())
+    print(f"{options.sessions} sessions, {total} commands in {elapsed:.2f}s ({total / elapsed:.0f} commands/sec)")
+    print(f"{'command':<12} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for kind, values in sorted(latencies.items()):
+        values.sort()
+        print(f"{kind:<12} {len(values):>7} " + " ".join(f"{1000 * percentile(values, fraction):9.2f}"
+                                                         for fraction in (0.5, 0.9, 0.99, 1.0)))
+    if errors:
+        print(f"{len(errors)} errors, first: {errors[0]}")
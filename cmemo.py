@@ -0,0 +1,107 @@
+'''
+Results of pure functions kept for calls with the same arguments.
+
+A function is pure when what it returns depends on its arguments alone and
+calling it does nothing else: it has no array parameters, through which
+it could read or write the caller's arrays, and neither it nor anything
+it calls uses printf. Its local arrays and its recursion are fine. A call
+of one made again with the same arguments is then answered from the
+CallCache of the interpreter, without a frame or a line run, and the
+cache forgets the least recently used results past its size.
+
+The cache is opt-in, and only runs that watch nothing line by line use
+it: with REPL checkpoints a call has to run its lines, since `next` and
+`prev` count them, and so has it while the optimizer collects what
+happens on each line.
+'''
+import collections
+
+from cnodes import Call, Node
+
+# what CallCache.get returns for arguments it has no result for
+MISSING = object()
+
+
+def callees(func):
+    '''
+    The names of the functions func calls, printf among them.
+    '''
+    names = set()
+    stack = list(func.stmts)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(item)
+        elif isinstance(item, Node):
+            if type(item) is Call:
+                names.add(item.callee)
+            stack.extend(value for _, value in item.fields())
+    return names
+
+
+def pure_functions(functions):
+    '''
+    The pure ones of a linked program's functions, given by name.
+    '''
+    calls = {name: callees(func) for name, func in functions.items()}
+    printing = {"printf"}
+    changed = True
+    while changed:
+        changed = False
+        for name, names in calls.items():
+            if name not in printing and not printing.isdisjoint(names):
+                printing.add(name)
+                changed = True
+    return {func for name, func in functions.items()
+            if name not in printing and not any(param_type.endswith("*") for param_type in func._frame.param_types)}
+
+
+class CallCache:
+    '''
+    Return values of the pure functions of the running program by function
+    and arguments, at most size of them, with how many calls found theirs
+    (hits) and how many ran (misses).
+    '''
+    __slots__ = ("size", "pure", "results", "hits", "misses", "evictions")
+
+    def __init__(self, size=1024):
+        self.size = size
+        # the FuncDefs calls of which are looked up, none until analyze()
+        self.pure = set()
+        self.results = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def analyze(self, functions):
+        '''
+        Start over for a program, given its linked functions by name, or
+        with no functions for a run that must not use the cache.
+        '''
+        self.pure = pure_functions(functions) if functions else set()
+        self.results.clear()
+
+    def key(self, function, args):
+        # 1 and 1.0 are equal keys but not the same argument: int
+        # parameters keep the raw value
+        return (function, *args, *map(type, args))
+
+    def get(self, key):
+        results = self.results
+        value = results.get(key, MISSING)
+        if value is MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+            results.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        results = self.results
+        results[key] = value
+        if len(results) > self.size:
+            results.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": len(self.results)}
@@ -0,0 +1,373 @@
+'''
+Parse tree nodes built by cyacc.
+
+Each node is a small __slots__ object instead of the former
+["kind", {...}] pair. For code that still speaks the old shape, every node
+also behaves like that pair: node[0] is the kind string, node[1] is the
+node itself and node[1]["key"] reads the attribute of the same name, so
+
+    behavior, content = node
+    content["lineno"]
+
+keeps working.
+'''
+
+
+class Node:
+    # _compiled caches what the interpreter compiles the node into
+    __slots__ = ("lineno", "_compiled")
+    kind = None
+    # old dict key -> attribute name, where they differ
+    LEGACY_KEYS = {"str": "text"}
+
+    def __getitem__(self, key):
+        if key == 0:
+            return self.kind
+        if key == 1:
+            return self
+        try:
+            return getattr(self, self.LEGACY_KEYS.get(key, key))
+        except AttributeError:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter((self.kind, self))
+
+    def __len__(self):
+        return 2
+
+    def fields(self, private=False):
+        for cls in type(self).__mro__:
+            for name in getattr(cls, "__slots__", ()):
+                if (private or name[0] != "_") and hasattr(self, name):
+                    yield name, getattr(self, name)
+
+    def __deepcopy__(self, memo):
+        # The interpreter keeps per-activation state outside the tree, so a
+        # copy can share the node, and with it the memoized text and the
+        # compiled closures.
+        return self
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self.fields())
+        return f"{type(self).__name__}({fields})"
+
+
+def memoize(node, slot, compute):
+    '''
+    Fill `slot` on node and on every subexpression still missing it,
+    children first, with the result of their `compute` method, which may
+    read the slot of the children.
+    Iterative, so a chain of thousands of additions does not hit the
+    recursion limit.
+    '''
+    stack = [node]
+    while stack:
+        top = stack[-1]
+        pending = [child for child in top.children() if not hasattr(child, slot)]
+        if pending:
+            stack.extend(pending)
+            continue
+        stack.pop()
+        if not hasattr(top, slot):
+            setattr(top, slot, getattr(top, compute)())
+    return getattr(node, slot)
+
+
+class Expr(Node):
+    '''
+    Expression node. text is the source text of the expression and arg_list
+    the variables it reads. Only common subexpression elimination needs
+    them, so both are computed on first access and then kept on the node.
+    '''
+    __slots__ = ("_text", "_arg_list")
+
+    def children(self):
+        return ()
+
+    @property
+    def text(self):
+        try:
+            return self._text
+        except AttributeError:
+            return memoize(self, "_text", "compute_text")
+
+    @property
+    def arg_list(self):
+        try:
+            return self._arg_list
+        except AttributeError:
+            return memoize(self, "_arg_list", "compute_arg_list")
+
+    def compute_arg_list(self):
+        return []
+
+
+class Number(Expr):
+    __slots__ = ("value",)
+    kind = "number"
+
+    def __init__(self, value, lineno):
+        self.value = value
+        self.lineno = lineno
+
+    def compute_text(self):
+        return str(self.value)
+
+
+class String(Expr):
+    __slots__ = ()
+    kind = "string"
+
+    def __init__(self, text, lineno):
+        self._text = text
+        self.lineno = lineno
+
+
+class Id(Expr):
+    # _slot is the frame slot cresolver resolves the name to
+    __slots__ = ("name", "_slot")
+    kind = "id"
+
+    def __init__(self, name, lineno):
+        self.name = name
+        self.lineno = lineno
+
+    def compute_text(self):
+        return self.name
+
+    def compute_arg_list(self):
+        return [self.name]
+
+
+class ArrayRef(Expr):
+    __slots__ = ("name", "index", "_slot")
+    kind = "array"
+
+    def __init__(self, name, index, lineno):
+        self.name = name
+        self.index = index
+        self.lineno = lineno
+
+    def children(self):
+        return (self.index,)
+
+    def compute_text(self):
+        return self.name + '[' + self.index._text + ']'
+
+    def compute_arg_list(self):
+        return list(set([self.name]) | set(self.index._arg_list))
+
+
+class BinOp(Expr):
+    __slots__ = ("op", "lhs", "rhs")
+    kind = "expression"
+
+    def __init__(self, op, lhs, rhs, lineno):
+        self.op = op
+        self.lhs = lhs
+        self.rhs = rhs
+        self.lineno = lineno
+
+    def children(self):
+        return (self.lhs, self.rhs)
+
+    def compute_text(self):
+        return self.lhs._text + self.op + self.rhs._text
+
+    def compute_arg_list(self):
+        return list(set(self.lhs._arg_list) | set(self.rhs._arg_list))
+
+
+class Cast(Expr):
+    __slots__ = ("type", "expr")
+    kind = "casting"
+
+    def __init__(self, type, expr, lineno):
+        self.type = type
+        self.expr = expr
+        self.lineno = lineno
+
+    def children(self):
+        return (self.expr,)
+
+    def compute_text(self):
+        return '(' + self.type + ')' + self.expr._text
+
+    def compute_arg_list(self):
+        return self.expr._arg_list
+
+
+class Call(Expr):
+    # _target is the FuncDef clinker links the call to
+    __slots__ = ("callee", "args", "_target")
+    kind = "functcall"
+
+    def __init__(self, callee, args, lineno):
+        self.callee = callee
+        self.args = args
+        self.lineno = lineno
+
+    def children(self):
+        return self.args
+
+    def compute_text(self):
+        return self.callee + '(' + ','.join(arg._text for arg in self.args) + ')'
+
+    def compute_arg_list(self):
+        arg_list = []
+        for arg in self.args:
+            arg_list += arg._arg_list
+        return arg_list
+
+
+class Param(Node):
+    __slots__ = ("type", "name")
+    kind = "id"
+
+    def __init__(self, type, name):
+        self.type = type
+        self.name = name
+        self.lineno = None
+
+
+class Declare(Node):
+    __slots__ = ("type", "vars")
+    kind = "declare"
+
+    def __init__(self, type, vars, lineno):
+        self.type = type
+        self.vars = vars
+        self.lineno = lineno
+
+
+class Assign(Node):
+    __slots__ = ("var", "expr")
+    kind = "assign"
+
+    def __init__(self, var, expr, lineno):
+        self.var = var
+        self.expr = expr
+        self.lineno = lineno
+
+
+class Increment(Node):
+    __slots__ = ("var",)
+    kind = "increment"
+
+    def __init__(self, var, lineno):
+        self.var = var
+        self.lineno = lineno
+
+
+class ReturnStmt(Node):
+    __slots__ = ("value",)
+    kind = "return"
+
+    def __init__(self, value, lineno):
+        self.value = value
+        self.lineno = lineno
+
+
+class Condition(Node):
+    __slots__ = ("var", "cmp", "expr", "_slot")
+    kind = "condition"
+
+    def __init__(self, var, cmp, expr, lineno):
+        self.var = var
+        self.cmp = cmp
+        self.expr = expr
+        self.lineno = lineno
+
+
+class LBrace(Node):
+    __slots__ = ()
+    kind = "{"
+
+    def __init__(self, lineno):
+        self.lineno = lineno
+
+
+class RBrace(Node):
+    __slots__ = ()
+    kind = "}"
+
+    def __init__(self, lineno):
+        self.lineno = lineno
+
+
+class Block(Node):
+    '''
+    Node spanning several lines: lineno is the first line and end_lineno the
+    closing brace. The legacy "lineno" key still gives [first, last].
+    '''
+    # _declared is the frame slots declared directly in stmts, see cresolver
+    __slots__ = ("end_lineno", "stmts", "_declared")
+    LEGACY_KEYS = {"lineno": "span"}
+
+    @property
+    def span(self):
+        return [self.lineno, self.end_lineno]
+
+
+class For(Block):
+    __slots__ = ("assign", "condition", "increment")
+    kind = "for"
+
+    def __init__(self, assign, condition, increment, stmts, lineno, end_lineno):
+        self.assign = assign
+        self.condition = condition
+        self.increment = increment
+        self.stmts = stmts
+        self.lineno = lineno
+        self.end_lineno = end_lineno
+
+
+class If(Block):
+    __slots__ = ("condition",)
+    kind = "if"
+
+    def __init__(self, condition, stmts, lineno, end_lineno):
+        self.condition = condition
+        self.stmts = stmts
+        self.lineno = lineno
+        self.end_lineno = end_lineno
+
+
+class FuncDef(Block):
+    # _frame is the cresolver.FrameLayout of the function
+    __slots__ = ("type", "name", "params", "_frame")
+    kind = "function"
+
+    def __init__(self, type, name, params, stmts, lineno, end_lineno):
+        self.type = type
+        self.name = name
+        self.params = params
+        self.stmts = stmts
+        self.lineno = lineno
+        self.end_lineno = end_lineno
+
+
+def legacy_tree(node):
+    '''
+    Rebuild the ["kind", {...}] form cyacc produced before these classes,
+    for tools that still want plain lists and dicts.
+    '''
+    if isinstance(node, list):
+        return [legacy_tree(elem) for elem in node]
+    if not isinstance(node, Node):
+        return node
+
+    content = {}
+    for name, value in node.fields():
+        if name == "end_lineno":
+            continue
+        if name == "lineno" and isinstance(node, Block):
+            value = node.span
+        if name == "lineno" and isinstance(node, Param):
+            continue
+        content[name] = legacy_tree(value)
+    if isinstance(node, Expr):
+        content["arg_list"] = node.arg_list
+        content["str"] = node.text
+    return [node.kind, content]
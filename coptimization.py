@@ -1,13 +1,6 @@
 import re
 
-# Copy Propagation
-# key : (line number, before variable), value : next variable
-CP_DICT = {}
-# Common Subexpression Elimination
-# key : target expression, value : (variable type, target line numbers of sets) of list
-CS_DICT = {}
-
-IS_IN_OPTIMIZATION = False
+from cnodes import Id, Number
 
 
 class CException(Exception):
@@ -18,8 +11,19 @@ class CException(Exception):
             Exception.__init__(self, f"[Line {lineno}] {msg}")
 
 
+def not_assigned(name, lineno):
+    '''
+    The error for reading name, a variable or an array element, before
+    anything was assigned to it. Every engine keeps such a value as None and
+    checks for it where the value is read.
+    '''
+    return CException(f"Variable {name} is not assigned yet", lineno)
+
+
 # Copy Propagation Information
 class CPI:
+    __slots__ = ("rhs", "lineno")
+
     def __init__(self, lineno):
         # rhs can be variable or direct number
         self.rhs = None
@@ -32,6 +36,8 @@ class CPI:
 
 # Common Subexpression Elimination Information
 class CSI:
+    __slots__ = ("used_vars", "lines")
+
     def __init__(self, used_vars, lineno):
         self.used_vars = used_vars
         self.lines = [lineno]
@@ -43,10 +49,64 @@ class CSI:
         self.lines.append(new_line)
 
 
+# What a run records for the optimizer, see OptimizerContext.mode
+COPY_PROPAGATION = 0
+COMMON_SUBEXPRESSIONS = 1
+NO_ANALYSIS = 2
+
+
+class OptimizerContext:
+    '''
+    What the optimizer collects while a program runs, one per interpreter.
+    mode is what the run records: copy propagation while it runs for the
+    REPL, common subexpressions in process_without_input, or nothing at
+    all for an interpreter made without analysis, whose frames then keep
+    no bookkeeping.
+    '''
+    __slots__ = ("cp_dict", "cs_dict", "in_optimization", "mode")
+
+    def __init__(self, analysis=True):
+        # Copy Propagation
+        # key : (line number, before variable), value : next variable
+        self.cp_dict = {}
+        # Common Subexpression Elimination
+        # key : target expression, value : (variable type, target line numbers of sets) of list
+        self.cs_dict = {}
+        self.in_optimization = False
+        self.mode = COPY_PROPAGATION if analysis else NO_ANALYSIS
+
+    def initialize(self):
+        self.cp_dict = {}
+        self.cs_dict = {}
+        self.in_optimization = True
+        self.mode = COMMON_SUBEXPRESSIONS
+
+    def add_cs(self, expr_type, expr_str, target_lines):
+        if len(target_lines) <= 1:
+            return
+
+        cs_dict = self.cs_dict
+        if expr_str not in cs_dict:
+            cs_dict[expr_str] = []
+
+        is_overriding = False
+        for (index, (expr_type, lines)) in enumerate(cs_dict[expr_str]):
+            if lines.issubset(target_lines):
+                cs_dict[expr_str][index] = (expr_type, set(target_lines))
+                is_overriding = True
+                break
+
+        if not is_overriding:
+            cs_dict[expr_str].append((expr_type, set(target_lines)))
+
+
 class Optimization:
-    def __init__(self):
+    __slots__ = ("cpis", "csis", "context")
+
+    def __init__(self, context):
         self.cpis = {}
         self.csis = {}
+        self.context = context
 
     def declare_cpi(self, var_name, lineno):
         cpi = CPI(lineno)
@@ -71,7 +131,7 @@ class Optimization:
             self.csis[expr_str][-1].assign(lineno)
         else:
             self.csis[expr_str][-1].add_line(lineno)
-            add_cs(type, expr_str, self.csis[expr_str][-1].lines)
+            self.context.add_cs(type, expr_str, self.csis[expr_str][-1].lines)
 
     def add_csi(self, var):
         for expr_str in self.csis:
@@ -102,68 +162,34 @@ class Optimization:
             self.csis.pop(expr_str, None)
 
 
-def initialize_optimization():
-    global CP_DICT
-    global CS_DICT
-    global IS_IN_OPTIMIZATION
-
-    CP_DICT = {}
-    CS_DICT = {}
-    IS_IN_OPTIMIZATION = True
-
-
-def get_is_in_optimization():
-    return IS_IN_OPTIMIZATION
-
-
 def add_cp_id(func, var_name, lineno):
-    global CP_DICT
+    cp_dict = func.context.cp_dict
 
     cpi = func.get_cpi(var_name)
     if cpi is None:
         raise CException(f"Declared variable {var_name} doesn't have cpi")
 
     if cpi.rhs is None:
-        if (lineno, var_name) in CP_DICT:
-            del CP_DICT[(lineno, var_name)]
+        if (lineno, var_name) in cp_dict:
+            del cp_dict[(lineno, var_name)]
         return
 
-    CP_DICT[(lineno, var_name)] = cpi.rhs
+    cp_dict[(lineno, var_name)] = cpi.rhs
 
 
 def add_cp_array(func, var_name, lineno):
-    global CP_DICT
+    cp_dict = func.context.cp_dict
 
     cpi = func.get_cpi(var_name)
     if cpi is None:
         raise CException(f"{var_name} doesn't have cpi")
 
     if cpi.rhs is None:
-        if (lineno, var_name) in CP_DICT:
-            del CP_DICT[(lineno, var_name)]
-        return
-
-    CP_DICT[(lineno, var_name)] = cpi.rhs
-
-
-def add_cs(expr_type, expr_str, target_lines):
-    global CS_DICT
-
-    if len(target_lines) <= 1:
+        if (lineno, var_name) in cp_dict:
+            del cp_dict[(lineno, var_name)]
         return
 
-    if expr_str not in CS_DICT:
-        CS_DICT[expr_str] = []
-
-    is_overriding = False
-    for (index, (expr_type, lines)) in enumerate(CS_DICT[expr_str]):
-        if lines.issubset(target_lines):
-            CS_DICT[expr_str][index] = (expr_type, set(target_lines))
-            is_overriding = True
-            break
-
-    if not is_overriding:
-        CS_DICT[expr_str].append((expr_type, set(target_lines)))
+    cp_dict[(lineno, var_name)] = cpi.rhs
 
 
 def update_optimization_information_with_assign(func, expr, lineno, lhs, is_array):
@@ -171,10 +197,10 @@ def update_optimization_information_with_assign(func, expr, lineno, lhs, is_arra
         cpi = func.get_cpi(lhs)
 
         # direct assignment
-        if expr[0] is 'id':
-            cpi.assign(expr[1]["str"], lineno)
-        elif expr[0] is 'number':
-            cpi.assign(expr[1]["value"], lineno)
+        if isinstance(expr, Id):
+            cpi.assign(expr.text, lineno)
+        elif isinstance(expr, Number):
+            cpi.assign(expr.value, lineno)
         # cpi should be erased if not direct assignment
         else:
             cpi.assign(None, lineno)
@@ -245,9 +271,9 @@ def get_optimized_cs_string(target_line, target_expression, cs_variable):
     return f"{target_line[:assign_index + 1]} {new_expression}"
 
 
-def get_cp_optimized_code(plain_code):
+def get_cp_optimized_code(plain_code, cp_dict):
     new_code = list(plain_code)
-    for (key, next_variable) in CP_DICT.items():
+    for (key, next_variable) in cp_dict.items():
         line_number, before_variable = key
         target_line = str(new_code[line_number])
 
@@ -265,8 +291,8 @@ def get_cp_optimized_code(plain_code):
     return new_code, "".join(new_code)
 
 
-def get_cs_optimized_code(plain_code):
-    target = sorted(CS_DICT.items(), key=lambda element: len(element[0]), reverse=True)
+def get_cs_optimized_code(plain_code, cs_dict):
+    target = sorted(cs_dict.items(), key=lambda element: len(element[0]), reverse=True)
     new_code = list(plain_code)
     inserted_line_numbers = []
     variable_index = 0
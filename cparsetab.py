@@ -0,0 +1,103 @@
+
+# cparsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'ASSIGN COMMA DIVIDE EQ FLOAT FOR GT GTE ID IF INCREMENT INT LBRACE LBRACKET LPAREN LT LTE MINUS NEQ NUMBER PLUS RBRACE RBRACKET RETURN RPAREN SEMICOLON STAR STRING VOIDcode : funclistfunclist : funclist func\n                | funcfunc : INT ID LPAREN paramlist RPAREN lbrace stmtlist rbrace\n            | FLOAT ID LPAREN paramlist RPAREN lbrace stmtlist rbrace\n            | VOID ID LPAREN paramlist RPAREN lbrace stmtlist rbrace\n    paramlist : paramlist COMMA param\n                 | paramparam : VOID\n             | empty\n             | INT ID\n         \t | FLOAT ID\n        \t | INT STAR ID\n        \t | FLOAT STAR IDempty :stmtlist : stmtlist stmt\n                | stmtstmt : declare semicolonlist\n            | assign semicolonlist\n            | increment semicolonlist\n            | functcall semicolonlist\n            | return semicolonlist\n            | forloop\n            | ifsemicolonlist : SEMICOLON semicolonlist\n                     | SEMICOLONdeclare : INT declarelist\n               | FLOAT declarelist\n               | INT STAR declarelist\n               | FLOAT STAR declarelistdeclarelist : declarelist COMMA id\n                   | idassign : id ASSIGN expressionincrement : id INCREMENTincrement : INCREMENT idfunctcall : ID LPAREN arglist RPARENarglist : arglist COMMA arg\n               | argarg : expressionarg : stringstring : STRINGarg : emptyreturn : RETURN expression\n              | RETURNexpression : expression PLUS term\n                  | expression MINUS term\n                  | term\n                  | castingterm : term STAR factor\n            | term DIVIDE factor\n            | factorfactor : functcallfactor : NUMBER\n              | LPAREN NUMBER RPAREN\n              | LPAREN PLUS NUMBER RPAREN\n              | LPAREN MINUS NUMBER RPARENfactor : LPAREN expression RPARENfactor : idid : ID\n          | ID LBRACKET expression RBRACKETcasting : LPAREN INT RPAREN expression\n               | LPAREN FLOAT RPAREN expressionforloop : FOR LPAREN assign SEMICOLON condition SEMICOLON increment RPAREN lbrace stmtlist rbraceif : IF LPAREN condition RPAREN lbrace stmtlist rbracecondition : ID cmp expressioncmp : GT\n           | GTE\n           | LT\n           | LTE\n           | EQ\n           | NEQlbrace : LBRACErbrace : RBRACE'
+    
+_lr_action_items = {'INT':([0,2,3,7,11,12,13,25,31,32,35,36,39,40,46,47,54,55,62,63,64,65,66,67,68,69,70,80,86,87,97,144,147,150,152,153,154,],[4,4,-3,-2,14,14,14,14,37,-72,37,37,37,-17,-23,-24,37,37,-4,-16,-73,-18,-26,-19,-20,-21,-22,104,-5,-6,-25,37,37,-64,37,37,-63,]),'FLOAT':([0,2,3,7,11,12,13,25,31,32,35,36,39,40,46,47,54,55,62,63,64,65,66,67,68,69,70,80,86,87,97,144,147,150,152,153,154,],[5,5,-3,-2,19,19,19,19,48,-72,48,48,48,-17,-23,-24,48,48,-4,-16,-73,-18,-26,-19,-20,-21,-22,106,-5,-6,-25,48,48,-64,48,48,-63,]),'VOID':([0,2,3,7,11,12,13,25,62,64,86,87,],[6,6,-3,-2,17,17,17,17,-4,-73,-5,-6,]),'$end':([1,2,3,7,62,64,86,87,],[0,-1,-3,-2,-4,-73,-5,-6,]),'ID':([4,5,6,14,19,23,27,31,32,35,36,37,39,40,46,47,48,50,51,54,55,57,60,61,63,64,65,66,67,68,69,70,72,73,80,84,85,88,97,100,101,102,103,116,119,123,125,129,131,132,133,134,135,136,137,144,146,147,150,152,153,154,],[8,9,10,22,26,30,34,38,-72,38,38,59,38,-17,-23,-24,59,59,38,38,38,59,38,38,-16,-73,-18,-26,-19,-20,-21,-22,59,38,38,59,113,59,-25,38,38,38,38,38,38,38,38,113,38,-66,-67,-68,-69,-70,-71,38,59,38,-64,38,38,-63,]),'LPAREN':([8,9,10,38,51,52,53,60,61,73,80,100,101,102,103,116,119,123,125,131,132,133,134,135,136,137,],[11,12,13,60,80,84,85,80,80,80,80,119,119,119,119,80,80,80,80,80,-66,-67,-68,-69,-70,-71,]),'RPAREN':([11,12,13,15,16,17,18,20,21,22,25,26,30,33,34,38,59,60,74,75,77,78,79,81,82,83,90,91,92,93,94,95,104,105,106,107,112,115,116,117,118,120,121,122,124,126,127,128,138,139,140,141,142,145,148,],[-15,-15,-15,24,-8,-9,-10,28,29,-11,-15,-12,-13,-7,-14,-59,-59,-15,-34,-35,-47,-48,-51,-52,-53,-58,115,-38,-39,-40,-42,-41,123,124,125,126,130,-36,-15,-60,-45,-46,-49,-50,-57,-54,141,142,-37,-61,-62,-55,-56,-65,151,]),'COMMA':([11,12,13,15,16,17,18,20,21,22,25,26,30,33,34,38,56,58,59,60,71,77,78,79,81,82,83,89,90,91,92,93,94,95,98,114,115,116,117,118,120,121,122,124,126,138,139,140,141,142,],[-15,-15,-15,25,-8,-9,-10,25,25,-11,-15,-12,-13,-7,-14,-59,88,-32,-59,-15,88,-47,-48,-51,-52,-53,-58,88,116,-38,-39,-40,-42,-41,88,-31,-36,-15,-60,-45,-46,-49,-50,-57,-54,-37,-61,-62,-55,-56,]),'STAR':([14,19,37,38,48,77,79,81,82,83,107,115,117,118,120,121,122,124,126,141,142,],[23,27,57,-59,72,102,-51,-52,-53,-58,-53,-36,-60,102,102,-49,-50,-57,-54,-55,-56,]),'LBRACE':([24,28,29,130,151,],[32,32,32,32,32,]),'INCREMENT':([31,32,35,36,38,39,40,46,47,49,54,55,59,63,64,65,66,67,68,69,70,97,117,144,146,147,149,150,152,153,154,],[50,-72,50,50,-59,50,-17,-23,-24,74,50,50,-59,-16,-73,-18,-26,-19,-20,-21,-22,-25,-60,50,50,50,74,-64,50,50,-63,]),'RETURN':([31,32,35,36,39,40,46,47,54,55,63,64,65,66,67,68,69,70,97,144,147,150,152,153,154,],[51,-72,51,51,51,-17,-23,-24,51,51,-16,-73,-18,-26,-19,-20,-21,-22,-25,51,51,-64,51,51,-63,]),'FOR':([31,32,35,36,39,40,46,47,54,55,63,64,65,66,67,68,69,70,97,144,147,150,152,153,154,],[52,-72,52,52,52,-17,-23,-24,52,52,-16,-73,-18,-26,-19,-20,-21,-22,-25,52,52,-64,52,52,-63,]),'IF':([31,32,35,36,39,40,46,47,54,55,63,64,65,66,67,68,69,70,97,144,147,150,152,153,154,],[53,-72,53,53,53,-17,-23,-24,53,53,-16,-73,-18,-26,-19,-20,-21,-22,-25,53,53,-64,53,53,-63,]),'ASSIGN':([38,49,59,111,117,],[-59,73,-59,73,-60,]),'DIVIDE':([38,77,79,81,82,83,107,115,117,118,120,121,122,124,126,141,142,],[-59,103,-51,-52,-53,-58,-53,-36,-60,103,103,-49,-50,-57,-54,-55,-56,]),'PLUS':([38,76,77,78,79,80,81,82,83,92,96,99,105,107,115,117,118,119,120,121,122,124,126,139,140,141,142,145,],[-59,100,-47,-48,-51,108,-52,-53,-58,100,100,100,100,-53,-36,-60,-45,108,-46,-49,-50,-57,-54,100,100,-55,-56,100,]),'MINUS':([38,76,77,78,79,80,81,82,83,92,96,99,105,107,115,117,118,119,120,121,122,124,126,139,140,141,142,145,],[-59,101,-47,-48,-51,109,-52,-53,-58,101,101,101,101,-53,-36,-60,-45,109,-46,-49,-50,-57,-54,101,101,-55,-56,101,]),'SEMICOLON':([38,41,42,43,44,45,51,56,58,59,66,71,74,75,76,77,78,79,81,82,83,89,98,99,110,114,115,117,118,120,121,122,124,126,139,140,141,142,143,145,],[-59,66,66,66,66,66,-44,-27,-32,-59,66,-28,-34,-35,-43,-47,-48,-51,-52,-53,-58,-29,-30,-33,129,-31,-36,-60,-45,-46,-49,-50,-57,-54,-61,-62,-55,-56,146,-65,]),'RBRACKET':([38,77,78,79,81,82,83,96,115,117,118,120,121,122,124,126,139,140,141,142,],[-59,-47,-48,-51,-52,-53,-58,117,-36,-60,-45,-46,-49,-50,-57,-54,-61,-62,-55,-56,]),'LBRACKET':([38,59,],[61,61,]),'RBRACE':([39,40,46,47,54,55,63,64,65,66,67,68,69,70,97,147,150,153,154,],[64,-17,-23,-24,64,64,-16,-73,-18,-26,-19,-20,-21,-22,-25,64,-64,64,-63,]),'NUMBER':([51,60,61,73,80,100,101,102,103,108,109,116,119,123,125,131,132,133,134,135,136,137,],[82,82,82,82,107,82,82,82,82,127,128,82,107,82,82,82,-66,-67,-68,-69,-70,-71,]),'STRING':([60,116,],[95,95,]),'GT':([113,],[132,]),'GTE':([113,],[133,]),'LT':([113,],[134,]),'LTE':([113,],[135,]),'EQ':([113,],[136,]),'NEQ':([113,],[137,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'code':([0,],[1,]),'funclist':([0,],[2,]),'func':([0,2,],[3,7,]),'paramlist':([11,12,13,],[15,20,21,]),'param':([11,12,13,25,],[16,16,16,33,]),'empty':([11,12,13,25,60,116,],[18,18,18,18,94,94,]),'lbrace':([24,28,29,130,151,],[31,35,36,144,152,]),'stmtlist':([31,35,36,144,152,],[39,54,55,147,153,]),'stmt':([31,35,36,39,54,55,144,147,152,153,],[40,40,40,63,63,63,40,63,40,63,]),'declare':([31,35,36,39,54,55,144,147,152,153,],[41,41,41,41,41,41,41,41,41,41,]),'assign':([31,35,36,39,54,55,84,144,147,152,153,],[42,42,42,42,42,42,110,42,42,42,42,]),'increment':([31,35,36,39,54,55,144,146,147,152,153,],[43,43,43,43,43,43,43,148,43,43,43,]),'functcall':([31,35,36,39,51,54,55,60,61,73,80,100,101,102,103,116,119,123,125,131,144,147,152,153,],[44,44,44,44,81,44,44,81,81,81,81,81,81,81,81,81,81,81,81,81,44,44,44,44,]),'return':([31,35,36,39,54,55,144,147,152,153,],[45,45,45,45,45,45,45,45,45,45,]),'forloop':([31,35,36,39,54,55,144,147,152,153,],[46,46,46,46,46,46,46,46,46,46,]),'if':([31,35,36,39,54,55,144,147,152,153,],[47,47,47,47,47,47,47,47,47,47,]),'id':([31,35,36,37,39,48,50,51,54,55,57,60,61,72,73,80,84,88,100,101,102,103,116,119,123,125,131,144,146,147,152,153,],[49,49,49,58,49,58,75,83,49,49,58,83,83,58,83,83,111,114,83,83,83,83,83,83,83,83,83,49,149,49,49,49,]),'declarelist':([37,48,57,72,],[56,71,89,98,]),'rbrace':([39,54,55,147,153,],[62,86,87,150,154,]),'semicolonlist':([41,42,43,44,45,66,],[65,67,68,69,70,97,]),'expression':([51,60,61,73,80,116,119,123,125,131,],[76,92,96,99,105,92,105,139,140,145,]),'term':([51,60,61,73,80,100,101,116,119,123,125,131,],[77,77,77,77,77,118,120,77,77,77,77,77,]),'casting':([51,60,61,73,80,116,119,123,125,131,],[78,78,78,78,78,78,78,78,78,78,]),'factor':([51,60,61,73,80,100,101,102,103,116,119,123,125,131,],[79,79,79,79,79,79,79,121,122,79,79,79,79,79,]),'arglist':([60,],[90,]),'arg':([60,116,],[91,138,]),'string':([60,116,],[93,93,]),'condition':([85,129,],[112,143,]),'cmp':([113,],[131,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> code","S'",1,None,None,None),
+  ('code -> funclist','code',1,'p_code','cyacc.py',12),
+  ('funclist -> funclist func','funclist',2,'p_funclist','cyacc.py',16),
+  ('funclist -> func','funclist',1,'p_funclist','cyacc.py',17),
+  ('func -> INT ID LPAREN paramlist RPAREN lbrace stmtlist rbrace','func',8,'p_func','cyacc.py',26),
+  ('func -> FLOAT ID LPAREN paramlist RPAREN lbrace stmtlist rbrace','func',8,'p_func','cyacc.py',27),
+  ('func -> VOID ID LPAREN paramlist RPAREN lbrace stmtlist rbrace','func',8,'p_func','cyacc.py',28),
+  ('paramlist -> paramlist COMMA param','paramlist',3,'p_paramlist','cyacc.py',41),
+  ('paramlist -> param','paramlist',1,'p_paramlist','cyacc.py',42),
+  ('param -> VOID','param',1,'p_param','cyacc.py',50),
+  ('param -> empty','param',1,'p_param','cyacc.py',51),
+  ('param -> INT ID','param',2,'p_param','cyacc.py',52),
+  ('param -> FLOAT ID','param',2,'p_param','cyacc.py',53),
+  ('param -> INT STAR ID','param',3,'p_param','cyacc.py',54),
+  ('param -> FLOAT STAR ID','param',3,'p_param','cyacc.py',55),
+  ('empty -> <empty>','empty',0,'p_empty','cyacc.py',73),
+  ('stmtlist -> stmtlist stmt','stmtlist',2,'p_stmtlist','cyacc.py',77),
+  ('stmtlist -> stmt','stmtlist',1,'p_stmtlist','cyacc.py',78),
+  ('stmt -> declare semicolonlist','stmt',2,'p_stmt','cyacc.py',86),
+  ('stmt -> assign semicolonlist','stmt',2,'p_stmt','cyacc.py',87),
+  ('stmt -> increment semicolonlist','stmt',2,'p_stmt','cyacc.py',88),
+  ('stmt -> functcall semicolonlist','stmt',2,'p_stmt','cyacc.py',89),
+  ('stmt -> return semicolonlist','stmt',2,'p_stmt','cyacc.py',90),
+  ('stmt -> forloop','stmt',1,'p_stmt','cyacc.py',91),
+  ('stmt -> if','stmt',1,'p_stmt','cyacc.py',92),
+  ('semicolonlist -> SEMICOLON semicolonlist','semicolonlist',2,'p_semicolonlist','cyacc.py',97),
+  ('semicolonlist -> SEMICOLON','semicolonlist',1,'p_semicolonlist','cyacc.py',98),
+  ('declare -> INT declarelist','declare',2,'p_declare','cyacc.py',102),
+  ('declare -> FLOAT declarelist','declare',2,'p_declare','cyacc.py',103),
+  ('declare -> INT STAR declarelist','declare',3,'p_declare','cyacc.py',104),
+  ('declare -> FLOAT STAR declarelist','declare',3,'p_declare','cyacc.py',105),
+  ('declarelist -> declarelist COMMA id','declarelist',3,'p_declarelist','cyacc.py',121),
+  ('declarelist -> id','declarelist',1,'p_declarelist','cyacc.py',122),
+  ('assign -> id ASSIGN expression','assign',3,'p_assign','cyacc.py',129),
+  ('increment -> id INCREMENT','increment',2,'p_increment_id_inc','cyacc.py',138),
+  ('increment -> INCREMENT id','increment',2,'p_increment_inc_id','cyacc.py',146),
+  ('functcall -> ID LPAREN arglist RPAREN','functcall',4,'p_functcall','cyacc.py',154),
+  ('arglist -> arglist COMMA arg','arglist',3,'p_arglist','cyacc.py',174),
+  ('arglist -> arg','arglist',1,'p_arglist','cyacc.py',175),
+  ('arg -> expression','arg',1,'p_arg','cyacc.py',189),
+  ('arg -> string','arg',1,'p_arg_string','cyacc.py',194),
+  ('string -> STRING','string',1,'p_string','cyacc.py',199),
+  ('arg -> empty','arg',1,'p_arg_empty','cyacc.py',207),
+  ('return -> RETURN expression','return',2,'p_return','cyacc.py',212),
+  ('return -> RETURN','return',1,'p_return','cyacc.py',213),
+  ('expression -> expression PLUS term','expression',3,'p_expression','cyacc.py',227),
+  ('expression -> expression MINUS term','expression',3,'p_expression','cyacc.py',228),
+  ('expression -> term','expression',1,'p_expression','cyacc.py',229),
+  ('expression -> casting','expression',1,'p_expression','cyacc.py',230),
+  ('term -> term STAR factor','term',3,'p_term','cyacc.py',247),
+  ('term -> term DIVIDE factor','term',3,'p_term','cyacc.py',248),
+  ('term -> factor','term',1,'p_term','cyacc.py',249),
+  ('factor -> functcall','factor',1,'p_factor_functcall','cyacc.py',266),
+  ('factor -> NUMBER','factor',1,'p_factor_num','cyacc.py',271),
+  ('factor -> LPAREN NUMBER RPAREN','factor',3,'p_factor_num','cyacc.py',272),
+  ('factor -> LPAREN PLUS NUMBER RPAREN','factor',4,'p_factor_num','cyacc.py',273),
+  ('factor -> LPAREN MINUS NUMBER RPAREN','factor',4,'p_factor_num','cyacc.py',274),
+  ('factor -> LPAREN expression RPAREN','factor',3,'p_factor_paren','cyacc.py',305),
+  ('factor -> id','factor',1,'p_factor_id','cyacc.py',310),
+  ('id -> ID','id',1,'p_id','cyacc.py',315),
+  ('id -> ID LBRACKET expression RBRACKET','id',4,'p_id','cyacc.py',316),
+  ('casting -> LPAREN INT RPAREN expression','casting',4,'p_casting','cyacc.py',337),
+  ('casting -> LPAREN FLOAT RPAREN expression','casting',4,'p_casting','cyacc.py',338),
+  ('forloop -> FOR LPAREN assign SEMICOLON condition SEMICOLON increment RPAREN lbrace stmtlist rbrace','forloop',11,'p_forloop','cyacc.py',351),
+  ('if -> IF LPAREN condition RPAREN lbrace stmtlist rbrace','if',7,'p_if','cyacc.py',362),
+  ('condition -> ID cmp expression','condition',3,'p_condition','cyacc.py',371),
+  ('cmp -> GT','cmp',1,'p_cmp','cyacc.py',381),
+  ('cmp -> GTE','cmp',1,'p_cmp','cyacc.py',382),
+  ('cmp -> LT','cmp',1,'p_cmp','cyacc.py',383),
+  ('cmp -> LTE','cmp',1,'p_cmp','cyacc.py',384),
+  ('cmp -> EQ','cmp',1,'p_cmp','cyacc.py',385),
+  ('cmp -> NEQ','cmp',1,'p_cmp','cyacc.py',386),
+  ('lbrace -> LBRACE','lbrace',1,'p_lbrace','cyacc.py',391),
+  ('rbrace -> RBRACE','rbrace',1,'p_rbrace','cyacc.py',395),
+]
@@ -0,0 +1,165 @@
+'''
+Frame slots of the variables of a function, given once before a program
+runs.
+
+Every declaration in a function, its parameters first, gets a slot of its
+own in the frame, and every use of a variable is resolved to the slot of
+the declaration it sees: the last one before it in its block or in an
+enclosing one. A frame is then a list indexed by slot, and reading a
+variable is one index into it instead of a lookup by name in a dict of
+shadowing stacks. A block knows the slots declared directly in it, so
+leaving it empties those and the declaration further out is seen again.
+
+A name with no declaration where it is used still gets a slot, one that
+nothing fills: using it fails when it runs, as it always did.
+
+The layout also holds what a call checks its arguments against, so a call
+does not go through the parameter list again.
+'''
+from cnodes import ArrayRef, Assign, Call, Condition, Declare, For, Id, If, Increment, Param, ReturnStmt
+
+
+class FrameLayout:
+    '''
+    names[slot] is the variable a slot holds, by_name the slots of a name
+    in the order they are declared. arrays are the slots of arrays and
+    undeclared those of names used without a declaration. A call takes
+    arity arguments, the first ones going to slots of param_types, and
+    error is the message of a parameter list no call can match, None for a
+    valid one.
+    '''
+    __slots__ = ("names", "by_name", "arrays", "undeclared", "arity", "param_types", "error")
+
+    def __init__(self, names, arrays=frozenset(), undeclared=frozenset(), arity=0, param_types=(), error=None):
+        self.names = names
+        self.arrays = arrays
+        self.undeclared = undeclared
+        self.arity = arity
+        self.param_types = param_types
+        self.error = error
+        self.by_name = {}
+        for slot, name in enumerate(names):
+            self.by_name.setdefault(name, []).append(slot)
+
+    def __deepcopy__(self, memo):
+        # never changes once made, frames copied for replay can share it
+        return self
+
+
+class Resolver:
+    def __init__(self):
+        self.names = []
+        self.arrays = set()
+        # name -> slot of the blocks the walk is in, innermost last
+        self.scopes = []
+        self.undeclared = {}
+
+    def new_slot(self, name):
+        self.names.append(name)
+        return len(self.names) - 1
+
+    def declare(self, name, is_array=False):
+        slot = self.scopes[-1][name] = self.new_slot(name)
+        if is_array:
+            self.arrays.add(slot)
+        return slot
+
+    def lookup(self, name):
+        for scope in reversed(self.scopes):
+            slot = scope.get(name)
+            if slot is not None:
+                return slot
+        slot = self.undeclared.get(name)
+        if slot is None:
+            slot = self.undeclared[name] = self.new_slot(name)
+        return slot
+
+    def expr(self, expr):
+        stack = [expr]
+        while stack:
+            node = stack.pop()
+            if type(node) is Id or type(node) is ArrayRef:
+                node._slot = self.lookup(node.name)
+            stack.extend(node.children())
+
+    def block(self, stmts):
+        '''
+        Resolve a statement list, returning the slots declared in it.
+        '''
+        self.scopes.append({})
+        declared = []
+        for stmt in stmts:
+            self.statement(stmt, declared)
+        self.scopes.pop()
+        return tuple(declared)
+
+    def statement(self, stmt, declared):
+        stmt_type = type(stmt)
+        if stmt_type is Declare:
+            # array sizes are evaluated before any of the names is declared
+            for var_info in stmt.vars:
+                if type(var_info) is ArrayRef:
+                    self.expr(var_info.index)
+            for var_info in stmt.vars:
+                var_info._slot = self.declare(var_info.name, type(var_info) is ArrayRef)
+                declared.append(var_info._slot)
+
+        elif stmt_type is Assign:
+            self.expr(stmt.expr)
+            self.expr(stmt.var)
+
+        elif stmt_type is Increment:
+            self.expr(stmt.var)
+
+        elif stmt_type is Condition:
+            stmt._slot = self.lookup(stmt.var)
+            self.expr(stmt.expr)
+
+        elif stmt_type is Call:
+            for arg in stmt.args:
+                self.expr(arg)
+
+        elif stmt_type is ReturnStmt:
+            if stmt.value is not None:
+                self.expr(stmt.value)
+
+        elif stmt_type is For:
+            for header in (stmt.assign, stmt.condition, stmt.increment):
+                self.statement(header, declared)
+            stmt._declared = self.block(stmt.stmts)
+
+        elif stmt_type is If:
+            self.statement(stmt.condition, declared)
+            stmt._declared = self.block(stmt.stmts)
+
+
+def resolve(function):
+    '''
+    Give the nodes of a function node their slots, the first time, and
+    return its FrameLayout. Parameter i is slot i.
+    '''
+    try:
+        return function._frame
+    except AttributeError:
+        pass
+
+    params = function.params
+    error = None
+    if len(params) != 0 and params != ["void"] and params != [None]:
+        if "void" in params:
+            error = f"Function {function.name}'void' must be the first and only parameter if specified"
+    else:
+        params = []
+
+    resolver = Resolver()
+    resolver.scopes.append({})
+    param_types = []
+    for param in params:
+        if isinstance(param, Param):
+            resolver.declare(param.name, param.type.endswith("*"))
+            param_types.append(param.type)
+    function._declared = resolver.block(function.stmts)
+    # set last: a function with a layout is resolved all through
+    function._frame = FrameLayout(resolver.names, frozenset(resolver.arrays), frozenset(resolver.undeclared.values()),
+                                  len(params), tuple(param_types), error)
+    return function._frame
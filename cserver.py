@@ -0,0 +1,231 @@
+'''
+Debug server: the REPL of the tree engine for many clients at once.
+
+Every connection is a session with its own Interpreter. A client sends
+`open FILE` for a source in the server's directory (inputs/ by default),
+then the REPL commands one per line: next, prev, print, trace, history,
+break, continue and run. `quit` ends the session. save and load are not
+served: their files are pickles, and a server that wrote and read them
+where a client says would let any local user write files anywhere and run
+code in it. Each line is answered with
+
+    OK <bytes>\\n<what the REPL would have printed>
+    END <bytes>\\n<the same>
+    ERR <message>\\n
+
+END is the last answer of a session: the program has ended, with "End of
+Program", or stopped on an error, with "Compile Error: " and the message
+like the command line prints it, or with the name and message of any other
+exception the run raised. The server closes the connection after it. ERR
+is for a line that is no command, or a file that cannot be opened or
+parsed or does not pass clinker's checks; the session goes on.
+
+Sessions opening the same source share its parse tree. Commands that may
+run for long run in a thread pool, so the event loop keeps answering the
+other sessions while they do: open, which parses a source nobody opened
+yet, `next` over more than INLINE_LINES lines, continue and run, in slices
+of CHUNK_LINES so that long runs of several sessions take turns, `prev`
+over more than INLINE_LINES lines and trace when the history is replayed. The threads share one interpreter lock: a
+heavy session gets its turn, it does not get its own core, and every
+further thread only makes the event loop wait longer for the lock: one
+worker is the default.
+
+    python cserver.py [--port N | --unix PATH] [--dir DIR] [--workers N]
+'''
+import argparse
+import asyncio
+import concurrent.futures
+import io
+import os
+
+from ccache import get_cached_parser_tree
+from cinterpreter import Interpreter, parse_command
+from coptimization import CException
+
+INPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inputs")
+
+DEFAULT_PORT = 4200
+
+# next/prev over at most this many lines run on the event loop
+INLINE_LINES = 200
+# a longer next runs in the pool this many lines at a time
+CHUNK_LINES = 2000
+# connections waiting to be accepted; asyncio's 100 drops clients that
+# connect all at once
+BACKLOG = 1024
+
+
+class Session:
+    '''
+    One client: its interpreter and the buffer the interpreter writes to.
+    '''
+    def __init__(self, server):
+        self.server = server
+        self.out = io.StringIO()
+        self.interpreter = None
+        self.done = False
+
+    def open(self, filename):
+        if os.path.dirname(os.path.normpath(filename)) not in ("", "."):
+            raise ValueError(f"{filename} is not a file of the server directory")
+        f = open(os.path.join(self.server.directory, filename), "r")
+        lines = f.readlines()
+        f.close()
+        # lines[1] indicates Line 1
+        lines.insert(0, "")
+
+        # a session never optimizes, nothing needs what analysis collects
+        interpreter = Interpreter(self.out, analysis=False)
+        interpreter.plain_code, interpreter.plain_code_one_line = lines, "".join(lines)
+        interpreter.start(self.server.parse(interpreter.plain_code_one_line))
+        self.interpreter = interpreter
+        return f"Opened {filename}\n"
+
+    def execute(self, cmd):
+        '''
+        Run one parsed command. What it prints is kept until output().
+        '''
+        try:
+            self.interpreter.execute_command(cmd)
+            if self.interpreter.is_finished():
+                self.done = True
+                print("End of Program", file=self.out)
+        except CException as e:
+            self.done = True
+            print("Compile Error: ", e, file=self.out)
+        except Exception as e:
+            # a session that cannot go on ends instead of leaving its
+            # client waiting for an answer
+            self.done = True
+            print(f"{type(e).__name__}: {e}", file=self.out)
+
+    def output(self):
+        text = self.out.getvalue()
+        self.out.seek(0)
+        self.out.truncate()
+        return text
+
+
+def is_heavy(session, cmd):
+    if cmd[0] in ("continue", "run"):
+        return True
+    if cmd[0] in ("next", "prev"):
+        return int(cmd[1]) > INLINE_LINES
+    if cmd[0] == "trace":
+        return session.interpreter.retention.mode == "replay"
+    return False
+
+
+class Server:
+    def __init__(self, directory=INPUT_DIR, workers=1):
+        self.directory = directory
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers)
+        # source -> parse tree, shared by the sessions running it
+        self.trees = {}
+
+    def parse(self, code):
+        tree = self.trees.get(code)
+        if tree is None:
+            tree = self.trees[code] = get_cached_parser_tree(code)
+        return tree
+
+    async def answer(self, session, line):
+        '''
+        What the session prints for a line. Raises ValueError for a line that
+        is no command.
+        '''
+        if session.interpreter is None:
+            words = line.split()
+            if len(words) != 2 or words[0] != "open":
+                raise ValueError("Open a program first: open FILE")
+            loop = asyncio.get_running_loop()
+            try:
+                # a cold parse of a large source takes long, the other
+                # sessions get their answers meanwhile
+                return await loop.run_in_executor(self.pool, session.open, words[1])
+            except (ValueError, OSError):
+                raise
+            except (CException, RecursionError) as e:
+                raise ValueError(str(e))
+            except Exception as e:
+                # whatever the parser or the linker trips over in a source
+                raise ValueError(f"{type(e).__name__}: {e}")
+
+        try:
+            cmd = parse_command(line)
+        except CException as e:
+            raise ValueError(str(e))
+        if cmd is None:
+            raise ValueError(f"Unknown command: {line}")
+        if cmd[0] in ("save", "load"):
+            raise ValueError(f"{cmd[0]} is not available in the server")
+
+        loop = asyncio.get_running_loop()
+        if cmd[0] == "next" and is_heavy(session, cmd):
+            count = int(cmd[1])
+            while count > 0 and not session.done:
+                chunk = min(count, CHUNK_LINES)
+                await loop.run_in_executor(self.pool, session.execute, ("next", str(chunk)))
+                count -= chunk
+        elif cmd[0] in ("continue", "run"):
+            cmd = [cmd[0], str(CHUNK_LINES)]
+            while not session.done:
+                await loop.run_in_executor(self.pool, session.execute, cmd)
+                if session.interpreter.at_breakpoint():
+                    break
+                cmd = ["continue", str(CHUNK_LINES)]
+        elif is_heavy(session, cmd):
+            await loop.run_in_executor(self.pool, session.execute, cmd)
+        else:
+            session.execute(cmd)
+        return session.output()
+
+    async def handle(self, reader, writer):
+        session = Session(self)
+        try:
+            while not session.done:
+                data = await reader.readline()
+                line = data.decode().strip()
+                if not data or line == "quit":
+                    break
+                if not line:
+                    continue
+                try:
+                    reply = (await self.answer(session, line)).encode()
+                    writer.write(f"{'END' if session.done else 'OK'} {len(reply)}\n".encode() + reply)
+                except (ValueError, OSError) as e:
+                    writer.write(f"ERR {' '.join(str(e).split())}\n".encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, port=DEFAULT_PORT, unix=None):
+        if unix is not None:
+            server = await asyncio.start_unix_server(self.handle, unix, backlog=BACKLOG)
+            address = unix
+        else:
+            server = await asyncio.start_server(self.handle, "127.0.0.1", port, backlog=BACKLOG)
+            address = f"127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        print(f"Listening on {address}", flush=True)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve REPL sessions of the tree engine over a local socket.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="localhost TCP port, 0 for any free one")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--dir", default=INPUT_DIR, help="directory `open` reads sources from, inputs/ by default")
+    parser.add_argument("--workers", type=int, default=1, help="threads running long commands")
+    options = parser.parse_args()
+
+    try:
+        asyncio.run(Server(options.dir, options.workers).serve(options.port, options.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,122 @@
+'''
+Interpreter state saved to a file and read back, for `save` and `load`.
+
+A snapshot is a pickle of the state compressed with zlib, after a short
+header. Parse tree nodes are not written: every node the state points to
+is stored as its number in a walk of the tree, and the tree of the same
+program is walked again on load. Neither are the interpreter itself, its
+clock and the like: they are stored by name, and whatever loads the
+snapshot gives its own. The header carries a hash of the source
+and of the grammar files, so a snapshot is only loaded into the program it
+was taken of.
+'''
+import gc
+import hashlib
+import io
+import pickle
+import zlib
+
+from ccache import GRAMMAR_VERSION
+from cnodes import Node
+from coptimization import CException
+
+MAGIC = b"CINTERPRETER-SNAPSHOT 2\n"
+
+
+def program_key(code):
+    digest = hashlib.sha256(GRAMMAR_VERSION.encode())
+    digest.update(code.encode())
+    return digest.digest()
+
+
+def walk_nodes(functions):
+    '''
+    Every node of the given function nodes, in a fixed order.
+    '''
+    nodes = []
+    seen = set()
+    stack = list(reversed(functions))
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (list, tuple)):
+            stack.extend(reversed(item))
+        elif isinstance(item, Node) and id(item) not in seen:
+            seen.add(id(item))
+            nodes.append(item)
+            stack.extend(reversed([value for _, value in item.fields()]))
+    return nodes
+
+
+class StatePickler(pickle.Pickler):
+    def __init__(self, file, functions, shared):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.numbers = {id(node): number for number, node in enumerate(walk_nodes(functions))}
+        self.names = {id(obj): name for name, obj in shared.items()}
+
+    def persistent_id(self, obj):
+        name = self.names.get(id(obj))
+        if name is not None:
+            return name
+        if isinstance(obj, Node):
+            number = self.numbers.get(id(obj))
+            if number is None:
+                raise CException(f"Cannot save a node outside of the program: {obj}")
+            return number
+        return None
+
+
+class StateUnpickler(pickle.Unpickler):
+    def __init__(self, file, functions, shared):
+        super().__init__(file)
+        self.nodes = walk_nodes(functions)
+        self.shared = shared
+
+    def persistent_load(self, pid):
+        if isinstance(pid, str):
+            return self.shared[pid]
+        return self.nodes[pid]
+
+
+def save(filename, state, code, functions, shared):
+    '''
+    Write state, which may point into the parse tree of code whose function
+    nodes are given and to the objects in shared by name, to filename.
+    '''
+    buffer = io.BytesIO()
+    StatePickler(buffer, functions, shared).dump(state)
+    data = zlib.compress(buffer.getvalue())
+
+    f = open(filename, "wb")
+    f.write(MAGIC)
+    f.write(program_key(code))
+    f.write(data)
+    f.close()
+    return len(MAGIC) + 32 + len(data)
+
+
+def load(filename, code, functions, shared):
+    '''
+    Read back a state saved by save() for the same program, with the
+    objects in shared standing for the ones saved under their names.
+    '''
+    f = open(filename, "rb")
+    data = f.read()
+    f.close()
+
+    if not data.startswith(MAGIC):
+        raise CException(f"{filename} is not an interpreter snapshot")
+    key = data[len(MAGIC):len(MAGIC) + 32]
+    if key != program_key(code):
+        raise CException(f"{filename} is a snapshot of another program")
+
+    # Like a cached parse tree, the state is many small objects and none of
+    # them are garbage
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return StateUnpickler(io.BytesIO(zlib.decompress(data[len(MAGIC) + 32:])), functions, shared).load()
+    except (zlib.error, pickle.UnpicklingError, EOFError, KeyError, IndexError) as e:
+        raise CException(f"{filename} is damaged: {e}")
+    finally:
+        if gc_enabled:
+            gc.enable()
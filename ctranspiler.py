@@ -0,0 +1,325 @@
+'''
+Translate a parsed program into Python source.
+
+Every C function becomes a Python function and every declared variable a
+Python local, renamed so inner declarations shadow outer ones the way the
+interpreter's scopes do. Assignments coerce with int()/float() by the
+declared type like VAR.assign, parameters and increments keep the raw value,
+and printf is `%` formatting. The module is compile()d once; running it
+only gives the program output, there is no stepping.
+
+C calls are Python calls, so a run lifts the recursion limit to MAX_DEPTH
+calls, far past the depth the tree engine reaches before its memory gets
+scarce, and a program going deeper stops with a CException. Given a
+cmemo.CallCache, a run answers calls of pure functions from it, like the
+tree engine does.
+'''
+import ast
+import sys
+
+from clinker import link
+from cmemo import MISSING
+from cnodes import *
+from coptimization import CException, not_assigned
+
+INDENT = "    "
+
+# nested C calls a run allows
+MAX_DEPTH = 1000000
+
+
+def divide(value1, value2):
+    if value2 == 0:
+        raise CException("Division by zero")
+    return value1 / value2
+
+
+def unassigned(name, lineno, index=None):
+    '''
+    Raise the error for reading name, or element index of it, while it holds
+    None.
+    '''
+    if index is not None:
+        name = f"{name}[{index}]"
+    raise not_assigned(name, lineno)
+
+
+def fail(message):
+    '''
+    Stand-in for an expression the interpreter would reject when it gets
+    there.
+    '''
+    raise CException(message)
+
+
+class Transpiler:
+    def __init__(self, tree):
+        self.functions = {}
+        for func in tree:
+            self.functions[func.name] = func
+        self.lines = []
+
+    def transpile(self):
+        for func in self.functions.values():
+            self.transpile_function(func)
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, line, lineno=None):
+        if lineno is None:
+            self.lines.append(INDENT * self.depth + line)
+        else:
+            self.lines.append(f"{INDENT * self.depth}{line}  # line {lineno}")
+
+    def transpile_function(self, func):
+        self.depth = 0
+        self.scopes = [{}]
+        self.used_names = set()
+        self.temps = 0
+        self.arrays = func._frame.arrays
+
+        params = []
+        if len(func.params) != 0 and func.params != ["void"] and func.params != [None]:
+            for param in func.params:
+                if isinstance(param, Param):
+                    params.append(self.declare(param.name, param.type))
+        self.emit(f"def f_{func.name}({', '.join(params)}):", func.lineno)
+        self.depth += 1
+        self.transpile_stmts(func.stmts)
+        self.emit("return None", func.end_lineno)
+        self.lines.append("")
+
+    def declare(self, name, var_type):
+        py_name = f"v_{name}"
+        count = 0
+        while py_name in self.used_names:
+            count += 1
+            py_name = f"v_{name}_{count}"
+        self.used_names.add(py_name)
+        self.scopes[-1][name] = (py_name, var_type)
+        return py_name
+
+    def resolve(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None, None
+
+    def temp(self):
+        self.temps += 1
+        return f"t_{self.temps}"
+
+    def transpile_block(self, stmts):
+        self.scopes.append({})
+        start = len(self.lines)
+        self.transpile_stmts(stmts)
+        if len(self.lines) == start:
+            self.emit("pass")
+        self.scopes.pop()
+
+    def transpile_stmts(self, stmts):
+        for stmt in stmts:
+            self.transpile_stmt(stmt)
+
+    def coerce(self, var_type, code):
+        if "float" in var_type:
+            return f"float({code})"
+        return f"int({code})"
+
+    def transpile_stmt(self, stmt):
+        stmt_type = type(stmt)
+        lineno = stmt.lineno
+
+        if stmt_type is LBrace or stmt_type is RBrace:
+            return
+
+        elif stmt_type is Declare:
+            for var_info in stmt.vars:
+                if isinstance(var_info, ArrayRef):
+                    size = self.expr(var_info.index, lineno)
+                    py_name = self.declare(var_info.name, stmt.type)
+                    self.emit(f"{py_name} = [None] * {size}", lineno)
+                else:
+                    py_name = self.declare(var_info.name, stmt.type)
+                    self.emit(f"{py_name} = None", lineno)
+
+        elif stmt_type is Assign:
+            var_info = stmt.var
+            if isinstance(var_info, ArrayRef):
+                # the index is evaluated before the right hand side
+                index = self.temp()
+                self.emit(f"{index} = {self.expr(var_info.index, lineno)}", lineno)
+            py_name, var_type = self.resolve(var_info.name)
+            value = self.coerce(var_type, self.expr(stmt.expr, lineno))
+            if isinstance(var_info, ArrayRef):
+                self.emit(f"{py_name}[{index}] = {value}", lineno)
+            else:
+                self.emit(f"{py_name} = {value}", lineno)
+
+        elif stmt_type is Increment:
+            var_info = stmt.var
+            if isinstance(var_info, ArrayRef):
+                index = self.temp()
+                self.emit(f"{index} = {self.expr(var_info.index, lineno)}", lineno)
+            py_name, _ = self.resolve(var_info.name)
+            if isinstance(var_info, ArrayRef):
+                self.emit(f"if {py_name}[{index}] is None:", lineno)
+                self.emit(f"{INDENT}unassigned({var_info.name!r}, {lineno}, {index})")
+                self.emit(f"{py_name}[{index}] = {py_name}[{index}] + 1", lineno)
+            else:
+                self.emit(f"if {py_name} is None:", lineno)
+                self.emit(f"{INDENT}unassigned({var_info.name!r}, {lineno})")
+                self.emit(f"{py_name} = {py_name} + 1", lineno)
+
+        elif stmt_type is Call:
+            if stmt.callee == "printf":
+                printf_format = ast.literal_eval(stmt.args[0].text)
+                args = [self.expr(arg, lineno) for arg in stmt.args[1:]]
+                self.emit(f"print({printf_format!r} % ({''.join(arg + ', ' for arg in args)}))", lineno)
+            else:
+                self.emit(self.call(stmt), lineno)
+
+        elif stmt_type is ReturnStmt:
+            if stmt.value is None:
+                self.emit("return None", lineno)
+            else:
+                self.emit(f"return {self.expr(stmt.value, lineno)}", lineno)
+
+        elif stmt_type is For:
+            self.scopes.append({})
+            self.transpile_stmt(stmt.assign)
+            self.emit("while True:", lineno)
+            self.depth += 1
+            test = self.condition(stmt.condition)
+            self.emit(f"if not {test}:", lineno)
+            self.emit(f"{INDENT}break")
+            self.transpile_block(stmt.stmts)
+            self.transpile_stmt(stmt.increment)
+            self.depth -= 1
+            self.scopes.pop()
+
+        elif stmt_type is If:
+            test = self.condition(stmt.condition)
+            self.emit(f"if {test}:", lineno)
+            self.depth += 1
+            self.transpile_block(stmt.stmts)
+            self.depth -= 1
+
+        else:
+            raise CException(f"Invalid statement {stmt}", lineno)
+
+    def condition(self, condition):
+        '''
+        Emit what a for/if condition evaluates before comparing and return
+        the comparison.
+        '''
+        lineno = condition.lineno
+        right = self.temp()
+        self.emit(f"{right} = {self.expr(condition.expr, lineno)}", lineno)
+        py_name, _ = self.resolve(condition.var)
+        self.emit(f"if {py_name} is None:", lineno)
+        self.emit(f"{INDENT}unassigned({condition.var!r}, {lineno})")
+        return f"{py_name} {condition.cmp} {right}"
+
+    def call(self, call):
+        args = [self.expr(arg, call.lineno) for arg in call.args]
+        return f"f_{call.callee}({', '.join(args)})"
+
+    def expr(self, expr, lineno):
+        '''
+        The Python expression for expr. Reads of a None raise, with lineno,
+        where they happen.
+        '''
+        expr_type = type(expr)
+
+        if expr_type is Number:
+            return repr(expr.value)
+
+        elif expr_type is Id:
+            py_name, _ = self.resolve(expr.name)
+            if expr._slot in self.arrays:
+                return py_name
+            return f"({py_name} if {py_name} is not None else unassigned({expr.name!r}, {lineno}))"
+
+        elif expr_type is ArrayRef:
+            index = self.expr(expr.index, lineno)
+            py_name, _ = self.resolve(expr.name)
+            value = self.temp()
+            position = self.temp()
+            return (f"({value} if ({value} := {py_name}[({position} := int({index}))]) is not None"
+                    f" else unassigned({expr.name!r}, {lineno}, {position}))")
+
+        elif expr_type is BinOp:
+            lhs = self.expr(expr.lhs, lineno)
+            rhs = self.expr(expr.rhs, lineno)
+            if expr.op == '/':
+                return f"divide({lhs}, {rhs})"
+            return f"({lhs} {expr.op} {rhs})"
+
+        elif expr_type is Cast:
+            return f"{expr.type}({self.expr(expr.expr, lineno)})"
+
+        elif expr_type is Call:
+            return self.call(expr)
+
+        return f"fail({f'Invalid expression {expr}'!r})"
+
+
+def transpile(tree):
+    return Transpiler(tree).transpile()
+
+
+def compile_program(tree):
+    '''
+    Translate and compile a program once. Returns the namespace holding the
+    f_<name> functions.
+    '''
+    source = transpile(tree)
+    code = compile(source, "<c program>", "exec")
+    namespace = {"CException": CException, "divide": divide, "fail": fail, "unassigned": unassigned}
+    exec(code, namespace)
+    return namespace
+
+
+def cached(function, func, memo):
+    '''
+    The compiled function of FuncDef func, looking its results up in memo.
+    '''
+    key_of, get, put = memo.key, memo.get, memo.put
+
+    def call(*args):
+        key = key_of(func, args)
+        value = get(key)
+        if value is MISSING:
+            value = function(*args)
+            put(key, value)
+        return value
+    return call
+
+
+def run_program(tree, memo=None):
+    functions = link(tree)
+    namespace = compile_program(tree)
+    frames_per_call = 1
+    if memo is not None:
+        memo.analyze(functions)
+        for func in memo.pure:
+            namespace[f"f_{func.name}"] = cached(namespace[f"f_{func.name}"], func, memo)
+        frames_per_call = 2
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, frames_per_call * MAX_DEPTH + 100))
+    try:
+        namespace["f_main"]()
+    except RecursionError:
+        raise CException(f"Recursion deeper than {MAX_DEPTH} calls")
+    finally:
+        sys.setrecursionlimit(limit)
+
+
+if __name__ == "__main__":
+    from cyacc import get_parser_tree
+
+    f = open(sys.argv[1], "r")
+    tree = get_parser_tree("".join(f.readlines()))
+    f.close()
+    link(tree)
+    print(transpile(tree), end="")
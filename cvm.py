@@ -0,0 +1,481 @@
+'''
+Bytecode engine.
+
+Every function of a parsed program is compiled once into a flat instruction
+array: opcodes in an array('B'), one operand per instruction in a parallel
+list and the source line of each instruction in an array('i') (the line
+table). Variables are resolved at compile time to slots of a per-call frame,
+control flow becomes jumps, and VM.execute runs the whole program in one
+dispatch loop. The line table is what `next [lines]` stepping counts.
+'''
+import ast
+from array import array
+
+from clinker import link
+from cnodes import *
+from coptimization import CException, not_assigned
+
+# opcodes, roughly in order of how often they run
+LOAD = 0            # push slots[arg]
+CONST = 1           # push arg
+ADD = 2
+SUB = 3
+MUL = 4
+DIV = 5
+STORE_INT = 6       # slots[arg] = int(pop)
+STORE_FLOAT = 7     # slots[arg] = float(pop)
+JUMP_UNLESS_LT = 8  # arg = (slot, target): right = pop, jump unless slots[slot] < right
+JUMP_UNLESS_GT = 9
+JUMP = 10
+INC = 11            # slots[arg] += 1
+LOAD_ELEM = 12      # index = pop, push slots[arg][int(index)]
+STORE_ELEM_INT = 13  # value = pop, index = pop, slots[arg][index] = int(value)
+STORE_ELEM_FLOAT = 14
+INC_ELEM = 15
+CALL = 16           # arg = (function index, argc)
+RETURN = 17
+POP = 18
+CAST_INT = 19
+CAST_FLOAT = 20
+PRINTF = 21         # arg = (format, argc)
+DECLARE = 22        # slots[arg] = None
+DECLARE_ARRAY = 23  # size = pop, slots[arg] = [None] * size
+RAISE = 24          # arg = (message, lineno)
+
+BINARY_OPCODES = {'+': ADD, '-': SUB, '*': MUL, '/': DIV}
+
+
+class FunctionCode:
+    def __init__(self, func, index):
+        self.name = func.name
+        self.index = index
+        self.type = func.type
+        self.lineno = func.lineno
+        self.ops = array('B')
+        self.args = []
+        self.lines = array('i')
+        # slot -> (name, type, first pc where visible, pc where its block ends)
+        self.slots = []
+
+    def emit(self, op, arg, lineno):
+        self.ops.append(op)
+        self.args.append(arg)
+        self.lines.append(lineno)
+        return len(self.ops) - 1
+
+    def patch(self, pc, arg):
+        self.args[pc] = arg
+
+    def here(self):
+        return len(self.ops)
+
+    def visible_slot(self, name, pc):
+        found = None
+        for slot, (slot_name, _, start, end) in enumerate(self.slots):
+            if slot_name == name and start <= pc < end:
+                found = slot
+        return found
+
+
+class Compiler:
+    '''
+    Compile the FuncDef nodes of a program linked by clinker into
+    FunctionCode objects. Every name is known and every call has the right
+    arguments there, which is why none of that is checked again.
+    '''
+    def __init__(self, tree):
+        self.functions = {}
+        self.codes = []
+        for func in tree:
+            self.functions[func.name] = func
+
+        for index, name in enumerate(self.functions):
+            self.codes.append(FunctionCode(self.functions[name], index))
+        self.index = {code.name: code.index for code in self.codes}
+
+        for code in self.codes:
+            self.compile_function(self.functions[code.name], code)
+
+    def compile_function(self, func, code):
+        self.code = code
+        self.scopes = [{}]
+        self.block_slots = [[]]
+
+        params = func.params
+        if len(params) != 0 and params != ["void"] and params != [None]:
+            for param in params:
+                if isinstance(param, Param):
+                    self.declare(param.name, param.type)
+        self.compile_stmts(func.stmts)
+        self.close_block()
+        code.emit(CONST, None, func.end_lineno)
+        code.emit(RETURN, None, func.end_lineno)
+
+    def declare(self, name, var_type):
+        slot = len(self.code.slots)
+        self.code.slots.append([name, var_type, self.code.here(), None])
+        self.scopes[-1][name] = slot
+        self.block_slots[-1].append(slot)
+        return slot
+
+    def open_block(self):
+        self.scopes.append({})
+        self.block_slots.append([])
+
+    def close_block(self):
+        self.scopes.pop()
+        for slot in self.block_slots.pop():
+            self.code.slots[slot][3] = self.code.here()
+
+    def resolve(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope[name]
+        return None
+
+    def compile_stmts(self, stmts):
+        for stmt in stmts:
+            self.compile_stmt(stmt)
+
+    def compile_stmt(self, stmt):
+        code = self.code
+        stmt_type = type(stmt)
+        lineno = stmt.lineno
+
+        if stmt_type is LBrace or stmt_type is RBrace:
+            return
+
+        elif stmt_type is Declare:
+            for var_info in stmt.vars:
+                if isinstance(var_info, ArrayRef):
+                    self.compile_expr(var_info.index, lineno)
+                    slot = self.declare(var_info.name, stmt.type)
+                    code.emit(DECLARE_ARRAY, slot, lineno)
+                else:
+                    slot = self.declare(var_info.name, stmt.type)
+                    code.emit(DECLARE, slot, lineno)
+
+        elif stmt_type is Assign:
+            var_info = stmt.var
+            if isinstance(var_info, ArrayRef):
+                self.compile_expr(var_info.index, lineno)
+            slot = self.resolve(var_info.name)
+            self.compile_expr(stmt.expr, lineno)
+            is_float = "float" in code.slots[slot][1]
+            if isinstance(var_info, ArrayRef):
+                code.emit(STORE_ELEM_FLOAT if is_float else STORE_ELEM_INT, slot, lineno)
+            else:
+                code.emit(STORE_FLOAT if is_float else STORE_INT, slot, lineno)
+
+        elif stmt_type is Increment:
+            var_info = stmt.var
+            if isinstance(var_info, ArrayRef):
+                self.compile_expr(var_info.index, lineno)
+            slot = self.resolve(var_info.name)
+            code.emit(INC_ELEM if isinstance(var_info, ArrayRef) else INC, slot, lineno)
+
+        elif stmt_type is Call:
+            if stmt.callee == "printf":
+                printf_format = ast.literal_eval(stmt.args[0].text)
+                for arg in stmt.args[1:]:
+                    self.compile_expr(arg, lineno)
+                code.emit(PRINTF, (printf_format, len(stmt.args) - 1), lineno)
+            else:
+                self.compile_call(stmt, lineno)
+                code.emit(POP, None, lineno)
+
+        elif stmt_type is ReturnStmt:
+            if stmt.value is None:
+                code.emit(CONST, None, lineno)
+            else:
+                self.compile_expr(stmt.value, lineno)
+            code.emit(RETURN, None, lineno)
+
+        elif stmt_type is For:
+            self.open_block()
+            self.compile_stmt(stmt.assign)
+            start = code.here()
+            exit_jump = self.compile_condition(stmt.condition)
+            self.open_block()
+            self.compile_stmts(stmt.stmts)
+            self.close_block()
+            self.compile_stmt(stmt.increment)
+            code.emit(JUMP, start, lineno)
+            self.patch_condition(exit_jump)
+            self.close_block()
+
+        elif stmt_type is If:
+            exit_jump = self.compile_condition(stmt.condition)
+            self.open_block()
+            self.compile_stmts(stmt.stmts)
+            self.close_block()
+            self.patch_condition(exit_jump)
+
+        else:
+            raise CException(f"Invalid statement {stmt}", lineno)
+
+    def compile_condition(self, condition):
+        code = self.code
+        lineno = condition.lineno
+        self.compile_expr(condition.expr, lineno)
+        slot = self.resolve(condition.var)
+        if condition.cmp == '<':
+            return code.emit(JUMP_UNLESS_LT, (slot, None), lineno)
+        return code.emit(JUMP_UNLESS_GT, (slot, None), lineno)
+
+    def patch_condition(self, pc):
+        slot, _ = self.code.args[pc]
+        self.code.patch(pc, (slot, self.code.here()))
+
+    def compile_call(self, call, lineno):
+        for arg in call.args:
+            self.compile_expr(arg, lineno)
+        self.code.emit(CALL, (self.index[call.callee], len(call.args)), lineno)
+
+    def compile_expr(self, expr, lineno):
+        code = self.code
+        expr_type = type(expr)
+
+        if expr_type is Number:
+            code.emit(CONST, expr.value, lineno)
+
+        elif expr_type is Id:
+            code.emit(LOAD, self.resolve(expr.name), lineno)
+
+        elif expr_type is ArrayRef:
+            self.compile_expr(expr.index, lineno)
+            code.emit(LOAD_ELEM, self.resolve(expr.name), lineno)
+
+        elif expr_type is BinOp:
+            self.compile_expr(expr.lhs, lineno)
+            self.compile_expr(expr.rhs, lineno)
+            code.emit(BINARY_OPCODES[expr.op], None, lineno)
+
+        elif expr_type is Cast:
+            self.compile_expr(expr.expr, lineno)
+            code.emit(CAST_INT if expr.type == "int" else CAST_FLOAT, None, lineno)
+
+        elif expr_type is Call:
+            self.compile_call(expr, expr.lineno)
+
+        else:
+            code.emit(RAISE, (f"Invalid expression {expr}", None), lineno)
+
+
+class Frame:
+    __slots__ = ("code", "pc", "slots", "stack")
+
+    def __init__(self, code, slots):
+        self.code = code
+        self.pc = 0
+        self.slots = slots
+        self.stack = []
+
+
+class VarView:
+    '''
+    What `print` needs to know about a variable living in a VM slot.
+    '''
+    def __init__(self, var_type, value):
+        self.type = var_type
+        self.value = value
+        self.is_array = isinstance(value, list)
+
+
+class VM:
+    def __init__(self, tree, out=None):
+        link(tree)
+        compiler = Compiler(tree)
+        self.codes = compiler.codes
+        self.index = compiler.index
+        self.out = out
+        self.frames = []
+
+        main = self.codes[self.index["main"]]
+        self.frames.append(Frame(main, [None] * len(main.slots)))
+        self.line = main.lineno
+
+    def is_done(self):
+        return len(self.frames) == 0
+
+    def get_var(self, name):
+        if self.is_done():
+            return None
+        frame = self.frames[-1]
+        slot = frame.code.visible_slot(name, frame.pc)
+        if slot is None:
+            return None
+        return VarView(frame.code.slots[slot][1], frame.slots[slot])
+
+    def run(self):
+        self.execute(None)
+
+    def step(self, lines=1):
+        self.execute(lines)
+
+    def execute(self, lines):
+        '''
+        Run until the program ends or, when lines is given, until that many
+        source lines were executed according to the line table.
+        '''
+        if self.is_done():
+            return
+        stepping = lines is not None
+        codes = self.codes
+        frames = self.frames
+        out = self.out
+        frame = frames[-1]
+        code = frame.code
+        ops = code.ops
+        args = code.args
+        line_table = code.lines
+        pc = frame.pc
+        slots = frame.slots
+        stack = frame.stack
+        push = stack.append
+        pop = stack.pop
+        line = self.line
+
+        while True:
+            if stepping:
+                if line_table[pc] != line:
+                    line = line_table[pc]
+                    if lines == 0:
+                        break
+                    lines -= 1
+
+            op = ops[pc]
+            arg = args[pc]
+            pc += 1
+
+            if op == LOAD:
+                value = slots[arg]
+                if value is None:
+                    frame.pc = pc - 1
+                    raise not_assigned(code.slots[arg][0], line_table[pc - 1])
+                push(value)
+            elif op == CONST:
+                push(arg)
+            elif op == ADD:
+                value2 = pop()
+                stack[-1] = stack[-1] + value2
+            elif op == SUB:
+                value2 = pop()
+                stack[-1] = stack[-1] - value2
+            elif op == MUL:
+                value2 = pop()
+                stack[-1] = stack[-1] * value2
+            elif op == DIV:
+                value2 = pop()
+                if value2 == 0:
+                    raise CException("Division by zero")
+                stack[-1] = stack[-1] / value2
+            elif op == STORE_INT:
+                slots[arg] = int(pop())
+            elif op == STORE_FLOAT:
+                slots[arg] = float(pop())
+            elif op == JUMP_UNLESS_LT:
+                slot, target = arg
+                left_value = slots[slot]
+                if left_value is None:
+                    frame.pc = pc - 1
+                    raise not_assigned(code.slots[slot][0], line_table[pc - 1])
+                if not left_value < pop():
+                    pc = target
+            elif op == JUMP_UNLESS_GT:
+                slot, target = arg
+                left_value = slots[slot]
+                if left_value is None:
+                    frame.pc = pc - 1
+                    raise not_assigned(code.slots[slot][0], line_table[pc - 1])
+                if not left_value > pop():
+                    pc = target
+            elif op == JUMP:
+                pc = arg
+            elif op == INC:
+                value = slots[arg]
+                if value is None:
+                    frame.pc = pc - 1
+                    raise not_assigned(code.slots[arg][0], line_table[pc - 1])
+                slots[arg] = value + 1
+            elif op == LOAD_ELEM:
+                index = int(stack[-1])
+                value = slots[arg][index]
+                if value is None:
+                    frame.pc = pc - 1
+                    raise not_assigned(f"{code.slots[arg][0]}[{index}]", line_table[pc - 1])
+                stack[-1] = value
+            elif op == STORE_ELEM_INT:
+                value = pop()
+                slots[arg][pop()] = int(value)
+            elif op == STORE_ELEM_FLOAT:
+                value = pop()
+                slots[arg][pop()] = float(value)
+            elif op == INC_ELEM:
+                index = pop()
+                value = slots[arg][index]
+                if value is None:
+                    frame.pc = pc - 1
+                    raise not_assigned(f"{code.slots[arg][0]}[{index}]", line_table[pc - 1])
+                slots[arg][index] = value + 1
+            elif op == CALL:
+                function_index, argc = arg
+                callee = codes[function_index]
+                new_slots = [None] * len(callee.slots)
+                if argc:
+                    new_slots[:argc] = stack[-argc:]
+                    del stack[-argc:]
+                frame.pc = pc
+                frame = Frame(callee, new_slots)
+                frames.append(frame)
+                code = callee
+                ops = code.ops
+                args = code.args
+                line_table = code.lines
+                pc = 0
+                slots = new_slots
+                stack = frame.stack
+                push = stack.append
+                pop = stack.pop
+            elif op == RETURN:
+                value = pop()
+                frames.pop()
+                if not frames:
+                    break
+                frame = frames[-1]
+                code = frame.code
+                ops = code.ops
+                args = code.args
+                line_table = code.lines
+                pc = frame.pc
+                slots = frame.slots
+                stack = frame.stack
+                push = stack.append
+                pop = stack.pop
+                push(value)
+            elif op == POP:
+                pop()
+            elif op == CAST_INT:
+                stack[-1] = int(stack[-1])
+            elif op == CAST_FLOAT:
+                stack[-1] = float(stack[-1])
+            elif op == PRINTF:
+                printf_format, argc = arg
+                if argc:
+                    values = tuple(stack[-argc:])
+                    del stack[-argc:]
+                else:
+                    values = ()
+                print(printf_format % values, file=out)
+            elif op == DECLARE:
+                slots[arg] = None
+            elif op == DECLARE_ARRAY:
+                slots[arg] = [None] * pop()
+            elif op == RAISE:
+                frame.pc = pc - 1
+                message, lineno = arg
+                raise CException(message, lineno)
+
+        if frames:
+            frame.pc = pc
+        self.line = line
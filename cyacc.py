@@ -1,5 +1,8 @@
+import os
+import threading
 import ply.yacc as yacc
-from clexer import CLexer
+from clexer import CLexer, tokens
+from cnodes import *
 
 DEBUG = False
 
@@ -26,14 +29,7 @@ def p_func(p):
             | FLOAT ID LPAREN paramlist RPAREN lbrace stmtlist rbrace
             | VOID ID LPAREN paramlist RPAREN lbrace stmtlist rbrace
     '''
-#    p[0] = ["function", p[1], p[2], ["parameter", p[4]], [p[6]] + p[7] + [p[8]], [p.lineno(1), p[8][1]]]
-    p[0] = ["function", {
-                "type": p[1],
-                "name": p[2],
-                "params": p[4],
-                "stmts": [p[6]] + p[7] + [p[8]],
-                "lineno": [p[6][1]["lineno"], p[8][1]["lineno"]]
-                }]
+    p[0] = FuncDef(p[1], p[2], p[4], [p[6]] + p[7] + [p[8]], p[6].lineno, p[8].lineno)
     print_log("p_func: ", p[0])
 
 def p_paramlist(p):
@@ -53,15 +49,9 @@ def p_param(p):
         	 | INT STAR ID
         	 | FLOAT STAR ID'''
     if len(p) == 4:
-        p[0] = ["id", {
-                    "type": p[1] + p[2],
-                    "name": p[3]
-                    }]
+        p[0] = Param(p[1] + p[2], p[3])
     elif len(p) == 3:
-        p[0] = ["id", {
-                    "type": p[1],
-                    "name": p[2]
-                }]
+        p[0] = Param(p[1], p[2])
     elif len(p) == 2:
         p[0] = p[1]
     else:
@@ -103,17 +93,9 @@ def p_declare(p):
                | INT STAR declarelist
                | FLOAT STAR declarelist'''
     if len(p) == 4:
-        p[0] = ["declare", {
-                    "type": p[1] + p[2],
-                    "vars": p[3],
-                    "lineno": p.lineno(1)
-                }]
+        p[0] = Declare(p[1] + p[2], p[3], p.lineno(1))
     elif len(p) == 3:
-        p[0] = ["declare", {
-                    "type": p[1],
-                    "vars": p[2],
-                    "lineno": p.lineno(1)
-                }]
+        p[0] = Declare(p[1], p[2], p.lineno(1))
     print_log("p_declare: ", p[0])
 
 def p_declarelist(p):
@@ -126,47 +108,22 @@ def p_declarelist(p):
 
 def p_assign(p):
     'assign : id ASSIGN expression'
-    p[0] = ["assign", {
-                "var": p[1],
-                "expr": p[3],
-                "lineno": p.lineno(2)
-            }]
+    p[0] = Assign(p[1], p[3], p.lineno(2))
     print_log("p_assign: ", p[0])
 
 def p_increment_id_inc(p):
     '''increment : id INCREMENT'''
-    p[0] = ["increment", {
-            "var": p[1],
-            "lineno": p.lineno(2)
-        }]
+    p[0] = Increment(p[1], p.lineno(2))
     print_log("p_increment: ", p[0])
 
 def p_increment_inc_id(p):
     '''increment : INCREMENT id'''
-    p[0] = ["increment", {
-            "var": p[2],
-            "lineno": p.lineno(1)
-        }]
+    p[0] = Increment(p[2], p.lineno(1))
     print_log("p_increment: ", p[0])
 
 def p_functcall(p):
     'functcall : ID LPAREN arglist RPAREN'
-    func_str = p[1][-1] + '('
-    func_arg_list = []
-    for arg in p[3]:
-        if p[3].index(arg) is not 0:
-            func_str += ','
-        func_str += arg[1]["str"]
-        func_arg_list += arg[1]["arg_list"]
-    func_str += ')'
-    p[0] = ["functcall", {
-                "callee": p[1],
-                "args": p[3],
-                "arg_list": func_arg_list,
-                "str": func_str,
-                "lineno": p.lineno(1)
-            }]
-#    p[0] = ["functcall", p[1], ["args", p[3]], func_arg_list, func_str, p.lineno(1)]
+    p[0] = Call(p[1], p[3], p.lineno(1))
     print_log("p_functcall: ", p[0])
 
 def p_arglist(p):
@@ -196,11 +153,7 @@ def p_arg_string(p):
 
 def p_string(p):
     '''string : STRING'''
-    p[0] = ["string", {
-        "arg_list": [],
-        "str": p[1],
-        "lineno": p.lineno(1)
-    }]
+    p[0] = String(p[1], p.lineno(1))
 
 def p_arg_empty(p):
     '''arg : empty'''
@@ -211,15 +164,9 @@ def p_return(p):
     '''return : RETURN expression
               | RETURN'''
     if len(p) == 2:
-        p[0] = ["return", {
-                    "value": None,
-                    "lineno": p.lineno(1)
-            }]
+        p[0] = ReturnStmt(None, p.lineno(1))
     else:
-        p[0] = ["return", {
-                    "value": p[2],
-                    "lineno": p.lineno(1)
-            }]
+        p[0] = ReturnStmt(p[2], p.lineno(1))
     print_log("p_return: ", p[0])
 
 def p_expression(p):
@@ -230,16 +177,7 @@ def p_expression(p):
     if len(p) == 2:
         p[0] = p[1]
     else:
-        expr_arg_list = list(set(p[1][1]["arg_list"]) | set(p[3][1]["arg_list"]))
-        expr_str = p[1][1]["str"] + p[2] + p[3][1]["str"]
-        p[0] = ["expression", {
-            "op": p[2],
-            "lhs": p[1],
-            "rhs": p[3],
-            "arg_list": expr_arg_list,
-            "str": expr_str,
-            "lineno": p.lineno(1)
-        }]
+        p[0] = BinOp(p[2], p[1], p[3], p.lineno(1))
     print_log("p_expression: ", p[0])
 
 def p_term(p):
@@ -247,16 +185,7 @@ def p_term(p):
             | term DIVIDE factor
             | factor'''
     if len(p) == 4:
-        term_arg_list = list(set(p[1][1]["arg_list"]) | set(p[3][1]["arg_list"]))
-        term_str = p[1][1]["str"] + p[2] + p[3][1]["str"]
-        p[0] = ["expression", {
-            "op": p[2],
-            "lhs": p[1],
-            "rhs": p[3],
-            "arg_list": term_arg_list,
-            "str": term_str,
-            "lineno": p.lineno(1)
-        }]
+        p[0] = BinOp(p[2], p[1], p[3], p.lineno(1))
     else:
         p[0] = p[1]
     print_log("p_term: ", p[0])
@@ -272,31 +201,16 @@ def p_factor_num(p):
               | LPAREN PLUS NUMBER RPAREN
               | LPAREN MINUS NUMBER RPAREN'''
     if len(p) == 2:
-        p[0] = ["number", {
-            "value": p[1],
-            "arg_list": [],
-            "str": str(p[1]),
-            "lineno": p.lineno(1)
-        }]
+        p[0] = Number(p[1], p.lineno(1))
     elif len(p) == 4:
-        p[0] = ["number", {
-            "value": p[2],
-            "arg_list": [],
-            "str": str(p[2]),
-            "lineno": p.lineno(1)
-        }]
+        p[0] = Number(p[2], p.lineno(1))
     else:
         if (p[2] == '+'):
             num = p[3]
         elif (p[2] == '-'):
             num = -p[3]
 
-        p[0] = ["number", {
-            "value": num,
-            "arg_list": [],
-            "str": str(num),
-            "lineno": p.lineno(1)
-        }]
+        p[0] = Number(num, p.lineno(1))
 
     print_log("p_factor: ", p[0])
 
@@ -314,66 +228,30 @@ def p_id(p):
     '''id : ID
           | ID LBRACKET expression RBRACKET'''
     if len(p) == 2:
-        p[0] = ["id", {
-            "name": p[1],
-            "arg_list": [p[1]],
-            "str": p[1],
-            "lineno": p.lineno(1)
-        }]
+        p[0] = Id(p[1], p.lineno(1))
     else:
-        array_arg_list = list(set([p[1]]) | set(p[3][1]["arg_list"]))
-        array_str = p[1] + '[' + p[3][1]["str"] + ']'
-        p[0] = ["array", {
-            "name": p[1],
-            "index": p[3],
-            "arg_list": array_arg_list,
-            "str": array_str,
-            "lineno": p.lineno(1)
-        }]
+        p[0] = ArrayRef(p[1], p[3], p.lineno(1))
     print_log("p_factor: ", p[0])
 
 def p_casting(p):
     '''casting : LPAREN INT RPAREN expression
                | LPAREN FLOAT RPAREN expression'''
-    casting_str = '(' + p[2] + ')' + p[4][1]["str"]
-
-    p[0] = ["casting", {
-        "type": p[2],
-        "expr": p[4],
-        "arg_list": p[4][1]["arg_list"],
-        "str": casting_str,
-        "lineno": p.lineno(1)
-    }]
+    p[0] = Cast(p[2], p[4], p.lineno(1))
     print_log("p_casting: ", p[0])
 
 def p_forloop(p):
     'forloop : FOR LPAREN assign SEMICOLON condition SEMICOLON increment RPAREN lbrace stmtlist rbrace'
-    p[0] = ["for", {
-        "assign": p[3],
-        "condition": p[5],
-        "increment": p[7],
-        "stmts": [p[9]] + p[10] + [p[11]],
-        "lineno": [p.lineno(1), p[11][1]["lineno"]],
-    }]
+    p[0] = For(p[3], p[5], p[7], [p[9]] + p[10] + [p[11]], p.lineno(1), p[11].lineno)
     print_log("p_forloop: ", p[0])
 
 def p_if(p):
     'if : IF LPAREN condition RPAREN lbrace stmtlist rbrace'
-    p[0] = ["if", {
-        "condition": p[3],
-        "stmts": [p[5]] + p[6] + [p[7]],
-        "lineno": [p.lineno(1), p[7][1]["lineno"]]
-    }]
+    p[0] = If(p[3], [p[5]] + p[6] + [p[7]], p.lineno(1), p[7].lineno)
     print_log("p_if: ", p[0])
 
 def p_condition(p):
     'condition : ID cmp expression'
-    p[0] = ["condition", {
-        "var": p[1],
-        "cmp": p[2],
-        "expr": p[3],
-        "lineno": p.lineno(1)
-    }]
+    p[0] = Condition(p[1], p[2], p[3], p.lineno(1))
     print_log("p_condition: ", p[0])
 
 def p_cmp(p):
@@ -388,14 +266,16 @@ def p_cmp(p):
 
 def p_lbrace(p):
     'lbrace : LBRACE'
-    p[0] = ["{", {"lineno": p.lineno(1)}]
+    p[0] = LBrace(p.lineno(1))
 
 def p_rbrace(p):
     'rbrace : RBRACE'
-    p[0] = ["}", {"lineno": p.lineno(1)}]
+    p[0] = RBrace(p.lineno(1))
 
 
 def p_error(p):
+    parser = parsing.parser
+    parser.syntax_errors += 1
     while True:
       tok = parser.token() # get the next token
       print("token type: ", tok.type)
@@ -406,15 +286,59 @@ def p_error(p):
     return tok
     # exit()
 
+# the PLY parser p_error recovers with, per thread while it parses
+parsing = threading.local()
+
+# Pre-generated LALR tables are shipped next to this file as cparsetab.py
+TABMODULE = "cparsetab"
+TABDIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class CParser:
+    """Lexer and LALR parser built once and reused for every parse.
+
+    Building the tables is the expensive part of PLY, so a CParser is meant
+    to live for the whole process. Each parse runs on a clone of the master
+    lexer, so line numbers never leak from one source to the next. PLY keeps
+    the state of a parse on the parser, so parses of one CParser run one at
+    a time; syntax_errors is the count of the last parse on the calling
+    thread.
+    """
+    def __init__(self, tabmodule=TABMODULE, write_tables=True, errorlog=None):
+        self.clexer = CLexer()
+        self.lexer = self.clexer.build()
+        self.parser = yacc.yacc(tabmodule=tabmodule, outputdir=TABDIR, debug=False,
+                                write_tables=write_tables, errorlog=errorlog)
+        self.lock = threading.Lock()
+        self.last = threading.local()
+
+    @property
+    def syntax_errors(self):
+        return getattr(self.last, "syntax_errors", 0)
+
+    def parse(self, code):
+        with self.lock:
+            parsing.parser = self.parser
+            self.parser.syntax_errors = 0
+            try:
+                tree = self.parser.parse(code, lexer=self.lexer.clone())
+            finally:
+                parsing.parser = None
+            self.last.syntax_errors = self.parser.syntax_errors
+        return tree
+
+
+def get_parser():
+    global DEFAULT_PARSER
+    if DEFAULT_PARSER is None:
+        DEFAULT_PARSER = CParser()
+    return DEFAULT_PARSER
+
+
 def get_parser_tree(code):
-    global parser
-    clexer = CLexer()
-    lexer = clexer.build()
-    tokens = clexer.tokens
-    parser = yacc.yacc()
-    return parser.parse(code, lexer=lexer)
-
-parser = None
+    return get_parser().parse(code)
+
+DEFAULT_PARSER = None
 
 if __name__ == '__main__':
     f = open("inputs/input0.c")
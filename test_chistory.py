@@ -0,0 +1,55 @@
+'''
+How much the bounded retention modes of chistory keep.
+
+    python -m pytest test_chistory.py
+'''
+import io
+
+import cinterpreter
+from cyacc import get_parser_tree
+
+LOOP = """int main(void) {
+    int i;
+    int total;
+    int a[4];
+    total = 0;
+    for (i = 0; i < 5000; i++) {
+        total = total + i;
+        a[1] = i;
+    }
+    printf("%d\\n", total);
+}
+"""
+
+
+def run_loop(mode, limit, lines):
+    interpreter = cinterpreter.Interpreter(io.StringIO())
+    interpreter.retention.set(mode, limit)
+    interpreter.run(get_parser_tree(LOOP), lines)
+    return {name: var.history for name, var in interpreter.live_vars()}
+
+
+def test_last_keeps_at_most_twice_the_limit():
+    for limit in (1, 10, 100):
+        # a bound has to hold at every point, not only where a trim ends
+        for lines in range(1000, 1000 + 2 * limit + 3):
+            histories = run_loop("last", limit, lines)
+            for name in ("i", "total"):
+                assert limit <= histories[name].length <= 2 * limit, (limit, lines, name)
+
+
+def test_last_keeps_an_array_to_its_checkpoint_interval():
+    limit = 10
+    for lines in range(1000, 1300, 7):
+        history = run_loop("last", limit, lines)["a"]
+        assert history.length <= limit + max(limit, history.interval), lines
+
+
+def test_window_keeps_the_changes_of_twice_the_limit():
+    limit = 10
+    for lines in range(1000, 1030):
+        history = run_loop("window", limit, lines)["total"]
+        steps = [history.change(*position)[0] for position in history.positions()]
+        # the change in effect when the window starts leads
+        assert steps[1] > lines - 2 * limit, lines
+        assert len(steps) <= 2 * limit + 1, lines